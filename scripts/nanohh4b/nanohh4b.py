@@ -117,7 +117,7 @@ class Analysis(Notebook):
             weights=self.weights,
             treename=self.treename or 'Events',
             normalization=self.normalization,
-            # fields=load_fields,
+            fields=load_fields,
         )
 
         self.signal = ObjIter([Tree( self.signal, **treekwargs, sample='ggHH4b', is_signal=True, xsec=1.0)])
@@ -618,12 +618,10 @@ class Analysis(Notebook):
             }
         )
 
-        def get_yield(tree, region):
+        # yields of every region in one grouped pass over the region codes of each tree
+        def get_yields(tree):
             label = tree.sample
-            an = an_yields[region].get(label, -1)
-
-            mask = getattr(self.bdt, region)(tree)
-            scale = tree.scale[mask]
+            scale = np.asarray(tree.scale)
 
             if not tree.is_data:
                 lumi = lumiMap[self.year][0]
@@ -633,13 +631,16 @@ class Analysis(Notebook):
                 label = f'{label} (x100)'
                 scale = 100 * scale
 
-            events = np.sum(scale)
+            return tree.sample, label, self.bdt.region_code(tree, weights=scale).yields()
 
-            return (label, events, an, events/an)
+        yields = (signal+bkg+data).apply(get_yields).list
 
         tables = []
         for region in ['a','b','c','d']:
-            table = (signal+bkg+data).apply(partial(get_yield, region=region)).list
+            table = []
+            for sample, label, events in yields:
+                an = an_yields[region].get(sample, -1)
+                table.append((label, events[region], an, events[region]/an))
             table = tabulate.tabulate(table, headers=['sample','yield','an yield', 'this/an'], tablefmt='simple', numalign='right', floatfmt='.2f')
 
             name = dict(
@@ -35,6 +35,8 @@ class Notebook(RunSkim):
         group = parser.add_mutually_exclusive_group(required=True)
         group.add_argument("--nsplit", type=int)
         group.add_argument("--frac", type=float, nargs='+')
+        parser.add_argument("--seed", type=int, default=None, help="seed of the random split, for reproducible splits")
+        parser.add_argument("--stratify", action='store_true', help="split the events of each file with the same fractions")
 
 
         return parser
@@ -51,22 +53,17 @@ class Notebook(RunSkim):
         print(f'frac: {self.frac}')
 
     def randomize_split(self, trees):
-        (trees).apply(
-            lambda t : t.extend(
-                _random_split= ak.from_numpy( np.digitize(np.random.uniform(size=len(t)), self.bins)-1 )
-            )
-        )
+        self.splits = [ t.split(self.frac, seed=self.seed, stratify=self.stratify) for t in trees ]
 
     def write_split(self, trees):
 
         for i in range(self.nsplit):
-            split = trees.copy()
-            split = split.apply(EventFilter(f'split_{i}', filter=lambda t : t._random_split==i))
+            split = ObjIter([ splits[i] for splits in self.splits ])
 
-            def rescale_cutflow(t):
-                frac = ak.mean(t._random_split==i)
+            def rescale_cutflow(t, full):
+                frac = len(t)/len(full)
                 t.cutflow = [ Histo(frac*cutflow.histo, cutflow.bins, frac*cutflow.error) for cutflow in t.cutflow ]
-            split.apply(rescale_cutflow)
+            for t, full in zip(split, trees): rescale_cutflow(t, full)
 
             study.quick( 
                 split,
@@ -0,0 +1,65 @@
+import os
+import sys
+
+import awkward as ak
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.classUtils.Columnar import write_columnar
+
+def make_arrays(nevents, seed, first_event=0):
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(0, 7, nevents)
+    njets = counts.sum()
+    return dict(
+        Run=np.ones(nevents, dtype=np.int64),
+        LumiSec=np.ones(nevents, dtype=np.int64),
+        Event=np.arange(first_event, first_event + nevents, dtype=np.int64),
+        genWeight=rng.uniform(0.5, 1.5, nevents),
+        n_jet=counts.astype(np.int32),
+        jet_pt=ak.unflatten(rng.uniform(20, 200, njets), counts),
+        jet_eta=ak.unflatten(rng.uniform(-2.5, 2.5, njets), counts),
+        jet_btag=ak.unflatten(rng.uniform(0, 1, njets), counts),
+    )
+
+def write_files(path, nfiles=2, nevents=500, cutflow=True):
+    os.makedirs(path, exist_ok=True)
+    fnames = []
+    for i in range(nfiles):
+        arrays = make_arrays(nevents, seed=i, first_event=i*nevents)
+        metadata = None
+        if cutflow:
+            metadata = dict(histograms=dict(h_cutflow=dict(labels=['total'], counts=[2.0*nevents], bins=[0, 1])))
+        fname = os.path.join(str(path), f'sample_{i}.parquet')
+        write_columnar(fname, arrays, metadata=metadata)
+        fnames.append(fname)
+    return fnames
+
+@pytest.fixture
+def no_cache(monkeypatch):
+    """Keep the metadata and mask caches out of the working directory"""
+    from utils.classUtils.Tree import RootFile
+    from utils.classUtils.Filter import Filter
+    from utils.classUtils.MaskCache import MaskCache
+    monkeypatch.setattr(RootFile, 'metadata_cache', None)
+    monkeypatch.setattr(Filter, 'cache', MaskCache(path=None))
+
+@pytest.fixture
+def mc_files(tmp_path):
+    return write_files(tmp_path / 'mc')
+
+@pytest.fixture
+def data_files(tmp_path):
+    return write_files(tmp_path / 'data', cutflow=False)
+
+@pytest.fixture
+def mc_tree(mc_files, no_cache):
+    from utils.classUtils import Tree
+    return Tree(mc_files, report=False)
+
+@pytest.fixture
+def data_tree(data_files, no_cache):
+    from utils.classUtils import Tree
+    return Tree(data_files, report=False, normalization=None)
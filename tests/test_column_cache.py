@@ -0,0 +1,51 @@
+import awkward as ak
+import numpy as np
+import pytest
+
+from utils.classUtils import Tree
+from utils.classUtils.ColumnCache import ColumnCache
+from utils.variableUtils import cache_variable
+
+@pytest.fixture
+def column_cache(monkeypatch, tmp_path):
+    column_cache = ColumnCache(path=str(tmp_path / 'columns'))
+    monkeypatch.setattr(Tree, 'column_cache', column_cache)
+    return column_cache
+
+def _variable(calls):
+    @cache_variable(persist=True)
+    def leading_pt(tree):
+        calls.append(len(tree))
+        return ak.fill_none(ak.firsts(tree.jet_pt), -1)
+    return leading_pt
+
+def test_persisted_variable_reloads_from_cache(mc_tree, column_cache):
+    calls = []
+    leading_pt = _variable(calls)
+    expected = leading_pt(mc_tree)
+
+    assert leading_pt.hash in mc_tree._columns.reloads
+    assert len(column_cache.entries()) == 1
+
+    mc_tree._columns.evict(leading_pt.hash)
+    assert ak.all(leading_pt(mc_tree) == expected)
+    assert len(calls) == 1
+
+def test_persisted_variable_after_snapshot(mc_tree, column_cache, tmp_path, monkeypatch):
+    calls = []
+    leading_pt = _variable(calls)
+
+    # computed before the column cache is set, the restored column has nothing to reload from
+    monkeypatch.setattr(Tree, 'column_cache', None)
+    expected = leading_pt(mc_tree)
+    tree = Tree.restore(mc_tree.snapshot(str(tmp_path / 'snapshot')))
+    assert leading_pt.hash not in tree._columns.reloads
+
+    monkeypatch.setattr(Tree, 'column_cache', column_cache)
+    assert ak.all(leading_pt(tree) == expected)
+    assert leading_pt.hash in tree._columns.reloads
+    assert len(calls) == 1
+
+    tree._columns.evict(leading_pt.hash)
+    assert ak.all(leading_pt(tree) == expected)
+    assert len(calls) == 1
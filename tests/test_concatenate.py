@@ -0,0 +1,34 @@
+import awkward as ak
+import numpy as np
+
+from utils.classUtils import Tree
+
+def test_unread_branches_stay_lazy(mc_files, no_cache):
+    first, second = Tree(mc_files[:1], report=False), Tree(mc_files[1:], report=False)
+    first.jet_pt, second.n_jet
+    merged = first.merge(second)
+
+    assert len(merged) == len(first) + len(second)
+    for field in ('jet_pt', 'n_jet', 'jet_eta'):
+        assert merged._columns.is_lazy(field), field
+    assert first._columns.is_lazy('jet_eta') and second._columns.is_lazy('jet_eta')
+
+    expected = Tree(mc_files, report=False)
+    for field in ('jet_pt', 'n_jet', 'jet_eta', 'sample_id'):
+        assert ak.all(merged[field] == expected[field]), field
+    # reading the merged tree does not load the columns of the inputs
+    assert first._columns.is_lazy('jet_eta') and second._columns.is_lazy('jet_eta')
+
+    # merged branches can still be evicted and read again
+    assert merged._columns.evict('jet_eta')
+    assert merged._columns.is_lazy('jet_eta')
+    assert ak.all(merged.jet_eta == expected.jet_eta)
+    assert merged.memory_report(verbose=False)['jet_eta']['kind'] == 'branch'
+
+def test_derived_columns_are_not_reloadable(mc_files, no_cache):
+    first, second = Tree(mc_files[:1], report=False), Tree(mc_files[1:], report=False)
+    for tree in (first, second): tree.extend(x=np.asarray(tree.n_jet) * 2.0)
+    merged = first.merge(second)
+
+    assert 'x' not in merged._columns.reloads
+    assert np.array_equal(np.asarray(merged.x), np.asarray(merged.n_jet) * 2.0)
@@ -0,0 +1,71 @@
+import numpy as np
+
+from utils.classUtils import EventFilter, FilterSequence, CutflowAccumulator
+from utils.classUtils.Cutflow import cutflow_sums
+from utils.classUtils.RunLengthArray import RunLengthArray
+
+def test_event_filter_on_data_tree(data_tree):
+    assert data_tree.cutflow == []
+
+    filtered = EventFilter('njet3', filter=lambda t : t.n_jet >= 3)(data_tree)
+
+    assert len(filtered) == np.sum(data_tree.n_jet >= 3)
+    assert filtered.cutflow == []
+    assert filtered.cutflow_labels[-1] == 'njet3'
+
+def test_event_filter_cutflow(mc_tree):
+    njet = EventFilter('njet3', filter=lambda t : t.n_jet >= 3)
+    filtered = njet(mc_tree)
+
+    sample_id = np.asarray(mc_tree.sample_id)
+    weights = mc_tree.genWeight
+    mask = mc_tree.n_jet >= 3
+    for i, cutflow in enumerate(filtered.cutflow):
+        selected = weights[mask & (sample_id == i)]
+        assert len(cutflow.histo) == 2
+        assert np.isclose(cutflow.histo[-1], np.sum(selected))
+        assert np.isclose(cutflow.error[-1], np.sqrt(np.sum(selected**2)))
+
+def test_filter_sequence_matches_filters(mc_tree):
+    filters = [
+        EventFilter('njet3', filter=lambda t : t.n_jet >= 3),
+        EventFilter('njet5', filter=lambda t : t.n_jet >= 5),
+    ]
+    sequence = FilterSequence(*filters)(mc_tree)
+
+    expected = mc_tree
+    for f in filters: expected = f(expected)
+
+    assert len(sequence) == len(expected)
+    for this, that in zip(sequence.cutflow, expected.cutflow):
+        assert np.allclose(this.histo, that.histo)
+        assert np.allclose(this.error, that.error)
+
+def test_cutflow_sums_stages():
+    sample_id = np.array([0, 0, 1, 1, 1])
+    weights = np.array([1., 2., 3., 4., 5.])
+    stage = np.array([0, 2, 1, 2, 2])
+
+    sumw, sumw2 = cutflow_sums(sample_id, 2, weights, stage=stage, nstages=2)
+
+    assert np.allclose(sumw, [[2., 12.], [2., 9.]])
+    assert np.allclose(sumw2, [[4., 50.], [4., 41.]])
+
+def test_cutflow_sums_run_length():
+    sample_id = RunLengthArray([0, 1], [2, 3])
+    weights = np.array([1., 2., 3., 4., 5.])
+
+    sumw, _ = cutflow_sums(sample_id, 2, weights)
+    dense, _ = cutflow_sums(sample_id.dense(), 2, weights)
+
+    assert np.allclose(sumw, dense)
+
+def test_accumulator_merge_pads_stages():
+    a = CutflowAccumulator(2).fill(np.array([0, 1]), nstages=2)
+    b = CutflowAccumulator(2).fill(np.array([1, 1]))
+
+    total = sum([a, b])
+
+    assert total.nstages == 2
+    assert np.allclose(total.sumw, [[1., 3.], [1., 1.]])
+    assert len(total.histos()) == 2
@@ -0,0 +1,81 @@
+import awkward as ak
+import numpy as np
+import pytest
+
+from utils.classUtils import EventFilter, Expression, Selection
+
+def test_python_logic_is_unchanged():
+    assert Expression('not x').evaluate(dict(x=True)) is False
+    assert Expression('a > 1 and b').evaluate(dict(a=2, b=5)) == 5
+    assert Expression('a or b').evaluate(dict(a=0, b=3)) == 3
+
+def test_selection_operators():
+    a, b = np.array([1, 2, 3]), np.array([True, False, True])
+    result = Expression('a > 1 && b || !b').evaluate(dict(a=a, b=b))
+    assert np.array_equal(np.asarray(result), ((a > 1) & b) | ~b)
+
+    # python and the selection operators can be mixed
+    assert Expression('x and y && z').evaluate(dict(x=True, y=b, z=np.array([True, True, False]))).tolist() == [True, False, False]
+
+def test_not_equal_is_kept():
+    a = np.array([1, 2, 3])
+    assert np.array_equal(np.asarray(Expression('!(a != 2)').evaluate(dict(a=a))), a == 2)
+
+def test_compile_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(Expression, 'cache', type(Expression.cache)())
+    monkeypatch.setattr(Expression, 'cache_size', 4)
+
+    first = Expression.compile('a + 0')
+    for i in range(1, 10): Expression.compile(f'a + {i}')
+
+    assert len(Expression.cache) == 4
+    assert Expression.compile('a + 9') is Expression.compile('a + 9')
+    assert Expression.compile('a + 0') is not first
+
+def test_selection_cuts_and_labels():
+    selection = Selection.compile('n_jet >= 4 && jet_pt[:,0] > 75 && !veto')
+    assert selection.labels == ['n_jet >= 4', 'jet_pt[:, 0] > 75', '!veto']
+    assert selection.fields == ('jet_pt', 'n_jet', 'veto')
+
+def test_selection_on_tree(mc_tree):
+    mask = Selection.compile('n_jet >= 3 && genWeight > 1')(mc_tree)
+    expected = (mc_tree.n_jet >= 3) & (mc_tree.genWeight > 1)
+    assert ak.all(mask == expected)
+
+def test_memo_results_are_copies(mc_tree):
+    expected = mc_tree.genWeight[0]
+    weights = mc_tree['np.asarray(genWeight)']
+    weights[0] = -1
+    assert mc_tree['np.asarray(genWeight)'][0] == expected
+    assert mc_tree.genWeight[0] == expected
+
+    jets = mc_tree['ak.zip(dict(pt=jet_pt))']
+    jets['pt2'] = jets.pt**2
+    assert mc_tree['ak.zip(dict(pt=jet_pt))'].fields == ['pt']
+
+def test_memo_follows_updated_columns(mc_tree):
+    before = mc_tree['n_jet + 1']
+    mc_tree.extend(n_jet=np.zeros(len(mc_tree), dtype=np.int32))
+    after = mc_tree['n_jet + 1']
+    assert ak.any(before != 1)
+    assert ak.all(after == 1)
+
+@pytest.mark.parametrize('expr', ['abs(a)', 'np.abs(a) + b', 'a * 2 - b', 'abs(x)'])
+def test_backends_keep_dtype(monkeypatch, expr):
+    columns = dict(a=np.array([-3, 2, 5], dtype=np.int32), b=np.array([1, -2, 3], dtype=np.int64), x=np.array([-1.5, 2, 3], dtype=np.float32))
+
+    results = dict()
+    for use_numexpr in (True, False):
+        monkeypatch.setattr(Expression, 'use_numexpr', use_numexpr)
+        results[use_numexpr] = np.asarray(Expression(expr).evaluate(columns))
+
+    assert results[True].dtype == results[False].dtype
+    assert np.array_equal(results[True], results[False])
+
+def test_selection_without_objects(mc_tree):
+    assert ak.any(mc_tree.n_jet == 0)
+    selected = EventFilter(filter='n_jet >= 1 && ak.firsts(jet_pt) > 75')(mc_tree)
+
+    lead_pt = ak.to_numpy(ak.fill_none(ak.firsts(mc_tree.jet_pt), 0))
+    assert len(selected) == np.count_nonzero((np.asarray(mc_tree.n_jet) >= 1) & (lead_pt > 75))
+    assert ak.all(ak.firsts(selected.jet_pt) > 75)
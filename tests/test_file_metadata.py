@@ -0,0 +1,71 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+import uproot as ut
+
+import utils.classUtils
+from utils.classUtils.FileMetadata import FileMetadataCache
+tree_module = sys.modules['utils.classUtils.Tree']
+
+@pytest.fixture
+def cache(tmp_path):
+    return FileMetadataCache(path=str(tmp_path / 'filemeta'))
+
+@pytest.fixture
+def fname(tmp_path):
+    fname = tmp_path / 'sample.root'
+    fname.write_bytes(b'0'*64)
+    return str(fname)
+
+def _meta(raw_events=10):
+    return dict(uuid='uuid', raw_events=raw_events, fields=['n_jet'], types=dict(n_jet='int32_t'))
+
+def test_hit(cache, fname):
+    cache.save(fname, 'Events', _meta(), normalization='h_cutflow', norm=dict(total_events=np.int64(20)))
+
+    assert cache.load(fname, 'Events') == dict(_meta(), normalization=None)
+    assert cache.load(fname, 'Events', 'h_cutflow')['normalization'] == dict(total_events=20)
+    # entries of other trees in the same file are kept
+    cache.save(fname, 'Other', _meta(5))
+    assert cache.load(fname, 'Events')['raw_events'] == 10
+
+def test_miss(cache, fname):
+    assert cache.load(fname, 'Events') is None
+    assert cache.load(fname + '.missing', 'Events') is None
+
+    cache.save(fname, 'Events', _meta())
+    assert cache.load(fname, 'Other') is None
+    assert cache.load(fname, 'Events', 'h_cutflow') is None
+
+def test_invalidation(cache, fname):
+    cache.save(fname, 'Events', _meta())
+
+    # same size, new modification time
+    stat = os.stat(fname)
+    os.utime(fname, (stat.st_atime, stat.st_mtime + 10))
+    assert cache.load(fname, 'Events') is None
+
+    # same modification time, new size
+    cache.save(fname, 'Events', _meta())
+    with open(fname, 'ab') as f: f.write(b'0')
+    os.utime(fname, (stat.st_atime, stat.st_mtime + 10))
+    assert cache.load(fname, 'Events') is None
+
+    cache.save(fname, 'Events', _meta())
+    cache.invalidate(fname)
+    assert cache.load(fname, 'Events') is None
+
+def test_root_file_skips_open(cache, tmp_path, monkeypatch):
+    fname = str(tmp_path / 'events.root')
+    with ut.recreate(fname) as f:
+        f['Events'] = dict(n_jet=np.arange(10, dtype=np.int32))
+    monkeypatch.setattr(tree_module.RootFile, 'metadata_cache', cache)
+
+    opened = tree_module.RootFile(fname, 'Events')
+    def open_root(self, fields=None): raise AssertionError('opened a cached file')
+    monkeypatch.setattr(tree_module.RootFile, 'open_root', open_root)
+
+    cached = tree_module.RootFile(fname, 'Events')
+    assert (cached.raw_events, cached.fields, cached.uuid) == (opened.raw_events, opened.fields, opened.uuid)
@@ -0,0 +1,29 @@
+import awkward as ak
+import numpy as np
+import pytest
+
+from utils.classUtils import CollectionFilter
+
+def _check(tree, mask, **kwargs):
+    selected = CollectionFilter('jet', newname='sel', **kwargs)(tree)
+    assert ak.all(selected.n_sel == ak.sum(mask, axis=1))
+    for field in ('pt', 'eta', 'btag'):
+        assert ak.all(selected[f'sel_{field}'] == tree[f'jet_{field}'][mask])
+    return selected
+
+def test_compiled_cuts(mc_tree):
+    pt, eta, btag = mc_tree.jet_pt, mc_tree.jet_eta, mc_tree.jet_btag
+    _check(mc_tree, (pt > 50) & (abs(eta) < 2.0) & (btag > 0.3), pt_min=50, abs_eta_max=2.0, btag_min=0.3)
+    _check(mc_tree, (btag > 0.5) & (pt < 150), filter='btag > 0.5', pt_max=150)
+    _check(mc_tree, btag > 0.5, filter='btag > 0.5')
+
+@pytest.mark.parametrize('dtype', [np.float32, np.int32])
+def test_compiled_keeps_dtype(mc_tree, dtype):
+    pt = ak.values_astype(mc_tree.jet_pt, dtype)
+    pt = ak.where(ak.local_index(pt) == 0, dtype(75.1), pt)
+    mc_tree.extend(jet_pt=pt)
+
+    # just below float32(75.1), equal to it once cast to float32
+    threshold = float(np.float32(75.1)) - 1e-6 if dtype is np.float32 else 75.5
+    selected = _check(mc_tree, (pt > threshold) & (abs(mc_tree.jet_eta) < 2.0), pt_min=threshold, abs_eta_max=2.0)
+    assert ak.flatten(selected.sel_pt).layout.dtype == np.dtype(dtype)
@@ -0,0 +1,47 @@
+import awkward as ak
+import numpy as np
+import pytest
+import uproot as ut
+
+from utils.classUtils import EventFilter
+
+def _friend_arrays(tree, order):
+    """Friend columns for the events of tree, in the given order of the events"""
+    keys = { key: np.asarray(tree[key])[order] for key in ('Run', 'LumiSec', 'Event') }
+    return dict(keys, score=keys['Event'] * 0.5, n_jet=np.asarray(tree.n_jet)[order])
+
+def test_aligned_join(mc_tree):
+    order = np.random.default_rng(0).permutation(len(mc_tree))
+    mc_tree.add_friend(_friend_arrays(mc_tree, order), fields=['score', 'n_jet'], prefix='friend_')
+
+    assert mc_tree._columns.is_lazy('friend_score')
+    assert np.array_equal(np.asarray(mc_tree.friend_score), np.asarray(mc_tree.Event) * 0.5)
+    assert ak.all(mc_tree.friend_n_jet == mc_tree.n_jet)
+
+    # friend columns follow selections of the tree
+    selected = EventFilter('njet', filter=lambda t : t.n_jet >= 3)(mc_tree)
+    assert np.array_equal(np.asarray(selected.friend_score), np.asarray(selected.Event) * 0.5)
+
+def test_join_from_files(mc_tree, tmp_path):
+    order = np.random.default_rng(0).permutation(len(mc_tree))
+    fname = str(tmp_path / 'friend.root')
+    with ut.recreate(fname) as f:
+        f['Events'] = _friend_arrays(mc_tree, order)
+
+    mc_tree.add_friend(fname, fields=['score'])
+    assert np.array_equal(np.asarray(mc_tree.score), np.asarray(mc_tree.Event) * 0.5)
+
+@pytest.mark.parametrize('strict', [True, False])
+def test_misaligned_events(mc_tree, strict):
+    # the friend is missing every other event
+    order = np.arange(0, len(mc_tree), 2)
+    mc_tree.add_friend(_friend_arrays(mc_tree, order), fields=['score'], strict=strict)
+
+    if strict:
+        with pytest.raises(KeyError, match="no match in friend"):
+            mc_tree.score
+        return
+
+    score = mc_tree.score
+    assert ak.all(ak.is_none(score[1::2]))
+    assert np.array_equal(np.asarray(score[::2]), np.asarray(mc_tree.Event)[::2] * 0.5)
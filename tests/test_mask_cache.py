@@ -0,0 +1,94 @@
+import pickle
+
+import awkward as ak
+import numpy as np
+import pytest
+
+from utils.classUtils import Filter
+from utils.classUtils.MaskCache import MaskCache, pack_mask, unpack_mask
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    cache = MaskCache(path=str(tmp_path / 'masks'))
+    monkeypatch.setattr(Filter, 'cache', cache)
+
+    cache.saves = []
+    save = cache.save
+    def count_saves(key, mask):
+        cache.saves.append(key)
+        save(key, mask)
+    monkeypatch.setattr(cache, 'save', count_saves)
+    return cache
+
+def _njet(n):
+    return Filter(lambda t : t.n_jet >= n)
+
+def test_pack_round_trip():
+    mask = np.random.default_rng(0).uniform(size=1001) > 0.5
+    packed = pack_mask(mask)
+    assert packed.nbytes == 126
+    assert np.array_equal(unpack_mask(packed, len(mask)), mask)
+
+def test_hit_on_copies(mc_tree, cache):
+    expected = np.asarray(mc_tree.n_jet >= 3)
+    assert np.array_equal(np.asarray(_njet(3)(mc_tree)), expected)
+    assert np.array_equal(np.asarray(_njet(3)(mc_tree.copy())), expected)
+    assert len(cache.saves) == 1
+
+def test_hit_from_disk(mc_tree, cache):
+    expected = np.asarray(_njet(3)(mc_tree))
+    cache.memory.clear()
+    cache.reads.clear()
+    assert np.array_equal(np.asarray(_njet(3)(mc_tree)), expected)
+    assert len(cache.saves) == 1
+
+def test_invalidation(mc_tree, cache):
+    def misses(filter, tree, **kwargs):
+        saves = len(cache.saves)
+        filter(tree, **kwargs)
+        return len(cache.saves) - saves
+
+    assert misses(_njet(3), mc_tree) == 1
+    assert misses(_njet(3), mc_tree) == 0
+    # a different closure value
+    assert misses(_njet(4), mc_tree) == 1
+    # different events
+    selected = mc_tree.copy()
+    selected.select(np.asarray(mc_tree.Event % 2 == 1))
+    assert misses(_njet(3), selected) == 1
+    # different keyword arguments
+    weighted = Filter(lambda t, cut=1 : t.genWeight > cut)
+    assert misses(weighted, mc_tree, cut=1) == 1
+    assert misses(weighted, mc_tree, cut=1.2) == 1
+    assert len(set(cache.saves)) == len(cache.saves)
+
+def test_replaced_columns(mc_tree, cache):
+    lead_pt = Filter(lambda t : ak.max(t.jet_pt, axis=1, mask_identity=False) > 100)
+    lead_pt(mc_tree)
+
+    mc_tree.extend(jet_pt=mc_tree.jet_pt*2)
+    expected = np.asarray(ak.max(mc_tree.jet_pt, axis=1, mask_identity=False) > 100)
+    assert np.array_equal(np.asarray(lead_pt(mc_tree)), expected)
+    assert len(cache.saves) == 2
+
+    # the same values are found again
+    assert np.array_equal(np.asarray(lead_pt(mc_tree.copy())), expected)
+    assert len(cache.saves) == 2
+    # trees still pickle with the identities of their columns
+    assert len(pickle.loads(pickle.dumps(mc_tree))) == len(mc_tree)
+
+def test_memory_only_by_default():
+    assert MaskCache().path is None
+
+def test_unstable_filters_are_not_cached(mc_tree, cache):
+    cuts = iter([3])
+    Filter(lambda t : t.n_jet >= next(cuts))(mc_tree)
+    Filter(lambda t : t.n_jet >= len(mc_tree))(mc_tree)
+    assert len(cache.saves) == 0
+
+def test_eviction(cache):
+    cache.max_entries, cache.max_size = 2, 0
+    for i in range(3): cache.save(f'key{i}', np.ones(10, dtype=bool))
+
+    assert list(cache.memory) == ['key1', 'key2']
+    assert cache.entries() == []
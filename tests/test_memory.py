@@ -0,0 +1,61 @@
+import gc
+
+import numpy as np
+import pytest
+
+from utils.classUtils import Tree, EventFilter
+from utils.classUtils.MemoryManager import MemoryManager, column_nbytes, held_column
+
+@pytest.fixture
+def memory(monkeypatch):
+    memory = MemoryManager()
+    monkeypatch.setattr(Tree, 'memory', memory)
+    return memory
+
+def _recount(memory):
+    """Total of the unique loaded columns, walking every registered store"""
+    columns = dict()
+    for ref, _ in memory.stores.values():
+        store = ref()
+        for column in store.columns.values():
+            column = held_column(column)
+            if column is not None: columns[id(column)] = column
+    return sum( column_nbytes(column) for column in columns.values() )
+
+def test_total_follows_columns(mc_tree, memory):
+    mc_tree.jet_pt, mc_tree.n_jet
+    assert memory.total > 0 and memory.total == _recount(memory)
+
+    copy = mc_tree.copy()
+    copy.extend(x=np.zeros(len(copy)))
+    copy.jet_pt
+    assert memory.total == _recount(memory)
+
+    selected = EventFilter('njet', filter=lambda t : t.n_jet >= 3)(mc_tree)
+    selected.jet_eta, selected.jet_pt
+    assert memory.total == _recount(memory)
+
+    mc_tree._columns.evict('jet_pt')
+    assert memory.total == _recount(memory)
+
+    del copy, selected
+    gc.collect()
+    assert memory.total == _recount(memory)
+
+def test_budget_evicts_least_recently_used(mc_tree, memory):
+    mc_tree.jet_pt, mc_tree.jet_eta, mc_tree.jet_btag
+    memory.budget = memory.total - 1
+    mc_tree.n_jet
+
+    assert not mc_tree._columns.is_lazy('jet_btag')
+    assert mc_tree._columns.is_lazy('jet_pt')
+    assert memory.total <= memory.budget
+    assert memory.total == _recount(memory)
+
+def test_budget_check_does_not_walk_columns(mc_tree, memory, monkeypatch):
+    memory.budget = '1 GB'
+    def columns(): raise AssertionError('walked every column under the budget')
+    monkeypatch.setattr(memory, 'columns', columns)
+
+    mc_tree.jet_pt, mc_tree.jet_eta
+    mc_tree.extend(x=np.zeros(len(mc_tree)))
@@ -0,0 +1,75 @@
+import sys
+import time
+
+import pytest
+
+import utils.classUtils
+tree_module = sys.modules['utils.classUtils.Tree']
+
+@pytest.fixture
+def remote(monkeypatch, mc_files, no_cache):
+    """Remote names of the mc files, copied to their local path by copy_to_local"""
+    remote = [ f'root://eos.host//store/sample_{i}.parquet' for i in range(len(mc_files)) ]
+    local = dict(zip(remote, mc_files))
+    events = []
+
+    def copy_to_local(fname):
+        events.append(('copy', fname))
+        if 'missing' in fname: raise IOError(f'unable to copy {fname}')
+        return local[fname]
+
+    class RootFile(tree_module.RootFile):
+        def __init__(self, fname, *args, **kwargs):
+            events.append(('open', fname))
+            if 'slow' in fname: time.sleep(2)
+            super().__init__(fname, *args, **kwargs)
+
+    monkeypatch.setattr(tree_module, 'copy_to_local', copy_to_local)
+    monkeypatch.setattr(tree_module, 'RootFile', RootFile)
+    return remote, local, events
+
+def _open(filelist, **kwargs):
+    return tree_module.open_files(filelist, 'sixBtree', None, [None]*len(filelist), report=False, **kwargs)
+
+def test_opens_prefetched_copy(remote):
+    remote, local, events = remote
+    rootfiles = _open(remote)
+
+    assert [ fn.true_fname for fn in rootfiles ] == remote
+    assert [ fn.fname for fn in rootfiles ] == [ local[fn] for fn in remote ]
+    assert sum( event == 'copy' for event, _ in events ) == len(remote)
+
+def test_prefetcher_is_consumed_lazily(remote):
+    remote, _, events = remote
+    _open(remote*2, nworkers=1, prefetch=1)
+
+    # each copy waits for the previous file to be opened
+    assert [ event for event, _ in events ] == ['copy', 'open']*4
+
+def test_failed_copy_is_skipped(remote):
+    remote, _, _ = remote
+    rootfiles = _open([remote[0], 'root://eos.host//store/missing.parquet', remote[1]])
+    assert [ fn.true_fname for fn in rootfiles ] == remote
+
+def test_timeout_skips_file(remote, monkeypatch):
+    remote, local, _ = remote
+    slow = 'root://eos.host//store/slow.parquet'
+    local[slow] = local[remote[0]]
+
+    start = time.perf_counter()
+    rootfiles = _open([slow, remote[1]], timeout=0.5)
+
+    assert [ fn.true_fname for fn in rootfiles ] == [remote[1]]
+    assert time.perf_counter() - start < 2
+
+def test_timed_out_opens_free_their_worker(remote):
+    remote, local, _ = remote
+    slow = [ f'root://eos.host//store/slow_{i}.parquet' for i in range(2) ]
+    for fn in slow: local[fn] = local[remote[0]]
+
+    # both workers are taken by hung opens until they time out
+    start = time.perf_counter()
+    rootfiles = _open(slow + remote, nworkers=2, timeout=0.5)
+
+    assert [ fn.true_fname for fn in rootfiles ] == remote
+    assert time.perf_counter() - start < 1.5
@@ -0,0 +1,68 @@
+import threading
+import time
+
+import pytest
+
+from utils.fileUtils import Prefetcher, background
+
+def _fetch(item):
+    if item == 'fail': raise ValueError('unable to fetch')
+    time.sleep(0.01 * (item % 3))
+    return item * 2
+
+class Interrupt(BaseException): ...
+
+def _source(items, closed):
+    try:
+        for item in items:
+            if isinstance(item, BaseException): raise item
+            yield item
+    finally:
+        closed.set()
+
+def test_prefetcher_matches_sync():
+    items = list(range(20))
+    assert list(Prefetcher(items, _fetch, depth=4)) == [ _fetch(item) for item in items ]
+
+def test_prefetcher_raises_errors():
+    with pytest.raises(ValueError):
+        list(Prefetcher([1, 2, 'fail', 3], _fetch))
+
+    results = list(Prefetcher([1, 'fail', 3], _fetch, skip_errors=True))
+    assert results[0] == 2 and isinstance(results[1], ValueError) and results[2] == 6
+
+def test_prefetcher_shutdown():
+    fetched = []
+    def fetch(item):
+        fetched.append(item)
+        return item
+
+    prefetcher = iter(Prefetcher(range(100), fetch, depth=2, nworkers=1))
+    assert next(prefetcher) == 0
+    prefetcher.close()
+    time.sleep(0.1)
+    # nothing is fetched beyond the prefetch depth
+    assert len(fetched) <= 3
+
+def test_background_matches_sync():
+    closed = threading.Event()
+    assert list(background(_source(range(20), closed), depth=3)) == list(range(20))
+    assert closed.wait(1)
+
+@pytest.mark.parametrize('error', [ValueError('bad chunk'), Interrupt()])
+def test_background_raises_errors(error):
+    closed = threading.Event()
+    results = []
+    with pytest.raises(type(error)):
+        for item in background(_source([0, 1, error, 3], closed), depth=2):
+            results.append(item)
+    assert results == [0, 1]
+    assert closed.wait(1)
+
+def test_background_shutdown():
+    closed = threading.Event()
+    items = background(_source(range(100), closed), depth=2)
+    assert next(items) == 0
+    items.close()
+    # the producer stops and closes its source
+    assert closed.wait(1)
@@ -0,0 +1,88 @@
+import numpy as np
+
+from utils.classUtils import CutSet, Regions
+
+def _cuts():
+    return dict(
+        njet=lambda t : t.n_jet >= 3,
+        weight=lambda t : t.genWeight > 1,
+        event=lambda t : t.Event % 2 == 0,
+    )
+
+def _masks(tree):
+    return { name: np.asarray(cut(tree)) for name, cut in _cuts().items() }
+
+def test_cutset_nminus1(mc_tree):
+    word = CutSet(_cuts())(mc_tree)
+    masks = _masks(mc_tree)
+
+    assert np.array_equal(word.mask(), masks['njet'] & masks['weight'] & masks['event'])
+    assert np.array_equal(word.nminus1('weight'), masks['njet'] & masks['event'])
+
+    scale = np.asarray(mc_tree.scale)
+    assert np.isclose(word.yields(exclude=['njet']), np.sum(scale[masks['weight'] & masks['event']]))
+
+def test_cutset_cutflow_order(mc_tree):
+    word = CutSet(_cuts())(mc_tree, weights=None)
+    masks = _masks(mc_tree)
+
+    cutflow = word.cutflow(['event', 'njet'])
+    assert cutflow[None] == len(mc_tree)
+    assert cutflow['event'] == np.sum(masks['event'])
+    assert cutflow['njet'] == np.sum(masks['event'] & masks['njet'])
+
+def test_regions_match_masks(mc_tree):
+    regions = Regions(
+        _cuts(),
+        a=lambda c : c['njet'] & c['weight'],
+        b=lambda c : c['njet'] & ~c['weight'],
+    )
+    code = regions(mc_tree)
+    masks = _masks(mc_tree)
+
+    assert np.array_equal(code.mask('a'), masks['njet'] & masks['weight'])
+    assert np.array_equal(code.mask('b'), masks['njet'] & ~masks['weight'])
+
+    scale = np.asarray(mc_tree.scale)
+    yields = code.yields()
+    assert np.isclose(yields['a'], np.sum(scale[masks['njet'] & masks['weight']]))
+    assert np.isclose(yields['njet'], np.sum(scale[masks['njet']]))
+
+def test_region_codes_add(mc_tree):
+    regions = Regions(_cuts(), a=lambda c : c['njet'] & c['event'])
+    single = regions(mc_tree).yields('a')
+    total = sum(regions([mc_tree, mc_tree]))
+    assert np.isclose(total.yields('a'), 2*single)
+
+def test_abcd_masks(mc_tree):
+    from utils.bdtUtils import ABCD
+
+    njet, weight = (lambda t : t.n_jet >= 3), (lambda t : t.genWeight > 1)
+    abcd = ABCD(
+        features=['n_jet'],
+        a=lambda t : njet(t) & weight(t), b=lambda t : njet(t) & ~weight(t),
+        c=lambda t : ~njet(t) & weight(t), d=lambda t : ~njet(t) & ~weight(t),
+    )
+    fields = list(mc_tree.fields)
+
+    a, b = np.asarray(njet(mc_tree) & weight(mc_tree)), np.asarray(njet(mc_tree) & ~weight(mc_tree))
+    assert np.array_equal(abcd.a(mc_tree), a)
+    assert np.array_equal(abcd.sr(mc_tree), a | b)
+    assert np.array_equal(abcd.mask(mc_tree), np.ones(len(mc_tree), dtype=bool))
+    assert list(mc_tree.fields) == fields
+
+def test_abcd_masks_follow_updated_columns(mc_tree):
+    from utils.bdtUtils import ABCD
+
+    abcd = ABCD(
+        features=['n_jet'],
+        a=lambda t : t.n_jet >= 3, b=lambda t : t.n_jet == 2,
+        c=lambda t : t.n_jet == 1, d=lambda t : t.n_jet == 0,
+    )
+    before = abcd.a(mc_tree)
+    mc_tree.extend(n_jet=np.zeros(len(mc_tree), dtype=np.int32))
+    after = abcd.a(mc_tree)
+
+    assert np.any(before)
+    assert not np.any(after)
+    assert np.all(abcd.d(mc_tree))
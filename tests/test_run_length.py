@@ -0,0 +1,43 @@
+import awkward as ak
+import numpy as np
+
+from utils.classUtils import ObjIter, RunLengthArray
+
+def test_dense_ops():
+    array = RunLengthArray([1, 2, 3], [2, 0, 3])
+    dense = np.array([1, 1, 3, 3, 3])
+
+    assert len(array) == 5
+    assert np.array_equal(array.dense(), dense)
+    assert np.array_equal(np.asarray(array + 1), dense + 1)
+    assert np.array_equal(np.asarray(array == 3), dense == 3)
+    assert array.sum() == dense.sum()
+
+def test_getitem():
+    array = RunLengthArray([1, 2, 3], [2, 2, 3])
+    dense = array.dense()
+
+    assert array[3] == dense[3]
+    assert np.array_equal(np.asarray(array[1:5]), dense[1:5])
+    mask = dense != 2
+    assert np.array_equal(np.asarray(array[mask]), dense[mask])
+    index = np.array([6, 0, 3])
+    assert np.array_equal(np.asarray(array[index]), dense[index])
+
+def test_concatenate():
+    a, b = RunLengthArray([0], [3]), RunLengthArray([0, 1], [1, 2])
+    total = RunLengthArray.concatenate([a, b])
+    assert np.array_equal(total.dense(), np.concatenate([a.dense(), b.dense()]))
+
+def test_tree_sample_id_is_dense(mc_tree):
+    assert isinstance(mc_tree._columns['sample_id'], RunLengthArray)
+
+    sample_id = mc_tree.sample_id
+    assert np.array_equal(ak.to_numpy(sample_id), np.repeat([0, 1], 500))
+    assert len(ak.Array(sample_id)) == len(mc_tree)
+
+def test_objiter_cat_sample_id(mc_tree):
+    trees = ObjIter([mc_tree, mc_tree.copy()])
+    sample_id = trees.sample_id.cat
+    assert len(sample_id) == 2*len(mc_tree)
+    assert np.array_equal(ak.to_numpy(sample_id)[:len(mc_tree)], ak.to_numpy(mc_tree.sample_id))
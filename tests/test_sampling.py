@@ -0,0 +1,29 @@
+import awkward as ak
+import numpy as np
+import pytest
+
+from utils.classUtils.ColumnStore import is_deferred
+
+@pytest.mark.parametrize('randomize', [True, False])
+def test_subset_is_deferred(mc_tree, randomize):
+    mc_tree.jet_pt
+    subset = mc_tree.subset(nentries=100, randomize=randomize, seed=1)
+
+    assert len(subset) == 100
+    assert is_deferred(subset._columns.columns['jet_pt'])
+    assert mc_tree._columns.is_lazy('jet_eta') and subset._columns.is_lazy('jet_eta')
+
+    index = mc_tree.subset_index((0, 100), randomize=randomize, seed=1)
+    for field in ('Event', 'jet_pt', 'jet_eta', 'sample_id'):
+        assert ak.all(subset[field] == mc_tree[field][index]), field
+
+@pytest.mark.parametrize('stratify', [True, False])
+def test_split(mc_tree, stratify):
+    mc_tree.jet_pt
+    splits = mc_tree.split([0.6, 0.4], seed=1, stratify=stratify)
+
+    assert all( is_deferred(split._columns.columns['jet_pt']) for split in splits )
+    events = np.concatenate([ np.asarray(split.Event) for split in splits ])
+    assert np.array_equal(np.sort(events), np.asarray(mc_tree.Event))
+    for split, index in zip(splits, mc_tree.split_index([0.6, 0.4], seed=1, stratify=stratify)):
+        assert ak.all(split.jet_pt == mc_tree.jet_pt[index])
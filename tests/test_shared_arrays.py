@@ -0,0 +1,76 @@
+import multiprocessing
+import os
+import sys
+
+import awkward as ak
+import numpy as np
+import pytest
+
+import utils.classUtils
+from utils.classUtils import ObjIter
+from utils.classUtils.SharedArrays import SharedArray, SharedColumns, share, unshare, release
+shared_module = sys.modules['utils.classUtils.SharedArrays']
+
+@pytest.fixture
+def shared_path(monkeypatch, tmp_path):
+    """Share every array, in a directory that can be checked for leftover files"""
+    path = tmp_path / 'shm'
+    path.mkdir()
+    monkeypatch.setattr(shared_module, 'shared_path', str(path))
+    monkeypatch.setattr(shared_module, 'min_shared_nbytes', 0)
+    return path
+
+@pytest.fixture
+def pool():
+    with multiprocessing.get_context('fork').Pool(2) as pool:
+        yield pool
+
+def _n_jet(tree):
+    return np.asarray(tree.n_jet)
+
+def _raise_on_second(tree):
+    if tree.Event[0] > 0: raise ValueError('failed')
+    return tree
+
+def test_round_trip(shared_path):
+    arrays = dict(x=np.arange(10), jets=[ak.Array([[1.0, 2.0], [], [3.0]]), 'label'])
+    obj, shared = share(arrays)
+
+    assert isinstance(obj['x'], SharedArray) and isinstance(obj['jets'][0], SharedArray)
+    assert len(os.listdir(shared_path)) == 2
+
+    result = unshare(obj, unlink=True)
+    assert np.array_equal(result['x'], arrays['x'])
+    assert result['jets'][0].tolist() == arrays['jets'][0].tolist()
+    assert result['jets'][1] == 'label'
+    assert not os.listdir(shared_path)
+    release(shared)
+
+def test_tree_columns(shared_path, mc_tree):
+    n_jet = mc_tree.n_jet
+    obj, shared = share(mc_tree)
+
+    assert isinstance(obj._columns, SharedColumns)
+    assert isinstance(obj._columns.columns['n_jet'], SharedArray)
+    assert mc_tree._columns['n_jet'] is not obj._columns.columns['n_jet']
+
+    tree = unshare(obj, unlink=True)
+    assert ak.all(tree.n_jet == n_jet)
+    assert ak.all(tree.jet_pt == mc_tree.jet_pt)
+    assert not os.listdir(shared_path)
+
+def test_pool_apply(shared_path, mc_tree, pool):
+    trees = ObjIter([mc_tree, mc_tree.copy()])
+    n_jet = trees.pool_apply(_n_jet, pool=pool)
+
+    assert all( np.array_equal(result, mc_tree.n_jet) for result in n_jet )
+    assert not os.listdir(shared_path)
+
+def test_worker_error_leaves_no_files(shared_path, mc_files, no_cache, pool):
+    from utils.classUtils import Tree
+    trees = ObjIter([ Tree(fn, report=False) for fn in mc_files ])
+    for tree in trees: tree.n_jet
+
+    with pytest.raises(ValueError):
+        trees.pool_apply(_raise_on_second, pool=pool)
+    assert not os.listdir(shared_path)
@@ -0,0 +1,58 @@
+import os
+
+import awkward as ak
+import numpy as np
+import pytest
+
+from utils.classUtils import Tree, EventFilter, RunLengthArray
+from utils.classUtils import Snapshot
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_round_trip(mc_tree, tmp_path, mmap):
+    selected = EventFilter('njet', filter=lambda t : t.n_jet >= 3)(mc_tree)
+    selected.extend(x=selected.n_jet*2.0)
+    selected.jet_pt
+
+    path = selected.snapshot(str(tmp_path / 'snapshot'))
+    tree = Tree.restore(path, mmap=mmap)
+
+    assert type(tree) is Tree and len(tree) == len(selected)
+    assert tree.sample == selected.sample
+    assert tree.cutflow_labels == selected.cutflow_labels
+    assert isinstance(tree._columns.columns['sample_id'], RunLengthArray)
+    # columns that were not read are still read from the files
+    assert tree._columns.is_lazy('jet_btag')
+
+    for field in ('jet_pt', 'jet_eta', 'jet_btag', 'x', 'scale', 'sample_id'):
+        assert ak.all(tree[field] == selected[field]), field
+
+    # restored trees can be selected and snapshot again
+    njet = EventFilter('njet4', filter=lambda t : t.n_jet >= 4)(tree)
+    assert len(njet) == np.sum(np.asarray(selected.n_jet) >= 4)
+    assert Tree.restore(njet.snapshot(path)).cutflow_labels == njet.cutflow_labels
+
+def test_not_a_snapshot(mc_tree, tmp_path):
+    (tmp_path / 'data').mkdir()
+    with pytest.raises(ValueError):
+        mc_tree.snapshot(str(tmp_path / 'data'))
+
+def test_state_holds_no_columns(mc_tree, tmp_path):
+    # files opened with a projection keep their arrays
+    for fn in mc_tree.filelist: fn.arrays = mc_tree._columns[['jet_pt', 'jet_eta']]
+    path = mc_tree.snapshot(str(tmp_path / 'snapshot'))
+
+    assert os.path.getsize(os.path.join(path, 'state.pkl')) < 10 * 1024
+    assert all( fn.arrays is not None for fn in mc_tree.filelist )
+    assert all( fn.arrays is None for fn in Tree.restore(path).filelist )
+
+def test_failed_write_keeps_snapshot(mc_tree, tmp_path, monkeypatch):
+    path = mc_tree.snapshot(str(tmp_path / 'snapshots' / 'snapshot'))
+    mc_tree.jet_pt
+
+    def fail(path, buffers): raise OSError('disk full')
+    monkeypatch.setattr(Snapshot, '_save_buffers', fail)
+    with pytest.raises(OSError):
+        mc_tree.snapshot(path)
+
+    assert os.listdir(tmp_path / 'snapshots') == ['snapshot']
+    assert ak.all(Tree.restore(path).jet_pt == mc_tree.jet_pt)
@@ -0,0 +1,31 @@
+import awkward as ak
+import numpy as np
+
+from utils.classUtils import Tree, EventFilter
+
+def _totals(tree):
+    return dict(
+        events=len(tree),
+        njet=int(ak.sum(tree.n_jet)),
+        scale=float(np.sum(np.asarray(tree.scale))),
+        jet_pt=float(ak.sum(tree.jet_pt)),
+        njet_counts=np.bincount(np.asarray(tree.n_jet), minlength=10),
+    )
+
+def test_stream_matches_in_memory(mc_files, mc_tree):
+    streamed = Tree(mc_files, report=False, step_size=128)
+    assert len(list(streamed.iterate(report=False))) > len(mc_files)
+
+    total, expected = streamed.stream(_totals, report=False), _totals(mc_tree)
+    assert total['events'] == expected['events'] and total['njet'] == expected['njet']
+    assert np.isclose(total['scale'], expected['scale']) and np.isclose(total['jet_pt'], expected['jet_pt'])
+    assert np.array_equal(total['njet_counts'], expected['njet_counts'])
+
+def test_stream_cutflow(mc_files, mc_tree):
+    njet = EventFilter('njet', filter=lambda t : t.n_jet >= 3)
+    streamed = Tree(mc_files, report=False, step_size=128)
+
+    total, expected = streamed.stream(njet, report=False), njet(mc_tree)
+    assert total.cutflow_labels == expected.cutflow_labels
+    for streamed_cutflow, cutflow in zip(total.cutflow, expected.cutflow):
+        assert np.allclose(streamed_cutflow.histo, cutflow.histo)
@@ -0,0 +1,54 @@
+import json
+import types
+
+import numpy as np
+
+from utils.classUtils.Tracer import Tracer, nbytes
+
+def test_disabled_records_nothing():
+    tracer = Tracer()
+    with tracer.span('reco', sample='mc') as args:
+        args['bytes'] = 1
+    tracer.add('read', 0, 1)
+    assert tracer.spans == [] and tracer.names == {}
+
+def test_spans():
+    tracer = Tracer().enable()
+    with tracer.span('reco', cat='study', sample='mc') as args:
+        args['bytes'] = nbytes(dict(x=np.zeros(4), y=[np.zeros(2, dtype=np.int32)]))
+
+    span, = tracer.spans
+    assert span['name'] == 'reco' and span['cat'] == 'study'
+    assert span['args'] == dict(sample='mc', bytes=40)
+    assert span['end'] >= span['start']
+    assert tracer.summary()['reco'][0] == 1
+
+def test_collect_and_merge():
+    worker, parent = Tracer().enable(), Tracer().enable()
+    worker.add('run', 0, 1, pid=2, tid=3, process='worker', thread='main')
+
+    parent.merge(worker.collect())
+    assert worker.spans == []
+    assert [ span['pid'] for span in parent.spans ] == [2]
+    assert parent.names[(2, None)] == 'worker'
+
+def test_chrome_trace(tmp_path):
+    tracer = Tracer().enable()
+    tracer.add('read', 1, 1.5, cat='file', pid=1, tid=2, process='main', thread='io', fname='a.root', columns=['x'])
+
+    fname = tracer.export(str(tmp_path / 'trace' / 'trace.json'))
+    with open(fname) as f: trace = json.load(f)
+
+    metadata = [ event for event in trace['traceEvents'] if event['ph'] == 'M' ]
+    assert { event['args']['name'] for event in metadata } == {'main', 'io'}
+
+    event, = [ event for event in trace['traceEvents'] if event['ph'] == 'X' ]
+    assert (event['ts'], event['dur']) == (1e6, 0.5e6)
+    assert event['args'] == dict(fname='a.root', columns="['x']")
+
+def test_memory_report_without_sample(mc_tree, capsys):
+    from utils.notebookUtils.src.notebook import Notebook
+
+    mc_tree.sample = None
+    Notebook.print_memory_report(types.SimpleNamespace(namespace=dict(tree=mc_tree)))
+    assert 'sample_0.parquet' in capsys.readouterr().out
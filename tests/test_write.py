@@ -0,0 +1,31 @@
+import glob
+import os
+
+import awkward as ak
+import numpy as np
+import pytest
+
+from utils.classUtils import Tree, EventFilter
+
+@pytest.mark.parametrize('format', ['parquet', 'arrow'])
+def test_write_by_sample_round_trip(mc_tree, mc_files, format):
+    selected = EventFilter('njet', filter=lambda t : t.n_jet >= 3)(mc_tree)
+    selected.extend(jet_lead=ak.firsts(selected.jet_pt))
+    selected.write_by_sample(altfile='skim_{base}', format=format)
+
+    dirname = os.path.dirname(mc_files[0])
+    fnames = sorted(glob.glob(os.path.join(dirname, f'skim_*.{format}')))
+    assert len(fnames) == len(mc_files)
+
+    tree = Tree(fnames, report=False)
+    assert len(tree) == len(selected)
+    assert tree.cutflow_labels == selected.cutflow_labels
+    assert np.allclose(np.asarray(tree.scale), np.asarray(selected.scale))
+    for field in ('Event', 'n_jet', 'jet_pt', 'jet_lead'):
+        assert ak.all(ak.fill_none(tree[field] == selected[field], True)), field
+
+    # files can be read back with a projection
+    projected = Tree(fnames, report=False, fields=['n_jet', 'genWeight'])
+    assert projected._columns.is_lazy('jet_pt')
+    assert all( fn.arrays is None for fn in projected.filelist )
+    assert ak.all(projected.n_jet == selected.n_jet)
@@ -2,7 +2,7 @@ import numpy as np
 import awkward as ak
 from typing import Callable
 
-from .classUtils import ObjIter, Tree
+from .classUtils import ObjIter, Tree, Regions, RegionCode
 from .utils import ak_stack
 from .config import GIT_WD
 from .xsecUtils import lumiMap
@@ -14,7 +14,7 @@ from sklearn.pipeline import Pipeline
 from hep_ml.preprocessing import IronTransformer
 from hep_ml.gradientboosting import UGradientBoostingClassifier, LogLossFunction
 
-import pickle, os
+import pickle, os, weakref
 
 class BDTReweighter:
   def __init__(self, n_estimators=50, learning_rate=0.1, max_depth=3, min_samples_leaf=1000, gb_args={'subsample':0.4}, n_folds=2, verbose=True, seed=1234, load=None):
@@ -83,12 +83,28 @@ class ABCD(BDTReweighter):
   def __init__(self, features: list = None, a: Callable = None, b: Callable = None, c: Callable = None, d: Callable = None, save=None, **kwargs):
     super().__init__(**kwargs)
     self.feature_names = features
-    self.a, self.b, self.c, self.d = a, b, c, d
-    self.sr = lambda t : self.a(t) | self.b(t)
-    self.cr = lambda t : self.c(t) | self.d(t)
-    self.tr = lambda t : self.a(t) | self.c(t)
-    self.er = lambda t : self.b(t) | self.d(t)
-    self.mask = lambda t: self.sr(t) | self.cr(t)
+
+    # the a, b, c and d cuts are evaluated once per tree into a region code, all region masks and yields come from it
+    self.regions = Regions(
+      dict(a=a, b=b, c=c, d=d), cache=False,
+      sr=lambda c : c['a'] | c['b'],
+      cr=lambda c : c['c'] | c['d'],
+      tr=lambda c : c['a'] | c['c'],
+      er=lambda c : c['b'] | c['d'],
+      mask=lambda c : c['a'] | c['b'] | c['c'] | c['d'],
+    )
+    self.members = self.regions.members()
+    self.region_codes = weakref.WeakKeyDictionary()
+
+    self.a = lambda t : self.region_mask(t, 'a')
+    self.b = lambda t : self.region_mask(t, 'b')
+    self.c = lambda t : self.region_mask(t, 'c')
+    self.d = lambda t : self.region_mask(t, 'd')
+    self.sr = lambda t : self.region_mask(t, 'sr')
+    self.cr = lambda t : self.region_mask(t, 'cr')
+    self.tr = lambda t : self.region_mask(t, 'tr')
+    self.er = lambda t : self.region_mask(t, 'er')
+    self.mask = lambda t : self.region_mask(t, 'mask')
 
   def load(self, fname):
     with open(fname, 'rb') as f:
@@ -98,14 +114,30 @@ class ABCD(BDTReweighter):
 
     return self
 
+  def region_code(self, tree : Tree, weights=None):
+    """Region code of the events of the tree, recomputed when one of the columns read by the cuts is replaced"""
+    cached = self.region_codes.get(tree, None)
+    if cached is not None:
+      reads, code = cached
+      if all( field in tree._columns and tree._columns[field] is column() for field, column in reads.items() ):
+        return RegionCode(code, self.members, weights)
+
+    with tree.record_reads() as fields:
+      code = self.regions.cutset.evaluate(tree, weights=None).word
+    reads = { field: weakref.ref(tree._columns[field]) for field in fields if field in tree._columns }
+    self.region_codes[tree] = (reads, code)
+    return RegionCode(code, self.members, weights)
+
+  def region_mask(self, tree : Tree, region):
+    return self.region_code(tree).mask(region)
+
   def yields(self, treeiter : ObjIter, lumi=None):
     if not isinstance(treeiter, ObjIter): treeiter = ObjIter([treeiter])
 
-    masks = { r: treeiter.apply( getattr(self, r) ).cat for r in ('a','b','c','d') }
     lumi = lumiMap[lumi][0]
-    scale = lumi*treeiter.scale.cat
-    yields = { r:ak.sum(scale[mask]) for r, mask in masks.items() }
-    yields.update(total=ak.sum(scale))
+    code = sum( self.region_code(tree, weights=lumi*np.asarray(tree.scale)) for tree in treeiter )
+    yields = code.yields()
+    yields.update(total=np.sum(code.weights))
 
     return yields
 
@@ -185,7 +217,9 @@ class ABCD(BDTReweighter):
 
     if self.verbose:
       print('... fetching features')
-    X, W, (mask_c, mask_d) = self.get_features(treeiter, masks=[self.c, self.d])
+    X, W = self.get_features(treeiter)
+    code = sum( self.region_code(tree) for tree in treeiter )
+    mask_c, mask_d = code.mask('c'), code.mask('d')
 
     if self.verbose:
         print('... splitting features')
@@ -210,8 +244,8 @@ class ABCD(BDTReweighter):
   def results(self, treeiter: ObjIter):
     scale = treeiter.scale.cat
     reweight = treeiter.apply(self.reweight_tree).cat
-    mask_a = treeiter.apply(self.a).cat
-    mask_b = treeiter.apply(self.b).cat
+    code = sum( self.region_code(tree) for tree in treeiter )
+    mask_a, mask_b = code.mask('a'), code.mask('b')
 
     a_W, b_W = scale[mask_a], scale[mask_b]
     b_R = reweight[mask_b]
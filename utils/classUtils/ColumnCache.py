@@ -0,0 +1,113 @@
+import hashlib
+import glob
+import json
+import os
+
+import awkward as ak
+import numpy as np
+
+from .. import config
+
+
+def _to_buffers(array):
+    if not isinstance(array, ak.Array): array = ak.Array(array)
+    form, length, container = ak.to_buffers(array)
+    form = form.tojson() if hasattr(form, 'tojson') else form.to_json()
+    return form, length, container
+
+def _hash(*items):
+    return hashlib.md5(json.dumps([str(item) for item in items]).encode()).hexdigest()[:16]
+
+def producer_name(producer):
+    """Stable name of a function or ParallelMethod that produces columns"""
+    if isinstance(producer, str): return producer
+    module = getattr(producer, '__module__', None) or type(producer).__module__
+    name = getattr(producer, '__qualname__', None) or type(producer).__qualname__
+    return f'{module}.{name}'.replace('<', '').replace('>', '')
+
+def source_identity(tree):
+    """Identity of the files a tree was built from, using the file uuids when available"""
+    return _hash(*[ getattr(fn, 'uuid', None) or fn.fname for fn in tree.filelist ])
+
+def state_identity(tree):
+    """Identity of the events currently in the tree, from the number of events kept per file and the cutflow"""
+    counts = np.bincount(np.asarray(tree['sample_id']).astype(int), minlength=len(tree.filelist))
+    return _hash(counts.tolist(), tree.cutflow_labels)
+
+class ColumnCache:
+    """
+    On-disk cache of derived columns, one npz file per (source files, events in the tree, producer, version).
+    Least recently used entries are removed above max_size bytes.
+    """
+
+    def __init__(self, path=f'{config.GIT_WD}/.cache/columns/', max_size=10*1024**3):
+        self.path = path
+        self.max_size = max_size
+
+    def fname(self, tree, producer, version=0, **kwargs):
+        key = _hash(state_identity(tree), version, sorted(kwargs.items()))
+        return os.path.join(self.path, f'{producer_name(producer)}__{source_identity(tree)}__{key}.npz')
+
+    def load(self, tree, producer, version=0, **kwargs):
+        fname = self.fname(tree, producer, version, **kwargs)
+        if not os.path.exists(fname): return None
+        return self.load_file(fname)
+
+    def load_file(self, fname):
+        with np.load(fname, allow_pickle=False) as npz:
+            fields = [ str(field) for field in npz['__fields__'] ]
+            columns = dict()
+            for i, field in enumerate(fields):
+                prefix = f'{i}:'
+                container = { key[len(prefix):]: npz[key] for key in npz.files if key.startswith(prefix) }
+                columns[field] = ak.from_buffers(str(npz[f'{i}.form']), int(npz[f'{i}.length']), container)
+
+        os.utime(fname)
+        return columns
+
+    def save(self, tree, producer, columns, version=0, **kwargs):
+        fname = self.fname(tree, producer, version, **kwargs)
+        os.makedirs(self.path, exist_ok=True)
+
+        buffers = dict(__fields__=np.array(list(columns.keys())))
+        for i, (field, array) in enumerate(columns.items()):
+            form, length, container = _to_buffers(array)
+            buffers[f'{i}.form'] = np.array(form)
+            buffers[f'{i}.length'] = np.array(length)
+            buffers.update({ f'{i}:{key}': np.asarray(buffer) for key, buffer in container.items() })
+
+        tmp_fname = fname[:-len('.npz')] + '.tmp.npz'
+        np.savez(tmp_fname, **buffers)
+        os.replace(tmp_fname, fname)
+
+        self.evict()
+        return fname
+
+    def entries(self):
+        return glob.glob(os.path.join(self.path, '*__*__*.npz'))
+
+    @property
+    def size(self):
+        return sum(os.path.getsize(fname) for fname in self.entries())
+
+    def evict(self, max_size=None):
+        """Remove the least recently used entries until the cache is below max_size bytes"""
+        if max_size is None: max_size = self.max_size
+
+        entries = sorted(self.entries(), key=os.path.getmtime)
+        total = sum(os.path.getsize(fname) for fname in entries)
+        for fname in entries:
+            if total <= max_size: break
+            total -= os.path.getsize(fname)
+            os.remove(fname)
+
+    def invalidate(self, tree=None, producer=None):
+        """Remove entries for a producer and/or for the source files of a tree. Removes everything by default"""
+        producer = producer_name(producer) if producer is not None else '*'
+        source = source_identity(tree) if tree is not None else '*'
+
+        for fname in glob.glob(os.path.join(self.path, f'{producer}__{source}__*.npz')):
+            os.remove(fname)
+
+    def clear(self):
+        self.invalidate()
@@ -0,0 +1,230 @@
+import awkward as ak
+import numpy as np
+
+from .RunLengthArray import RunLengthArray
+
+class LazyColumn:
+    """Column that is read on first access as loader(index), with index the selected rows (None for all)"""
+
+    def __init__(self, loader, length, index=None):
+        self.loader = loader
+        self.length = length
+        self.index = index
+        self._value = None
+
+    def __len__(self): 
+        return self.length if self.index is None else len(self.index)
+
+    def __repr__(self): 
+        return f'<LazyColumn {getattr(self.loader, "__name__", type(self.loader).__name__)} length={len(self)} loaded={self.loaded}>'
+
+    @property
+    def loaded(self): return self._value is not None
+
+    def materialize(self):
+        if self._value is None:
+            self._value = _as_column(self.loader(self.index))
+        return self._value
+
+    def __getitem__(self, key):
+        if self.loaded: return self._value[key]
+
+        if isinstance(key, ak.Array) and key.ndim == 1:
+            key = ak.to_numpy(key)
+
+        index = np.arange(self.length) if self.index is None else self.index
+        return LazyColumn(self.loader, self.length, index=index[key])
+
+class Gather:
+    """Loader of a deferred selection of an in-memory column, the rows are only gathered when the column is read"""
+
+    def __init__(self, column):
+        self.column = column
+
+    def __call__(self, index):
+        if index is None: return self.column
+        return self.column[index]
+
+class Concatenate:
+    """Loader of the concatenation of columns, the columns that are not loaded are only read when the concatenation is read"""
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __call__(self, index):
+        # parts are read into new LazyColumns, so that the stores they are taken from do not hold them
+        columns = [ LazyColumn(column.loader, column.length, column.index).materialize() if isinstance(column, LazyColumn) else _as_dense(column) for column in self.columns ]
+        column = ak.concatenate(columns)
+        return column if index is None else column[index]
+
+def concatenate_columns(columns):
+    """Concatenate columns, returns an unloaded LazyColumn if any of the columns is not loaded"""
+    columns = [ column._value if isinstance(column, LazyColumn) and column.loaded else column for column in columns ]
+    if any( isinstance(column, LazyColumn) for column in columns ):
+        return LazyColumn(Concatenate(columns), sum( len(column) for column in columns ))
+    return ak.concatenate([ _as_dense(column) for column in columns ])
+
+def is_deferred(column):
+    return isinstance(column, LazyColumn) and not column.loaded and isinstance(column.loader, Gather)
+
+def _select_reloads(reloads, key):
+    """Apply a selection to the reloads of a store, reloads that share an index also share the selected index"""
+    selected, indices = dict(), dict()
+    for field, reload in reloads.items():
+        shared = indices.get(id(reload.index), None)
+        if shared is None:
+            shared = indices[id(reload.index)] = reload[key]
+        selected[field] = LazyColumn(reload.loader, reload.length, index=shared.index)
+    return selected
+
+def _as_dense(value):
+    if isinstance(value, RunLengthArray): return ak.from_numpy(value.dense())
+    if isinstance(value, LazyColumn): return value.materialize()
+    return value
+
+def _as_column(value, length=None):
+    if isinstance(value, np.ndarray): return ak.from_numpy(value)
+    if isinstance(value, (list, tuple)): return ak.Array(value)
+    if np.isscalar(value) and length is not None: return ak.from_numpy(np.full(length, value))
+    return value
+
+class ColumnStore:
+    """
+    Dict of columns backing a Tree, the record view of all columns is only built on demand.
+    Columns that can be read again keep an unloaded LazyColumn in reloads, so that they can be evicted.
+    """
+
+    @classmethod
+    def from_record(cls, record):
+        if isinstance(record, ColumnStore): return record.copy()
+        if record is None or not any(record.fields): return cls()
+        return cls(zip(record.fields, ak.unzip(record)))
+
+    def __init__(self, columns=None, reloads=None):
+        self.columns = dict(columns or {})
+        self.reloads = dict(reloads or {})
+        self.accessed = dict()
+        self._record = None
+        # memory manager keeping count of the loaded columns, set once the store is registered
+        self.memory = None
+
+    def __getstate__(self):
+        # only send the selected rows of deferred selections
+        deferred = [ key for key, column in self.columns.items() if is_deferred(column) ]
+        columns = { key: column.materialize() if key in deferred else column for key, column in self.columns.items() }
+        for key in deferred: self._changed(key)
+        return dict(columns=columns, reloads=self.reloads)
+
+    def __setstate__(self, state):
+        self.columns = state['columns']
+        self.reloads = state.get('reloads', {})
+        self.accessed = dict()
+        self._record = None
+        self.memory = None
+
+    def _changed(self, key):
+        if self.memory is not None: self.memory.update(self, key)
+
+    @property
+    def fields(self): return list(self.columns.keys())
+
+    def __len__(self):
+        for column in self.columns.values():
+            return len(column)
+        return 0
+
+    def __contains__(self, key): return key in self.columns
+    def __iter__(self): return iter(self.columns)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            column = self.columns[key]
+            if isinstance(column, LazyColumn):
+                if not isinstance(column.loader, Gather):
+                    self.reloads.setdefault(key, LazyColumn(column.loader, column.length, column.index))
+                column = self.columns[key] = column.materialize()
+                self._changed(key)
+            return column
+        if isinstance(key, list) and all(isinstance(k, str) for k in key):
+            return ak.zip({ k: _as_dense(self[k]) for k in key }, depth_limit=1)
+
+        columns = { field: column[key] for field, column in self.columns.items() }
+        return ColumnStore(columns, reloads=_select_reloads(self.reloads, key))
+
+    def select(self, key):
+        """Deferred selection of the rows of every column, each column is only gathered when it is read"""
+        if isinstance(key, ak.Array): key = ak.to_numpy(key)
+
+        columns, deferred = dict(), dict()
+        for field, column in self.columns.items():
+            if isinstance(column, RunLengthArray): 
+                columns[field] = column[key]
+                continue
+            if isinstance(column, LazyColumn) and column.loaded: column = column._value
+            if not isinstance(column, LazyColumn): column = LazyColumn(Gather(column), len(column))
+            deferred[field] = column
+
+        columns.update(_select_reloads(deferred, key))
+        columns = { field: columns[field] for field in self.columns }
+        return ColumnStore(columns, reloads=_select_reloads(self.reloads, key))
+
+    def __setitem__(self, key, value):
+        value = _as_column(value, len(self))
+        if any(self.columns) and len(value) != len(self):
+            raise ValueError(f'column {key} has length {len(value)}, but the store has length {len(self)}')
+
+        self.columns[key] = value
+        self.reloads.pop(key, None)
+        self._record = None
+        self._changed(key)
+
+    def __delitem__(self, key):
+        del self.columns[key]
+        self.reloads.pop(key, None)
+        self._record = None
+        self._changed(key)
+
+    def update(self, *records, **columns):
+        incoming, reloads = dict(), dict()
+        for record in records:
+            if isinstance(record, ColumnStore): 
+                reloads.update({ key: (record.columns[key], reload) for key, reload in record.reloads.items() })
+                record = record.columns
+            elif not isinstance(record, dict): record = dict(zip(record.fields, ak.unzip(record)))
+            incoming.update(record)
+        incoming.update(columns)
+
+        # replacing every column (i.e. after a selection) is allowed to change the length of the store
+        if any(self.columns) and len(incoming) >= len(self.columns) and all( key in incoming for key in self.columns ):
+            incoming = dict({ key: incoming[key] for key in self.columns }, **incoming)
+            self.columns = dict()
+
+        for key, value in incoming.items(): self[key] = value
+
+        # keep the reloads of columns that were taken unchanged from another store
+        self.reloads.update({ key: reload for key, (column, reload) in reloads.items() if self.columns.get(key) is column })
+
+    def copy(self):
+        store = ColumnStore(self.columns, reloads=self.reloads)
+        store._record = self._record
+        return store
+
+    def evict(self, key):
+        """Replace a loaded column by its reload, returns False if the column can not be reloaded"""
+        if key not in self.reloads: return False
+        self.columns[key] = self.reloads[key]
+        self.reloads[key] = LazyColumn(self.reloads[key].loader, self.reloads[key].length, self.reloads[key].index)
+        self._record = None
+        self._changed(key)
+        return True
+
+    def is_lazy(self, key):
+        return isinstance(self.columns.get(key), LazyColumn)
+
+    @property
+    def record(self):
+        """Record view of all columns, built on demand"""
+        if self._record is None:
+            columns = { field: _as_dense(self[field]) for field in self.columns }
+            self._record = ak.zip(columns, depth_limit=1) if any(columns) else ak.Array([])
+        return self._record
@@ -0,0 +1,133 @@
+import json
+import os
+import uuid
+
+import awkward as ak
+import numpy as np
+
+from .ColumnStore import _as_column, _as_dense
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.ipc as ipc
+except ImportError:
+    pa = pq = ipc = None
+
+extensions = {
+    'parquet': '.parquet',
+    'arrow': '.arrow',
+}
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError('pyarrow is required to read and write parquet/arrow files')
+
+def is_columnar(fname):
+    return any( fname.endswith(ext) for ext in extensions.values() )
+
+def columnar_fname(fname, format):
+    """Replace the extension of fname with the one of format"""
+    base, ext = os.path.splitext(fname)
+    if ext not in ('.root', *extensions.values()): base = fname
+    return base + extensions[format]
+
+def write_columnar(fname, arrays, format='parquet', codec='zstd', row_group_size=None, metadata=None):
+    """Write a dict of (jagged) awkward arrays to a parquet or arrow IPC file
+
+    Args:
+        fname (str): output file
+        arrays (dict): field -> array
+        format (str, optional): 'parquet' or 'arrow'. Defaults to 'parquet'.
+        codec (str, optional): compression codec (zstd, lz4, snappy, gzip or None). Defaults to 'zstd'.
+        row_group_size (int, optional): number of events per row group (parquet) or record batch (arrow). Defaults to the pyarrow default.
+        metadata (dict, optional): json serializable metadata stored in the schema. Defaults to None.
+    """
+    _require_pyarrow()
+    if format not in extensions:
+        raise ValueError(f'Unknown columnar format {format}, expected one of {list(extensions)}')
+
+    arrays = { field: _as_dense(_as_column(array)) for field, array in dict(arrays).items() }
+    table = ak.to_arrow_table(ak.zip(arrays, depth_limit=1), extensionarray=False)
+
+    metadata = dict(metadata or {}, uuid=str(uuid.uuid4()))
+    schema_metadata = dict(table.schema.metadata or {})
+    schema_metadata.update({ f'eightb:{key}'.encode(): json.dumps(value).encode() for key, value in metadata.items() })
+    table = table.replace_schema_metadata(schema_metadata)
+
+    if format == 'parquet':
+        pq.write_table(table, fname, compression=codec or 'none', row_group_size=row_group_size)
+    else:
+        options = ipc.IpcWriteOptions(compression=codec)
+        with pa.OSFile(fname, 'wb') as sink, ipc.new_file(sink, table.schema, options=options) as writer:
+            writer.write_table(table, max_chunksize=row_group_size)
+
+def _schema(fname):
+    if fname.endswith(extensions['parquet']):
+        return pq.read_schema(fname)
+    with pa.memory_map(fname) as source:
+        return ipc.open_file(source).schema
+
+def read_info(fname):
+    """Fields, number of entries and metadata of a columnar file, without reading any column"""
+    _require_pyarrow()
+    schema = _schema(fname)
+
+    if fname.endswith(extensions['parquet']):
+        num_entries = pq.ParquetFile(fname).metadata.num_rows
+    else:
+        with pa.memory_map(fname) as source:
+            reader = ipc.open_file(source)
+            num_entries = sum( reader.get_batch(i).num_rows for i in range(reader.num_record_batches) )
+
+    metadata = {
+        key.decode()[len('eightb:'):]: json.loads(value)
+        for key, value in (schema.metadata or {}).items() if key.startswith(b'eightb:')
+    }
+    return dict(fields=list(schema.names), num_entries=num_entries, metadata=metadata)
+
+def read_columnar(fname, fields=None, entry_start=None, entry_stop=None):
+    """Read fields (all by default) of a columnar file as a record array, only reading the requested columns"""
+    _require_pyarrow()
+    if fields is not None: fields = list(fields)
+
+    if fname.endswith(extensions['parquet']):
+        table = pq.read_table(fname, columns=fields)
+    else:
+        with pa.memory_map(fname) as source:
+            table = ipc.open_file(source).read_all()
+        if fields is not None: table = table.select(fields)
+
+    if entry_start is not None or entry_stop is not None:
+        start = entry_start or 0
+        stop = table.num_rows if entry_stop is None else entry_stop
+        table = table.slice(start, stop - start)
+
+    return ak.from_arrow(table)
+
+def iterate_columnar(fname, fields=None, step_size=None):
+    """Iterate over a columnar file in chunks of step_size entries, or by row group if step_size is not a number of entries
+
+    Yields:
+        tuple: (arrays, entry_start)
+    """
+    _require_pyarrow()
+    if fields is not None: fields = list(fields)
+    batch_size = step_size if isinstance(step_size, int) else None
+
+    if fname.endswith(extensions['parquet']):
+        parquet = pq.ParquetFile(fname)
+        if batch_size is None:
+            batches = ( parquet.read_row_group(i, columns=fields) for i in range(parquet.num_row_groups) )
+        else:
+            batches = parquet.iter_batches(batch_size=batch_size, columns=fields)
+    else:
+        source = pa.memory_map(fname)
+        table = ipc.open_file(source).read_all()
+        if fields is not None: table = table.select(fields)
+        batches = table.to_batches(max_chunksize=batch_size)
+
+    start = 0
+    for batch in batches:
+        yield ak.from_arrow(batch), start
+        start += batch.num_rows
@@ -0,0 +1,146 @@
+import itertools
+
+import awkward as ak
+import numpy as np
+
+from .Filter import Filter, EventFilter, event_mask
+
+def _word_dtype(ncuts):
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if ncuts <= 8*np.dtype(dtype).itemsize: return dtype
+    raise ValueError(f'A cut word holds at most 64 cuts, got {ncuts}')
+
+class CutSet:
+    """
+    Named event cuts (functions of the tree, cached through Filter unless cache=False, EventFilters or expressions),
+    evaluated once per tree into a CutWord with one bit per cut.
+
+    Example:
+        cuts = CutSet(njet=lambda t : t.n_jet >= 4, btag='n_medium_btag > 2', pt='ak.firsts(jet_pt) > 50')
+        word = cuts(tree)
+        word.nminus1('pt')          # mask of events passing every cut but pt
+        word.cutflow(['pt', 'btag', 'njet'])
+    """
+
+    def __init__(self, cuts=None, cache=True, **kwargs):
+        cuts = dict(cuts or {}, **kwargs)
+        _word_dtype(len(cuts))
+        if cache:
+            cuts = { name: Filter(cut) if callable(cut) and not isinstance(cut, (Filter, EventFilter)) else cut for name, cut in cuts.items() }
+        self.cuts = cuts
+
+    @property
+    def names(self): return list(self.cuts)
+
+    def _mask(self, tree, cut):
+        if isinstance(cut, EventFilter): mask = event_mask(cut, tree)
+        elif isinstance(cut, str): mask = tree[cut]
+        else: mask = cut(tree)
+        if isinstance(mask, (bool, np.bool_)): return np.full(len(tree), mask)
+        if isinstance(mask, ak.Array): mask = ak.to_numpy(ak.fill_none(mask, False))
+        return np.asarray(mask, dtype=bool)
+
+    def evaluate(self, tree, weights='scale'):
+        """Evaluate every cut once on the tree
+
+        Args:
+            tree (Tree): tree to evaluate the cuts on
+            weights (str, array or None, optional): event weights of the yields, a field of the tree or an array. Defaults to 'scale'.
+
+        Returns:
+            CutWord: cut word of every event
+        """
+        dtype = _word_dtype(len(self.cuts))
+        word = np.zeros(len(tree), dtype=dtype)
+        for bit, cut in enumerate(self.cuts.values()):
+            word |= self._mask(tree, cut).astype(dtype) << dtype(bit)
+
+        if isinstance(weights, str):
+            weights = tree[weights] if weights in tree.fields else None
+        if weights is not None: weights = np.asarray(ak.to_numpy(weights) if isinstance(weights, ak.Array) else weights, dtype=float)
+        return CutWord(self.names, word, weights)
+
+    def __call__(self, tree, weights='scale'):
+        if isinstance(tree, list):
+            return [ self.evaluate(t, weights) for t in tree ]
+        return self.evaluate(tree, weights)
+
+class CutWord:
+    """Cut word of every event, bit i is set when the event passes cut i of the CutSet"""
+    # above this number of cuts the combination yields do not fit in memory, and yields are computed from the words
+    max_combination_cuts = 20
+
+    def __init__(self, names, word, weights=None):
+        self.names = list(names)
+        self.word = word
+        self.weights = weights
+        self._combinations = None
+
+    def __len__(self): return len(self.word)
+
+    def bits(self, names):
+        if isinstance(names, str): names = [names]
+        missing = [ name for name in names if name not in self.names ]
+        if any(missing): raise KeyError(f'Unknown cuts {missing}, expected one of {self.names}')
+        return sum( 1 << self.names.index(name) for name in names )
+
+    def mask(self, names=None, exclude=()):
+        """Events passing every cut in names (all cuts by default), except the ones in exclude"""
+        names = self.names if names is None else ([names] if isinstance(names, str) else names)
+        required = self.word.dtype.type(self.bits([ name for name in names if name not in exclude ]))
+        return (self.word & required) == required
+
+    def nminus1(self, name):
+        """Events passing every cut but name"""
+        return self.mask(exclude=[name])
+
+    def nminus1_masks(self):
+        return { name: self.nminus1(name) for name in self.names }
+
+    def apply(self, tree, names=None, exclude=()):
+        """Copy of the tree with the events passing the cuts, the selection is deferred (see Tree.select)"""
+        tree = tree.copy()
+        tree.select(self.mask(names, exclude))
+        return tree
+
+    @property
+    def combinations(self):
+        """Weighted number of events for each value of the cut word, indexed by the word"""
+        if self._combinations is None:
+            if len(self.names) > self.max_combination_cuts: return None
+            self._combinations = np.bincount(self.word.astype(np.int64), weights=self.weights, minlength=1 << len(self.names))
+        return self._combinations
+
+    def yields(self, names=None, exclude=()):
+        """Weighted number of events passing every cut in names (all by default), except the ones in exclude"""
+        names = self.names if names is None else ([names] if isinstance(names, str) else names)
+        required = self.bits([ name for name in names if name not in exclude ])
+
+        combinations = self.combinations
+        if combinations is None:
+            mask = self.mask(names, exclude)
+            return np.sum(self.weights[mask]) if self.weights is not None else np.sum(mask)
+        words = np.arange(len(combinations))
+        return np.sum(combinations[(words & required) == required])
+
+    def nminus1_yields(self):
+        return { name: self.yields(exclude=[name]) for name in self.names }
+
+    def cutflow(self, order=None):
+        """Cumulative yields applying the cuts in order (the order of the CutSet by default)
+
+        Returns:
+            dict: name -> yield after applying the cuts up to name, with the total under None
+        """
+        order = self.names if order is None else list(order)
+        cutflow = { None: self.yields([]) }
+        for i, name in enumerate(order):
+            cutflow[name] = self.yields(order[:i+1])
+        return cutflow
+
+    def combination_yields(self):
+        """Yield of every subset of cuts, as tuple of names -> weighted number of events passing all of them"""
+        return {
+            names: self.yields(list(names))
+            for n in range(len(self.names)+1) for names in itertools.combinations(self.names, n)
+        }
@@ -0,0 +1,106 @@
+import numpy as np
+
+from .RunLengthArray import RunLengthArray
+
+def _dense(array):
+    if isinstance(array, RunLengthArray): return array.dense()
+    if hasattr(array, 'to_numpy'): return array.to_numpy()
+    return np.asarray(array)
+
+def _rle_sums(sample_id, nfiles, weights=None):
+    """Per file sums of weights and weights² of a run length encoded sample_id, without expanding it"""
+    runs = sample_id.counts > 0
+    values, offsets = sample_id.values[runs].astype(np.int64), sample_id.offsets[:-1][runs]
+    if weights is None:
+        counts = np.bincount(values, weights=sample_id.counts[runs], minlength=nfiles)
+        return counts, counts
+    weights = np.asarray(weights, dtype=float)
+    sumw = np.bincount(values, weights=np.add.reduceat(weights, offsets), minlength=nfiles) if len(values) else np.zeros(nfiles)
+    sumw2 = np.bincount(values, weights=np.add.reduceat(weights**2, offsets), minlength=nfiles) if len(values) else np.zeros(nfiles)
+    return sumw, sumw2
+
+def cutflow_sums(sample_id, nfiles, weights=None, stage=None, nstages=1):
+    """Per file sums of weights and weights² of each cutflow stage, in one bincount
+
+    Args:
+        sample_id (array): file index of each event
+        nfiles (int): number of files
+        weights (array, optional): weight of each event (i.e. genWeight). Defaults to unit weights.
+        stage (array, optional): number of stages passed by each event. Defaults to all of them.
+        nstages (int, optional): number of stages. Defaults to 1.
+
+    Returns:
+        tuple: (sumw, sumw2) arrays of shape (nstages, nfiles)
+    """
+    if stage is None:
+        if isinstance(sample_id, RunLengthArray):
+            sumw, sumw2 = _rle_sums(sample_id, nfiles, weights)
+        else:
+            sample_id = _dense(sample_id).astype(np.int64)
+            weights = None if weights is None else _dense(weights).astype(float)
+            sumw = np.bincount(sample_id, weights=weights, minlength=nfiles)
+            sumw2 = sumw if weights is None else np.bincount(sample_id, weights=weights**2, minlength=nfiles)
+        return np.tile(sumw, (nstages, 1)).astype(float), np.tile(sumw2, (nstages, 1)).astype(float)
+
+    # key each event by (file, last stage passed), then count it for every stage up to the last one
+    key = _dense(sample_id).astype(np.int64) * (nstages + 1) + np.minimum(_dense(stage), nstages)
+    size = nfiles * (nstages + 1)
+
+    def _per_stage(w):
+        counts = np.bincount(key, weights=w, minlength=size).reshape(nfiles, nstages + 1)
+        return np.cumsum(counts[:, ::-1], axis=1)[:, ::-1][:, 1:].T.astype(float)
+
+    weights = None if weights is None else _dense(weights).astype(float)
+    sumw = _per_stage(weights)
+    sumw2 = sumw if weights is None else _per_stage(weights**2)
+    return sumw, sumw2
+
+class CutflowAccumulator:
+    """
+    Per file sums of weights and weights² of each cutflow stage, as arrays of shape (nstages, nfiles).
+    Accumulators of the same files are merged with + (missing stages count as empty).
+    """
+
+    def __init__(self, nfiles, sumw=None, sumw2=None):
+        self.nfiles = nfiles
+        self.sumw = np.zeros((0, nfiles)) if sumw is None else np.asarray(sumw, dtype=float)
+        self.sumw2 = np.zeros((0, nfiles)) if sumw2 is None else np.asarray(sumw2, dtype=float)
+
+    @classmethod
+    def from_histos(cls, cutflows):
+        nstages = max( (len(cutflow.histo) for cutflow in cutflows), default=0 )
+        def _pad(array): return np.pad(np.asarray(array, dtype=float), (0, nstages - len(array)))
+        sumw = np.array([ _pad(cutflow.histo) for cutflow in cutflows ]).reshape(len(cutflows), nstages).T
+        sumw2 = np.array([ _pad(np.asarray(cutflow.error)**2) for cutflow in cutflows ]).reshape(len(cutflows), nstages).T
+        return cls(len(cutflows), sumw, sumw2)
+
+    @property
+    def nstages(self): return len(self.sumw)
+
+    def fill(self, sample_id, weights=None, stage=None, nstages=1):
+        """Append nstages stages, see cutflow_sums"""
+        sumw, sumw2 = cutflow_sums(sample_id, self.nfiles, weights, stage, nstages)
+        self.sumw = np.concatenate([self.sumw, sumw])
+        self.sumw2 = np.concatenate([self.sumw2, sumw2])
+        return self
+
+    def _padded(self, nstages):
+        pad = ((0, nstages - self.nstages), (0, 0))
+        return np.pad(self.sumw, pad), np.pad(self.sumw2, pad)
+
+    def merge(self, other):
+        if self.nfiles != other.nfiles:
+            raise ValueError(f'Cannot merge cutflows of {self.nfiles} and {other.nfiles} files')
+        nstages = max(self.nstages, other.nstages)
+        (sumw, sumw2), (other_sumw, other_sumw2) = self._padded(nstages), other._padded(nstages)
+        return CutflowAccumulator(self.nfiles, sumw + other_sumw, sumw2 + other_sumw2)
+
+    def __add__(self, other): return self.merge(other)
+    def __radd__(self, other):
+        if other == 0: return self
+        return other.merge(self)
+
+    def histos(self):
+        from ..plotUtils import Histo
+        bins = np.arange(self.nstages + 1)
+        return [ Histo(self.sumw[:, i], bins, np.sqrt(self.sumw2[:, i])) for i in range(self.nfiles) ]
@@ -0,0 +1,152 @@
+import glob
+
+import awkward as ak
+import numpy as np
+import uproot as ut
+
+from .ColumnStore import LazyColumn
+from .MemoryManager import read_entries
+
+# names of the (run, lumi, event) key in nanoAOD and in the ntuples
+event_keys = [
+    ('run', 'luminosityBlock', 'event'),
+    ('Run', 'LumiSec', 'Event'),
+]
+
+key_dtype = np.dtype([('run', np.int64), ('lumi', np.int64), ('event', np.int64)])
+
+def find_keys(fields):
+    """Return the (run, lumi, event) field names found in fields"""
+    fields = set(fields)
+    keys = next( (keys for keys in event_keys if all(key in fields for key in keys)), None )
+    if keys is None:
+        raise KeyError(f'No event keys found. Expected one of {event_keys}')
+    return keys
+
+def pack_keys(run, lumi, event):
+    """Pack the key arrays into one structured array that sorts by (run, lumi, event)"""
+    keys = np.empty(len(run), dtype=key_dtype)
+    keys['run'] = np.asarray(run)
+    keys['lumi'] = np.asarray(lumi)
+    keys['event'] = np.asarray(event)
+    return keys
+
+class EventIndex:
+    """Sorted index of (run, lumi, event) keys, lookup returns the position of each key (-1 if missing)"""
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.order = np.argsort(keys, kind='stable')
+        self.sorted = keys[self.order]
+
+    def __len__(self): return len(self.keys)
+
+    @property
+    def duplicates(self):
+        """Number of keys that appear more than once"""
+        return int(np.count_nonzero(self.sorted[1:] == self.sorted[:-1]))
+
+    def lookup(self, keys):
+        if len(self.sorted) == 0: return np.full(len(keys), -1)
+
+        position = np.searchsorted(self.sorted, keys)
+        position = np.minimum(position, len(self.sorted)-1)
+        found = self.sorted[position] == keys
+        return np.where(found, self.order[position], -1)
+
+class Friend:
+    """
+    Columns keyed by (run, lumi, event), from ROOT files (or glob patterns) or in memory arrays.
+    Only the keys are read up front, columns are read for the matched entries when first accessed.
+    """
+
+    def __init__(self, source, treename='Events', keys=None):
+        self.treename = treename
+
+        if isinstance(source, str): source = [source]
+        if isinstance(source, (list, tuple)):
+            self.files = [ fn for pattern in source for fn in sorted(glob.glob(pattern)) or [pattern] ]
+            self.arrays = None
+            self.fields = self._file_fields()
+        else:
+            self.files = None
+            self.arrays = { field: source[field] for field in (source.fields if hasattr(source, 'fields') else source.keys()) }
+            self.fields = list(self.arrays.keys())
+
+        self.key_fields = tuple(keys) if keys is not None else find_keys(self.fields)
+        self._index = None
+
+    def __repr__(self):
+        source = f'{len(self.files)} files' if self.files is not None else 'arrays'
+        return f'<Friend {source} keys={self.key_fields} fields={len(self.fields)}>'
+
+    def _file_fields(self):
+        with ut.open(f'{self.files[0]}:{self.treename}') as tree:
+            return list(tree.keys())
+
+    @property
+    def index(self):
+        if self._index is None:
+            if self.arrays is not None:
+                keys = pack_keys(*[ self.arrays[key] for key in self.key_fields ])
+                self.offsets = np.array([0, len(keys)])
+            else:
+                keys, counts = [], []
+                for fn in self.files:
+                    with ut.open(f'{fn}:{self.treename}') as tree:
+                        arrays = tree.arrays(list(self.key_fields), library='np')
+                    keys.append(pack_keys(*[ arrays[key] for key in self.key_fields ]))
+                    counts.append(len(keys[-1]))
+                keys = np.concatenate(keys) if len(keys) else pack_keys([], [], [])
+                self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+            self._index = EventIndex(keys)
+        return self._index
+
+    def lookup(self, keys):
+        return self.index.lookup(keys)
+
+    def read(self, field, rows):
+        """Read field at the given (global) rows of the friend"""
+        if self.arrays is not None:
+            return self.arrays[field][rows]
+
+        return read_entries([ (fn, self.treename) for fn in self.files ], self.offsets, field, rows)
+
+class FriendLoader:
+    """Loader of a LazyColumn that joins a friend column onto the keys of a tree"""
+
+    def __init__(self, friend, field, keys, strict=False):
+        self.friend = friend
+        self.field = field
+        self.keys = keys
+        self.strict = strict
+        self.__name__ = field
+
+    def __call__(self, index=None):
+        keys = self.keys if index is None else self.keys[index]
+        rows = self.friend.lookup(keys)
+
+        found = rows >= 0
+        if self.strict and not np.all(found):
+            raise KeyError(f'{np.count_nonzero(~found)} events have no match in friend for {self.field}')
+
+        if not np.any(found):
+            return ak.Array([None]*len(rows))
+
+        array = self.friend.read(self.field, np.where(found, rows, rows[found][0]))
+        if np.all(found): return array
+        return ak.mask(array, found)
+
+def attach_friend(tree, friend, fields=None, keys=None, prefix='', strict=False):
+    """Add lazy columns to a tree from a Friend, matched by the event keys of the tree"""
+    tree_keys = tuple(keys) if keys is not None else find_keys(tree.fields)
+    packed = pack_keys(*[ tree[key] for key in tree_keys ])
+
+    if fields is None:
+        fields = [ field for field in friend.fields if field not in friend.key_fields ]
+
+    tree.extend(**{
+        f'{prefix}{field}': LazyColumn(FriendLoader(friend, field, packed, strict=strict), len(packed))
+        for field in fields
+    })
+    return friend
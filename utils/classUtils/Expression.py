@@ -0,0 +1,261 @@
+import ast
+import operator
+import re
+import threading
+from collections import OrderedDict
+
+import awkward as ak
+import numpy as np
+
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+from .RunLengthArray import RunLengthArray
+
+scope = dict(ak=ak, np=np, len=len)
+
+_cache_lock = threading.Lock()
+
+def _compile_cached(cls, text):
+    """cls(text) from the least recently used cache of cls, holding at most cls.cache_size entries"""
+    with _cache_lock:
+        compiled = cls.cache.get(text, None)
+        if compiled is not None:
+            cls.cache.move_to_end(text)
+            return compiled
+
+    compiled = cls(text)
+    with _cache_lock:
+        cls.cache[text] = compiled
+        while len(cls.cache) > cls.cache_size: cls.cache.popitem(last=False)
+    return compiled
+
+numexpr_functions = {
+    'abs', 'sqrt', 'exp', 'log', 'log10', 'sin', 'cos', 'tan', 'arcsin', 'arccos', 'arctan', 'arctan2',
+    'sinh', 'cosh', 'tanh', 'where',
+}
+# numexpr only has these for floats, integer columns are evaluated by numpy to keep their dtype
+numexpr_float_functions = {'abs'}
+numexpr_nodes = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Name, ast.Constant, ast.Load, ast.Call, ast.Attribute,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.Mod, ast.USub, ast.UAdd, ast.Invert, ast.BitAnd, ast.BitOr,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+)
+
+class _strip_numpy(ast.NodeTransformer):
+    """Rewrite np.f(...) as f(...) for numexpr"""
+    def visit_Attribute(self, node):
+        if isinstance(node.value, ast.Name) and node.value.id == 'np':
+            return ast.copy_location(ast.Name(id=node.attr, ctx=ast.Load()), node)
+        return node
+
+def _numexpr_source(tree):
+    for node in ast.walk(tree):
+        if not isinstance(node, numexpr_nodes): return None
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float, bool)): return None
+        if isinstance(node, ast.Attribute) and not (isinstance(node.value, ast.Name) and node.value.id == 'np'): return None
+        if isinstance(node, ast.Call):
+            func = node.func.attr if isinstance(node.func, ast.Attribute) else getattr(node.func, 'id', None)
+            if func not in numexpr_functions or node.keywords: return None
+    return ast.unparse(_strip_numpy().visit(tree))
+
+def _flat_numpy(column):
+    if isinstance(column, RunLengthArray): return column.dense()
+    if isinstance(column, np.ndarray): return column if column.ndim == 1 else None
+    try:
+        column = ak.to_numpy(column, allow_missing=False)
+    except Exception:
+        return None
+    return column if column.ndim == 1 and column.dtype.kind in 'biuf' else None
+
+_selection_operators = { '&&': ' and ', '||': ' or ', '!': ' not ' }
+
+def _offsets(text):
+    """Offset of the first character of each line of text, in utf-8 bytes like the ast column offsets"""
+    starts = [0]
+    for line in text.split('\n')[:-1]: starts.append(starts[-1] + len(line.encode()) + 1)
+    return starts
+
+class _bitwise_logic(ast.NodeTransformer):
+    """Rewrite the and/or/not written as &&, || and ! (at the offsets in marks) as the elementwise &, | and ~,
+    keeping the precedence of the boolean operators. Python and/or/not keep their meaning."""
+    def __init__(self, text, marks):
+        self.starts = _offsets(text)
+        self.marks = sorted(marks)
+
+    def _offset(self, lineno, col):
+        return self.starts[lineno-1] + col
+
+    def _marked(self, lo, hi):
+        return any( lo <= mark < hi for mark in self.marks )
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        op = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+        value = node.values[0]
+        for previous, other in zip(node.values[:-1], node.values[1:]):
+            gap = self._offset(previous.end_lineno, previous.end_col_offset), self._offset(other.lineno, other.col_offset)
+            if self._marked(*gap):
+                value = ast.BinOp(left=value, op=op, right=other)
+            else:
+                value = ast.BoolOp(op=node.op, values=[value, other])
+        return ast.copy_location(value, node)
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            start = self._offset(node.lineno, node.col_offset)
+            if self._marked(start, start+1):
+                return ast.copy_location(ast.UnaryOp(op=ast.Invert(), operand=node.operand), node)
+        return node
+
+def parse(expr):
+    """Parse an expression, with &&, || and ! as elementwise logic that binds looser than comparisons"""
+    text, marks, last = '', [], 0
+    for match in re.finditer(r'&&|\|\||!(?!=)', expr):
+        text += expr[last:match.start()]
+        keyword = _selection_operators[match.group()]
+        marks.append(len(text.encode()) + 1)
+        text += keyword
+        last = match.end()
+    text += expr[last:]
+
+    # strip leading spaces without moving the marks
+    stripped = text.lstrip()
+    marks = [ mark - (len(text.encode()) - len(stripped.encode())) for mark in marks ]
+    tree = ast.parse(stripped.rstrip(), mode='eval')
+    return ast.fix_missing_locations(_bitwise_logic(stripped, marks).visit(tree))
+
+def label(node):
+    """Selection text of a parsed expression"""
+    text = ast.unparse(node)
+    return text.replace(' & ', ' && ').replace(' | ', ' || ').replace('~', '!')
+
+class Expression:
+    """
+    Expression of tree fields, compiled once per string (the last cache_size are kept).
+    Arithmetic of flat numeric fields is evaluated with numexpr when it is installed.
+    """
+    cache = OrderedDict()
+    cache_size = 4096
+    use_numexpr = True
+
+    @classmethod
+    def compile(cls, expr):
+        return _compile_cached(cls, expr)
+
+    def __init__(self, expr):
+        self.expr = expr
+
+        tree = parse(expr)
+        names = set( node.id for node in ast.walk(tree) if isinstance(node, ast.Name) )
+        calls = set( node.func.id for node in ast.walk(tree) if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) )
+        self.fields = tuple(sorted(names - calls - set(scope.keys())))
+
+        self.code = compile(tree, f'<{expr}>', 'eval')
+        self.numexpr = _numexpr_source(tree)
+        functions = set( node.func.attr if isinstance(node.func, ast.Attribute) else getattr(node.func, 'id', None) for node in ast.walk(tree) if isinstance(node, ast.Call) )
+        self.float_only = any(functions & numexpr_float_functions)
+
+    def evaluate(self, columns):
+        if self.use_numexpr and numexpr is not None and self.numexpr is not None and any(self.fields):
+            arrays = { field: _flat_numpy(columns[field]) for field in self.fields if field in columns }
+            usable = len(arrays) == len(self.fields) and all( array is not None for array in arrays.values() )
+            if usable and self.float_only: usable = all( array.dtype.kind == 'f' for array in arrays.values() )
+            if usable:
+                return ak.from_numpy(numexpr.evaluate(self.numexpr, local_dict=arrays))
+        return eval(self.code, scope, dict(columns))
+
+    def __call__(self, columns): return self.evaluate(columns)
+    def __repr__(self): return f'<Expression {self.expr} fields={self.fields}>'
+
+
+_operators = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+    ast.Pow: operator.pow, ast.Mod: operator.mod, ast.BitAnd: operator.and_, ast.BitOr: operator.or_,
+    ast.USub: operator.neg, ast.UAdd: operator.pos, ast.Invert: operator.invert,
+    ast.Eq: operator.eq, ast.NotEq: operator.ne, ast.Lt: operator.lt, ast.LtE: operator.le, ast.Gt: operator.gt, ast.GtE: operator.ge,
+}
+
+class Selection:
+    """
+    Selection written as text, i.e. "n_jet >= 4 && ak.firsts(jet_pt) > 75 && ak.all(abs(jet_eta) < 2.5, axis=1)"
+
+    Each && term is a cut labeled with its text, subexpressions are evaluated through Tree[expr] and memoized on the tree.
+    Every cut is evaluated on all events (&& does not short-circuit), so objects are read with ak.firsts and the like
+    rather than jet_pt[:,0], which fails on events without jets. Events where a cut is None do not pass it.
+    """
+    cache = OrderedDict()
+    cache_size = 1024
+
+    @classmethod
+    def compile(cls, text):
+        return _compile_cached(cls, text)
+
+    def __init__(self, text):
+        self.text = text
+        self.tree = parse(text)
+
+        terms, stack = [], [self.tree.body]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitAnd):
+                stack += [node.right, node.left]
+            else:
+                terms.append(node)
+        self.cuts = terms
+        self.labels = [ label(cut) for cut in self.cuts ]
+        self.label = ' && '.join(self.labels)
+        self.fields = tuple(sorted(set( field for cut in self.cuts for field in Expression.compile(ast.unparse(cut)).fields )))
+
+    @property
+    def elementwise(self):
+        """True if every cut only uses elementwise operations, so it can be evaluated on flattened (object) arrays"""
+        return all( Expression.compile(ast.unparse(cut)).numexpr is not None for cut in self.cuts )
+
+    def _evaluate(self, node, get, memo):
+        source = ast.unparse(node)
+        if source in memo: return memo[source]
+
+        expression = Expression.compile(source)
+        if isinstance(node, ast.Constant):
+            value = node.value
+        elif (expression.numexpr is not None and any(expression.fields)) or not isinstance(node, (ast.BinOp, ast.UnaryOp, ast.Compare)):
+            value = get(source)
+        elif isinstance(node, ast.BinOp):
+            value = _operators[type(node.op)](self._evaluate(node.left, get, memo), self._evaluate(node.right, get, memo))
+        elif isinstance(node, ast.UnaryOp):
+            value = _operators[type(node.op)](self._evaluate(node.operand, get, memo))
+        else:
+            left, value = self._evaluate(node.left, get, memo), True
+            for op, comparator in zip(node.ops, node.comparators):
+                right = self._evaluate(comparator, get, memo)
+                value = value & _operators[type(op)](left, right)
+                left = right
+
+        memo[source] = value
+        return value
+
+    def _getter(self, tree, prefix=None):
+        if hasattr(tree, 'get_expr'): return lambda source: tree[source]
+
+        # records (i.e. a collection) and dicts of arrays, fields can be named without the collection prefix
+        fields = tree.fields if isinstance(tree, ak.Array) else list(tree.keys())
+        columns = { field: tree[field] for field in fields }
+        if prefix is not None:
+            columns.update({ field[len(prefix)+1:]: column for field, column in columns.items() if field.startswith(f'{prefix}_') })
+        return lambda source: Expression.compile(source).evaluate(columns)
+
+    def masks(self, tree, prefix=None):
+        """Mask of every cut of the selection"""
+        get, memo = self._getter(tree, prefix), dict()
+        return [ self._evaluate(cut, get, memo) for cut in self.cuts ]
+
+    def evaluate(self, tree, prefix=None):
+        """Mask of the events (or objects) passing the selection"""
+        return self._evaluate(self.tree.body, self._getter(tree, prefix), dict())
+
+    def __call__(self, tree, prefix=None): return self.evaluate(tree, prefix)
+    def __repr__(self): return f'<Selection {self.text} fields={self.fields}>'
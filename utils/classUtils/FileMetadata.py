@@ -0,0 +1,89 @@
+import hashlib
+import glob
+import json
+import os
+
+import numpy as np
+
+from .. import config
+
+class FileMetadataCache:
+    """
+    On-disk index of the entries, branches and normalization of files, one json entry per file
+    that is used while the modification time and size of the file are unchanged.
+    """
+
+    def __init__(self, path=f'{config.GIT_WD}/.cache/filemeta/'):
+        self.path = path
+
+    @staticmethod
+    def stat(fname):
+        try:
+            stat = os.stat(fname)
+        except OSError:
+            return None
+        return dict(path=os.path.abspath(fname), mtime=stat.st_mtime, size=stat.st_size)
+
+    def fname(self, fname):
+        key = hashlib.md5(os.path.abspath(fname).encode()).hexdigest()
+        return os.path.join(self.path, f'{key}.json')
+
+    def _read(self, fname):
+        stat = self.stat(fname)
+        if stat is None: return None, None
+
+        entry_fname = self.fname(fname)
+        if not os.path.exists(entry_fname): return stat, None
+
+        try:
+            with open(entry_fname) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return stat, None
+
+        if any( entry.get(key) != value for key, value in stat.items() ): return stat, None
+        return stat, entry
+
+    def load(self, fname, treename, normalization=None):
+        """Cached metadata of treename in fname, and of its normalization, or None if it is missing or stale"""
+        _, entry = self._read(fname)
+        if entry is None: return None
+
+        tree = entry['trees'].get(treename, None)
+        if tree is None: return None
+
+        if normalization is not None:
+            norm = entry['normalizations'].get(str(normalization), None)
+            if norm is None: return None
+            return dict(tree, normalization=norm)
+        return dict(tree, normalization=None)
+
+    def save(self, fname, treename, tree, normalization=None, norm=None):
+        stat, entry = self._read(fname)
+        if stat is None: return None
+
+        if entry is None: entry = dict(stat, trees=dict(), normalizations=dict())
+        entry['trees'][treename] = tree
+        if normalization is not None and norm is not None:
+            entry['normalizations'][str(normalization)] = norm
+
+        os.makedirs(self.path, exist_ok=True)
+        entry_fname = self.fname(fname)
+        tmp_fname = f'{entry_fname}.{os.getpid()}.{id(entry)}.tmp'
+        with open(tmp_fname, 'w') as f:
+            json.dump(entry, f, default=_to_json)
+        os.replace(tmp_fname, entry_fname)
+        return entry_fname
+
+    def invalidate(self, fname):
+        entry_fname = self.fname(fname)
+        if os.path.exists(entry_fname): os.remove(entry_fname)
+
+    def clear(self):
+        for entry_fname in glob.glob(os.path.join(self.path, '*.json')):
+            os.remove(entry_fname)
+
+def _to_json(value):
+    if isinstance(value, np.ndarray): return value.tolist()
+    if isinstance(value, np.generic): return value.item()
+    raise TypeError(f'{type(value)} is not json serializable')
@@ -1,6 +1,16 @@
 from ..utils import *
 from ..classUtils import ObjIter
+from .Cutflow import CutflowAccumulator
+from .Expression import Selection
+from .ColumnCache import _hash
+from .MaskCache import MaskCache, _value_fingerprint, column_identity, event_identity, function_fingerprint
 import inspect
+from functools import partial
+
+try:
+    import numba
+except ImportError:
+    numba = None
 
 
 def get_operation(tags, operation, default):
@@ -21,24 +31,18 @@ methods = {'min': lambda a, v: a > v, 'max': lambda a, v: a < v,
            'mask': lambda a, v: a[v]}
 
 
-def update_cutflow(tree, tag):
-    tree.cutflow_labels = tree.cutflow_labels+[tag]
-
-    def event_weight(tree, i):
-        if 'genWeight' in tree.fields:
-            return tree['genWeight']*(tree['sample_id']==i)
-        return tree['sample_id']==i
+def update_cutflow(tree, tag, stage=None):
+    """Append the cutflow entries of tag (or a list of tags, with stage the number passed by each event) to the tree"""
+    tags = [tag] if isinstance(tag, str) else list(tag)
+    tree.cutflow_labels = tree.cutflow_labels+tags
 
-    def _update_cutflow(cutflow, weights):
-        from ..plotUtils import Histo
-        histo = np.append(cutflow.histo, np.sum(weights))
-        error = np.append(cutflow.error, np.sqrt( np.sum(weights**2) ))
-        bins = np.arange( len(histo)+1 )
-        return Histo(histo, bins, error)
+    # trees without normalization (i.e. data) have no cutflow to update
+    if not tree.cutflow: return
 
-    new_cutflow = [_update_cutflow(cutflow, event_weight(tree, i))
-                   for i, cutflow in enumerate(tree.cutflow)]
-    tree.cutflow = new_cutflow
+    weights = tree['genWeight'] if 'genWeight' in tree.fields else None
+    cutflow = CutflowAccumulator.from_histos(tree.cutflow)
+    cutflow.fill(tree._columns['sample_id'], weights, stage=stage, nstages=len(tags))
+    tree.cutflow = cutflow.histos()
 
 
 def build_event_filter(key, value, functions=functions, methods=methods):
@@ -63,9 +67,7 @@ def build_event_filter(key, value, functions=functions, methods=methods):
     return operation
 
 
-def event_filter(self, tree, cutflow=False):
-    tree = tree.copy()
-
+def event_mask(self, tree):
     if self.mask is not None:
         mask = self.mask
     else:
@@ -74,37 +76,97 @@ def event_filter(self, tree, cutflow=False):
     for filter in self.filters:
         mask = mask & filter(tree)
 
-    mask = ak.to_numpy(mask)
+    # events where a cut is None (i.e. reads an object the event does not have) do not pass it
+    mask = ak.to_numpy(ak.fill_none(mask, False)) if isinstance(mask, ak.Array) else np.asarray(mask)
     if self.verbose:
         scale = tree.scale if hasattr(tree, 'scale') else np.ones(len(tree))
         total = np.sum(scale)
         eff = np.sum(scale[mask])/total
         print(f'{tree.sample} {self.name} eff: {eff:.2e}')
+    return mask
+
+def select_events(self, tree, mask):
+    deferred = self.deferred if self.deferred is not None else getattr(tree, 'deferred_selection', False)
+    if deferred: tree.select(mask)
+    else: tree.extend(tree._columns[mask])
+
+def event_filter(self, tree, cutflow=False):
+    tree = tree.copy()
 
-    tree.extend(tree.ttree[mask])
+    mask = event_mask(self, tree)
+    select_events(self, tree, mask)
 
     if cutflow:
         update_cutflow(tree, self.name)
 
     return tree
 
+def event_sequence(filters, tree):
+    """Apply a chain of EventFilters, and record all of their cutflow entries in a single pass over the input events"""
+    selected = tree
+    index = np.arange(len(tree))
+    stage = np.zeros(len(tree), dtype=np.int32)
+    for filter in filters:
+        selected = selected.copy()
+        mask = event_mask(filter, selected)
+        select_events(filter, selected, mask)
+
+        index = index[mask]
+        stage[index] += 1
+
+    total = tree.copy()
+    update_cutflow(total, [ filter.name for filter in filters ], stage=stage)
+    selected.cutflow, selected.cutflow_labels = total.cutflow, total.cutflow_labels
+    return selected
+
 class Filter:
+    """
+    Event selection whose masks are kept in Filter.cache, keyed by the fingerprint of the filter, the events of the tree
+    and the identity of the columns the filter reads. Filters without a stable fingerprint, or that do not return a mask, are not cached.
+    """
+    cache = MaskCache()
+
     def __init__(self, filter):
         self.filter = filter 
-        self.hash = f'_filter_{hash(filter)}_'
-    def __call__(self, t, **kwargs):
-        key = f'{self.hash}_{hash(tuple(kwargs.items()))}_'
-        if key in t.fields: return t[key]
-        
-        value = self.filter(t, **kwargs)
-        if hasattr(t, 'extend'): t.extend(**{key:value})
-        return value
+        self.fingerprint = function_fingerprint(filter) if hasattr(filter, '__code__') else None
 
-        
+    def key(self, t, **kwargs):
+        if self.fingerprint is None or Filter.cache is None or not hasattr(t, 'filelist'): return None
+        kwargs = _value_fingerprint(kwargs)
+        if kwargs is None: return None
+        return _hash(self.fingerprint, kwargs)
 
+    def mask_key(self, t, key, fields):
+        columns = [ column_identity(t, field) for field in fields ]
+        if None in columns: return None
+        return _hash(key, event_identity(t), list(zip(fields, columns)))
+
+    def __call__(self, t, **kwargs):
+        key = self.key(t, **kwargs)
+        if key is None: return self.filter(t, **kwargs)
+
+        # the fields read by the filter are recorded on its first evaluation
+        fields = Filter.cache.load_reads(key)
+        if fields is not None and all( field in t._columns for field in fields ):
+            mask_key = self.mask_key(t, key, fields)
+            mask = Filter.cache.load(mask_key, len(t)) if mask_key is not None else None
+            if mask is not None: return ak.from_numpy(mask)
+
+        with t.record_reads() as reads:
+            value = self.filter(t, **kwargs)
+        if isinstance(value, (ak.Array, np.ndarray)) and value.ndim == 1 and str(ak.type(value)).endswith(' bool'):
+            fields = sorted( field for field in reads if field in t._columns )
+            mask_key = self.mask_key(t, key, fields)
+            if mask_key is not None:
+                Filter.cache.save_reads(key, fields)
+                Filter.cache.save(mask_key, ak.to_numpy(value))
+        return value
 
 class EventFilter:
-    def __init__(self, name, mask=None, filter=None, cutflow=True, verbose=False, **kwargs):
+    def __init__(self, name=None, mask=None, filter=None, cutflow=True, verbose=False, deferred=None, **kwargs):
+        # selections written as text are labeled with their text by default
+        if isinstance(filter, str): filter = Selection.compile(filter)
+        if name is None and isinstance(filter, Selection): name = filter.label
         self.name = name
         self.mask = mask
         self.kwargs = kwargs
@@ -115,6 +177,8 @@ class EventFilter:
 
         self.cutflow = cutflow
         self.verbose = verbose
+        # deferred selection (see Tree.select), defaults to Tree.deferred_selection
+        self.deferred = deferred
             
     def filter(self, tree, filter=None):
         if filter:
@@ -144,9 +208,129 @@ def build_collection_filter(name, key, value, functions=functions, methods=metho
     return operation
 
 
+# operations of the keyword DSL that have a compiled version, as codes for the selection kernel
+compiled_functions = {'abs': 1}
+compiled_methods = {'min': 1, 'max': 2, 'emin': 3, 'emax': 4, 'bit': 5, 'neq': 6}
+
+def compile_collection_cut(name, key, value):
+    """Parse a keyword cut of the DSL into (variable, function code, method code, value), None if it can not be compiled"""
+    if not np.isscalar(value) or isinstance(value, str): return None
+
+    tags = key.split('_')
+    if 'mask' in tags: return None
+    function = get_operation(tags, compiled_functions, 0)
+    method = get_operation(tags, compiled_methods, 0)
+    return name+'_'+'_'.join(tags), function, method, value
+
+def _select_objects(offsets, values, functions, methods, thresholds, premask):
+    """Keep the objects passing every cut, returns the number of objects kept per event and their flat index"""
+    nevents = len(offsets) - 1
+    counts = np.zeros(nevents, np.int64)
+    index = np.empty(len(premask), np.int64)
+    n = 0
+    for i in range(nevents):
+        for j in range(offsets[i], offsets[i+1]):
+            if not premask[j]: continue
+            keep = True
+            for k in range(values.shape[0]):
+                a = values[k, j]
+                if functions[k] == 1: a = abs(a)
+                v, method = thresholds[k], methods[k]
+                if method == 0: keep = a == v
+                elif method == 1: keep = a > v
+                elif method == 2: keep = a < v
+                elif method == 3: keep = a >= v
+                elif method == 4: keep = a <= v
+                elif method == 5: keep = ((np.int64(a) >> np.int64(v)) & 1) == 1
+                else: keep = a != v
+                if not keep: break
+            if keep:
+                index[n] = j
+                counts[i] += 1
+                n += 1
+    return counts, index[:n]
+
+def _select_objects_numpy(offsets, values, functions, methods, thresholds, premask):
+    keep = premask.copy()
+    for k in range(values.shape[0]):
+        a = np.abs(values[k]) if functions[k] == 1 else values[k]
+        if methods[k] == 5: keep &= ((a.astype(np.int64) >> int(thresholds[k])) & 1) == 1
+        else: keep &= [np.equal, np.greater, np.less, np.greater_equal, np.less_equal, None, np.not_equal][methods[k]](a, thresholds[k])
+    passed = np.concatenate([[0], np.cumsum(keep)])
+    return np.diff(passed[offsets]), np.flatnonzero(keep)
+
+if numba is not None:
+    _select_objects = numba.njit(cache=True)(_select_objects)
+else:
+    _select_objects = _select_objects_numpy
+
+def _flat_collection(collection):
+    """Counts and flat numpy content of every field of a collection, None if a field is not a jagged array of numbers"""
+    fields = collection.fields
+    if not any(fields): return None
+
+    counts = ak.to_numpy(ak.num(collection[fields[0]], axis=1))
+    content = dict()
+    for field in fields:
+        array = collection[field]
+        if array.ndim != 2 or not np.array_equal(ak.to_numpy(ak.num(array, axis=1)), counts): return None
+        try:
+            content[field] = ak.to_numpy(ak.flatten(array))
+        except (ValueError, TypeError):
+            return None
+    return counts, content
+
+def compiled_collection_filter(self, tree):
+    """Filter the objects of a collection with the compiled selection kernel, None if the collection can not be compiled"""
+    if self.cuts is None: return None
+
+    collection = get_collection(tree, self.collection)
+    if self.mask is not None:
+        collection = collection[self.mask]
+
+    flat = _flat_collection(collection)
+    if flat is None: return None
+    counts, content = flat
+    if any( variable not in content for variable, *_ in self.cuts ): return None
+
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    premask = np.ones(offsets[-1], dtype=bool)
+    if any(self.python_filters):
+        collection[f"{self.collection}_index"] = ak.local_index(collection[collection.fields[0]], axis=-1)
+        for filter in self.python_filters:
+            selection = getattr(filter, 'func', None)
+            if isinstance(selection, Selection) and selection.elementwise:
+                # elementwise selections are evaluated directly on the flat content
+                premask &= np.asarray(ak.to_numpy(selection(content, prefix=self.collection)), dtype=bool)
+            else:
+                premask &= ak.to_numpy(ak.flatten(filter(collection)))
+
+    # each cut is compared in the dtype of array <op> value, the kernel gets a common dtype that holds all of them
+    dtypes = [ np.result_type(content[variable].dtype, value) for variable, _, _, value in self.cuts ]
+    dtype = np.result_type(*dtypes) if any(dtypes) else np.float64
+    values = np.empty((len(self.cuts), len(premask)), dtype=dtype)
+    for k, (variable, *_) in enumerate(self.cuts): values[k] = content[variable]
+    functions = np.array([ function for _, function, _, _ in self.cuts ], dtype=np.int64)
+    methods = np.array([ method for _, _, method, _ in self.cuts ], dtype=np.int64)
+    thresholds = np.array([ np.asarray(value, dtype=cut_dtype) for (*_, value), cut_dtype in zip(self.cuts, dtypes) ], dtype=dtype)
+    counts, index = _select_objects(offsets, values, functions, methods, thresholds, premask)
+
+    collection_records = {f"n_{self.newname}": counts}
+    collection_records.update({
+        field.replace(self.collection, self.newname): ak.unflatten(array[index], counts)
+        for field, array in content.items() if not field.endswith('index')
+    })
+    return collection_records
+
 def collection_filter(self, tree):
     tree = tree.copy()
 
+    if self.compiled:
+        collection_records = compiled_collection_filter(self, tree)
+        if collection_records is not None:
+            tree.extend(**collection_records)
+            return tree
+
     collection = get_collection(tree, self.collection)
 
     if self.mask is not None:
@@ -168,7 +352,9 @@ def collection_filter(self, tree):
 
 
 class CollectionFilter:
-    def __init__(self, collection, newname=None, mask=None, filter=None, **kwargs):
+    def __init__(self, collection, newname=None, mask=None, filter=None, compiled=True, **kwargs):
+        # fields of text selections can be named without the collection prefix, i.e. "pt > 30 && abs(eta) < 2.5"
+        if isinstance(filter, str): filter = partial(Selection.compile(filter), prefix=collection)
         self.collection = collection
         self.newname = newname if newname else collection
         self.mask = mask
@@ -177,6 +363,12 @@ class CollectionFilter:
         if filter is not None:
             self.filters = [filter] + self.filters
 
+        # keyword cuts run in a single (numba) kernel over the flat collection when possible
+        self.compiled = compiled
+        self.python_filters = [filter] if filter is not None else []
+        self.cuts = [ compile_collection_cut(collection, key, value) for key, value in kwargs.items() ]
+        if any( cut is None for cut in self.cuts ): self.cuts = None
+
     def filter(self, tree):
         if isinstance(tree,list):
             return [collection_filter(self, t) for t in tree]
@@ -189,7 +381,18 @@ class FilterSequence:
     def __init__(self, *filters):
         self.filters = filters
 
+    @classmethod
+    def from_selection(cls, text, **kwargs):
+        """One EventFilter per && term of a text selection, each labeled with its text in the cutflow"""
+        selection = Selection.compile(text)
+        return cls(*[ EventFilter(label, filter=label, **kwargs) for label in selection.labels ])
+
     def filter(self, tree):
+        if isinstance(tree, list):
+            return [ self.filter(t) for t in tree ]
+        if len(self.filters) and all( isinstance(filter, EventFilter) and filter.cutflow for filter in self.filters ):
+            return event_sequence(self.filters, tree)
+
         for filter in self.filters:
             tree = filter.filter(tree)
         return tree
@@ -0,0 +1,197 @@
+import glob
+import hashlib
+import inspect
+import json
+import os
+import types
+import weakref
+from collections import OrderedDict
+
+import awkward as ak
+import numpy as np
+
+from .. import config
+from .ColumnCache import _hash, source_identity, state_identity
+from .EventIndex import find_keys
+from .MemoryManager import BranchLoader, CacheLoader
+
+_simple_types = (type(None), bool, int, float, complex, str, bytes)
+
+def _value_fingerprint(value, names=(), seen=None):
+    """Stable fingerprint of a value captured by a filter, None if the value has no stable representation"""
+    if isinstance(value, _simple_types): return repr(value)
+    if isinstance(value, (np.generic, np.ndarray)):
+        array = np.ascontiguousarray(value)
+        return f'{array.dtype}{array.shape}{hashlib.md5(array.tobytes()).hexdigest()}'
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [ _value_fingerprint(item, names, seen) for item in (sorted(value, key=repr) if isinstance(value, (set, frozenset)) else value) ]
+        return None if None in items else f'{type(value).__name__}({",".join(items)})'
+    if isinstance(value, dict):
+        items = [ (repr(key), _value_fingerprint(item, names, seen)) for key, item in value.items() ]
+        return None if any( item is None for _, item in items ) else repr(sorted(items))
+    if isinstance(value, ak.Array):
+        form, length, container = ak.to_buffers(value)
+        return _hash(str(form), length, *[ _value_fingerprint(np.asarray(buffer)) for buffer in container.values() ])
+    if isinstance(value, types.ModuleType): return f'module:{value.__name__}'
+    # trees and other containers of events have no stable identity
+    if hasattr(value, '_columns') or not hasattr(value, '__dict__'): return None
+    if callable(value) and hasattr(value, '__code__'): return function_fingerprint(value, seen)
+
+    # objects (i.e. a notebook captured as self) are identified by the attributes the filter reads from them
+    attributes = [ (name, getattr(value, name)) for name in names if not name.startswith('__') and hasattr(value, name) ]
+    attributes = [ (name, attr) for name, attr in attributes if not inspect.ismethod(attr) ]
+    items = [ (name, _value_fingerprint(attr, (), seen)) for name, attr in attributes ]
+    if any( item is None for _, item in items ): return None
+    return f'{type(value).__module__}.{type(value).__qualname__}{items}'
+
+def _code_fingerprint(code):
+    consts = [ _code_fingerprint(const) if isinstance(const, types.CodeType) else repr(const) for const in code.co_consts ]
+    return _hash(code.co_code.hex(), consts, code.co_names, code.co_varnames)
+
+def _code_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType): names |= _code_names(const)
+    return names
+
+def function_fingerprint(function, seen=None):
+    """Stable fingerprint of a function from its bytecode, constants, closure values and the globals it reads, None if there is none"""
+    seen = set() if seen is None else seen
+    if id(function) in seen: return 'recursive'
+    seen.add(id(function))
+
+    code = function.__code__
+    names = _code_names(code)
+    closure = [ _value_fingerprint(cell.cell_contents, names, seen) for cell in (function.__closure__ or ()) ]
+    globals_ = [ (name, _value_fingerprint(function.__globals__[name], names, seen)) for name in sorted(names) if name in function.__globals__ ]
+    defaults = [ _value_fingerprint(default, names, seen) for default in (function.__defaults__ or ()) ]
+
+    if None in closure or None in defaults or any( value is None for _, value in globals_ ): return None
+    return _hash(_code_fingerprint(code), closure, globals_, defaults)
+
+def event_identity(tree):
+    """Identity of the events in a tree from its source files and the file and event number of every event"""
+    try:
+        event = find_keys(tree.fields)[-1]
+    except KeyError:
+        event = None
+    columns = [ tree._columns['sample_id'] ] + ([ tree._columns[event] ] if event is not None else [])
+
+    cached = tree.__dict__.get('_event_identity', None)
+    if cached is not None and all( a is b for a, b in zip(cached[0], columns) ):
+        return cached[1]
+
+    checksum = hashlib.md5()
+    for column in columns:
+        checksum.update(np.ascontiguousarray(np.asarray(column)).tobytes())
+    identity = _hash(source_identity(tree), state_identity(tree), checksum.hexdigest())
+    tree._event_identity = (columns, identity)
+    return identity
+
+def _loader_identity(loader):
+    if isinstance(loader, BranchLoader): return f'branch:{loader.field}'
+    if isinstance(loader, CacheLoader): return f'cache:{os.path.basename(loader.fname)}:{loader.field}'
+    return None
+
+def column_identity(tree, field):
+    """Identity of a column of the tree, branches still read from the source files by their name and other columns by a checksum of their values"""
+    store = tree._columns
+    reload = store.reloads.get(field, None)
+    identity = _loader_identity(reload.loader) if reload is not None else None
+    if identity is not None: return identity
+
+    column = store[field]
+    cached = tree.__dict__.get('_column_identities', {})
+    ref, identity = cached.get(field, (None, None))
+    if ref is not None and ref() is column: return identity
+
+    identity = _value_fingerprint(column)
+    if identity is not None:
+        tree._column_identities = dict(cached, **{ field: (weakref.ref(column), identity) })
+    return identity
+
+def pack_mask(mask):
+    return np.packbits(np.asarray(mask, dtype=bool))
+
+def unpack_mask(packed, length):
+    return np.unpackbits(packed, count=length).astype(bool)
+
+class MaskCache:
+    """
+    Cache of bit-packed event masks, the last max_entries are kept in memory. Masks are only saved to disk
+    when a path is given, i.e. f'{config.GIT_WD}/.cache/masks/' (least recently used files are removed above max_size bytes).
+    """
+
+    def __init__(self, path=None, max_entries=256, max_size=1024**3):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.memory = OrderedDict()
+        self.reads = dict()
+
+    def fname(self, key, ext='.npy'):
+        return os.path.join(self.path, f'{key}{ext}')
+
+    def load_reads(self, key):
+        """Fields read by the filter with this key, None if it was never evaluated"""
+        reads = self.reads.get(key, None)
+        if reads is None and self.path is not None and os.path.exists(self.fname(key, '.json')):
+            with open(self.fname(key, '.json')) as f:
+                reads = self.reads[key] = json.load(f)
+        return reads
+
+    def save_reads(self, key, reads):
+        self.reads[key] = reads
+        if self.path is None: return
+
+        os.makedirs(self.path, exist_ok=True)
+        tmp_fname = f'{self.fname(key, "")}.{os.getpid()}.tmp.json'
+        with open(tmp_fname, 'w') as f:
+            json.dump(reads, f)
+        os.replace(tmp_fname, self.fname(key, '.json'))
+
+    def load(self, key, length):
+        packed = self.memory.get(key, None)
+        if packed is not None:
+            self.memory.move_to_end(key)
+        elif self.path is not None and os.path.exists(self.fname(key)):
+            packed = np.load(self.fname(key))
+            os.utime(self.fname(key))
+            self._remember(key, packed)
+        if packed is None: return None
+        return unpack_mask(packed, length)
+
+    def _remember(self, key, packed):
+        self.memory[key] = packed
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def save(self, key, mask):
+        packed = pack_mask(mask)
+        self._remember(key, packed)
+        if self.path is None: return
+
+        os.makedirs(self.path, exist_ok=True)
+        tmp_fname = f'{self.fname(key)[:-len(".npy")]}.{os.getpid()}.tmp.npy'
+        np.save(tmp_fname, packed)
+        os.replace(tmp_fname, self.fname(key))
+        self.evict()
+
+    def entries(self):
+        return glob.glob(os.path.join(self.path, '*.npy')) if self.path is not None else []
+
+    def evict(self, max_size=None):
+        if max_size is None: max_size = self.max_size
+
+        entries = sorted(self.entries(), key=os.path.getmtime)
+        total = sum(os.path.getsize(fname) for fname in entries)
+        for fname in entries:
+            if total <= max_size: break
+            total -= os.path.getsize(fname)
+            os.remove(fname)
+
+    def clear(self):
+        self.memory.clear()
+        self.reads.clear()
+        reads = glob.glob(os.path.join(self.path, '*.json')) if self.path is not None else []
+        for fname in self.entries() + reads: os.remove(fname)
@@ -0,0 +1,217 @@
+import itertools
+import re
+import weakref
+
+import awkward as ak
+import numpy as np
+import uproot as ut
+
+from .. import config
+from .Columnar import is_columnar, read_columnar
+from .ColumnStore import LazyColumn, is_deferred
+from .RunLengthArray import RunLengthArray
+from .Tracer import tracer
+
+def format_bytes(nbytes):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(nbytes) < 1024: return f'{nbytes:0.1f} {unit}'
+        nbytes /= 1024
+    return f'{nbytes:0.1f} TB'
+
+def parse_bytes(size):
+    """Convert a size like 8000000, '500 MB' or '8GB' to bytes"""
+    if size is None or isinstance(size, (int, float)): return size
+
+    match = re.match(r'^\s*([\d.]+)\s*([KMGT]?)B?\s*$', size.upper())
+    if match is None: raise ValueError(f'Unable to parse memory size {size}')
+    number, unit = match.groups()
+    return int(float(number) * 1024**' KMGT'.index(unit or ' '))
+
+def column_nbytes(column):
+    """Bytes held in memory by a column, unloaded lazy columns hold nothing"""
+    if isinstance(column, LazyColumn):
+        return column_nbytes(column._value) if column.loaded else 0
+    if isinstance(column, (RunLengthArray, np.ndarray)):
+        return column.nbytes
+    if isinstance(column, ak.Array):
+        # virtual (uproot.lazy) arrays in awkward1 only hold memory once read
+        peek = getattr(column.layout, 'peek_array', False)
+        if peek is None: return 0
+        return column.layout.nbytes
+    return 0
+
+def read_branch(fname, treename, field, start=None, stop=None):
+    """Read the entries start:stop of a branch from a ROOT file, or of a column from a parquet/arrow file"""
+    with tracer.span('read_branch', cat='file', fname=fname, field=field) as span:
+        if is_columnar(fname):
+            array = read_columnar(fname, [field], entry_start=start, entry_stop=stop)[field]
+        else:
+            with ut.open(f'{fname}:{treename}') as tree:
+                array = tree[field].array(entry_start=start, entry_stop=stop, library='ak')
+        span['bytes_out'] = array.nbytes
+    return array
+
+def read_entries(files, offsets, field, rows):
+    """Read a branch at the given entries of a list of (fname, treename) files, with offsets the first entry of each file"""
+    order = np.argsort(rows, kind='stable')
+    sorted_rows = rows[order]
+    file_index = np.searchsorted(offsets, sorted_rows, side='right') - 1
+
+    chunks = []
+    for i in np.unique(file_index):
+        local = sorted_rows[file_index == i] - offsets[i]
+        start, stop = int(local.min()), int(local.max()) + 1
+
+        fname, treename = files[i]
+        array = read_branch(fname, treename, field, start, stop)
+        chunks.append(array[local - start])
+
+    if len(chunks) == 0: return ak.Array([])
+    array = ak.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+    return array[np.argsort(order, kind='stable')]
+
+class BranchLoader:
+    """Loader of a LazyColumn that rereads a raw branch from the files of a tree"""
+
+    def __init__(self, filelist, field):
+        self.files = [ (fn.fname, fn.treename) for fn in filelist ]
+        self.offsets = np.concatenate([[0], np.cumsum([ fn.raw_events for fn in filelist ])]).astype(np.int64)
+        self.field = field
+        self.__name__ = field
+
+    def __call__(self, index=None):
+        if index is None: index = np.arange(self.offsets[-1])
+        return read_entries(self.files, self.offsets, self.field, np.asarray(index))
+
+class CacheLoader:
+    """Loader of a LazyColumn that rereads a derived column from a ColumnCache entry"""
+
+    def __init__(self, cache, fname, field):
+        self.cache = cache
+        self.fname = fname
+        self.field = field
+        self.__name__ = field
+
+    def __call__(self, index=None):
+        column = self.cache.load_file(self.fname)[self.field]
+        return column if index is None else column[index]
+
+def held_column(column):
+    """Array holding the memory of a column, None for unloaded lazy columns"""
+    # deferred selections hold on to the unselected column until they are read
+    if is_deferred(column): return column.loader.column
+    if isinstance(column, LazyColumn): return column._value
+    return column
+
+class MemoryManager:
+    """
+    Running total of the memory held by the columns of every tree, shared columns are counted once.
+    Reloadable columns are evicted in least recently used order above the budget (memory_budget in the .config.yaml).
+    """
+
+    def __init__(self, budget=None):
+        self.budget = budget
+        self.stores = dict()   # id(store) -> (weakref to the store, {key: id(column)})
+        self.held = dict()     # id(column) -> [column, bytes, {(id(store), key)}]
+        self.total = 0
+        self.clock = itertools.count()
+        self.evicted = 0
+
+    @property
+    def budget(self): return self._budget
+
+    @budget.setter
+    def budget(self, budget): self._budget = parse_bytes(budget)
+
+    def register(self, store):
+        if id(store) in self.stores: return
+        store_id = id(store)
+        self.stores[store_id] = (weakref.ref(store, lambda _ : self._forget(store_id)), dict())
+        store.memory = self
+        for key in store.columns: self.update(store, key)
+
+    def update(self, store, key):
+        """Account for the column at key of a registered store, after it was added, loaded, replaced or removed"""
+        entry = self.stores.get(id(store))
+        if entry is None: return
+        keys = entry[1]
+
+        column_id = keys.pop(key, None)
+        if column_id is not None: self._release(column_id, (id(store), key))
+
+        column = held_column(store.columns.get(key))
+        if column is None: return
+
+        held = self.held.get(id(column))
+        if held is None:
+            held = self.held[id(column)] = [column, 0, set()]
+        nbytes = column_nbytes(column)
+        self.total += nbytes - held[1]
+        held[1] = nbytes
+        held[2].add((id(store), key))
+        keys[key] = id(column)
+
+    def _release(self, column_id, owner):
+        held = self.held[column_id]
+        held[2].discard(owner)
+        if not held[2]:
+            self.total -= held[1]
+            del self.held[column_id]
+
+    def _forget(self, store_id):
+        _, keys = self.stores.pop(store_id, (None, {}))
+        for key, column_id in keys.items(): self._release(column_id, (store_id, key))
+
+    def touch(self, store, *keys):
+        tick = next(self.clock)
+        for key in keys: 
+            store.accessed[key] = tick
+            # columns can grow once read (i.e. virtual arrays), recount the ones that are used
+            self.update(store, key)
+
+    def columns(self):
+        """Unique loaded columns of every registered store, as id -> (column, [(store, key)])"""
+        columns = dict()
+        for column_id, (column, _, owners) in self.held.items():
+            owners = [ (self.stores[store_id][0](), key) for store_id, key in owners ]
+            columns[column_id] = (column, [ (store, key) for store, key in owners if store is not None ])
+        return columns
+
+    @property
+    def nbytes(self): return self.total
+
+    def enforce(self, budget=None):
+        """Evict the least recently used reloadable columns until the total is within the budget
+
+        Returns:
+            int: bytes freed
+        """
+        budget = parse_bytes(budget) if budget is not None else self.budget
+        if budget is None or self.total <= budget: return 0
+
+        candidates = [
+            (max( store.accessed.get(key, -1) for store, key in owners ), column, owners)
+            for column, owners in self.columns().values()
+            if all( key in store.reloads for store, key in owners )
+        ]
+
+        freed = 0
+        for _, column, owners in sorted(candidates, key=lambda candidate: candidate[0]):
+            if self.total <= budget: break
+            before = self.total
+            for store, key in owners: store.evict(key)
+            freed += before - self.total
+
+        self.evicted += freed
+        if self.total > budget:
+            print(f'[WARNING] memory usage {format_bytes(self.total)} is over the budget of {format_bytes(budget)}, with nothing left to evict')
+        return freed
+
+    def report(self, verbose=True):
+        total = self.nbytes
+        if verbose:
+            budget = f' of {format_bytes(self.budget)} budget' if self.budget else ''
+            print(f'[MEMORY] {format_bytes(total)}{budget} in {len(self.stores)} column stores, {format_bytes(self.evicted)} evicted')
+        return dict(total=total, budget=self.budget, evicted=self.evicted)
+
+memory = MemoryManager(getattr(config, 'memory_budget', None))
@@ -6,11 +6,20 @@ from threading import Thread
 from multiprocessing.pool import ThreadPool
 from functools import partial
 import time
+import os
 
 from tqdm import tqdm
+from .SharedArrays import share, unshare, release, descriptors
+from .Tracer import tracer, nbytes
 # from ..rich_tools import tqdm
 
+def is_process_pool(pool):
+    return pool is not None and not isinstance(pool, ThreadPool)
+
 class ParallelMethod:
+    # with a process pool, move the arrays to and from the workers through memory mapped files (see SharedArrays)
+    shared_arrays = True
+
     def __init__(self):
         self.__time__ = time.time()
         self.__start_timing__ = []
@@ -44,19 +53,24 @@ class ParallelMethod:
         self.__start_timing__.append(start_timing)
         self.__run_timing__.append(run_timing)
         self.__end_timing__.append(end_timing)
+        self.__trace__(args, inputs, output, start_timing, run_timing, end_timing)
 
         return finished
     
     def parallel(self, iargs, pool=None, **kwargs):
         id, args = iargs[0], iargs[1:]
         inputs, start_timing = self.__start__(id, args, kwargs)
-        result = pool.starmap(self.__run__, [(inputs, start_timing)])
-        output, run_timing = list(result)[0]
+        if self.shared_arrays and is_process_pool(pool):
+            output, run_timing = self.__run_pool__(pool, inputs, start_timing)
+        else:
+            result = pool.starmap(self.__run__, [(inputs, start_timing)])
+            output, run_timing = list(result)[0]
         finished, end_timing = self.__end__(args, output, run_timing)
 
         self.__start_timing__.append(start_timing)
         self.__run_timing__.append(run_timing)
         self.__end_timing__.append(end_timing)
+        self.__trace__(args, inputs, output, start_timing, run_timing, end_timing)
 
         return id, finished
     
@@ -73,6 +87,8 @@ class ParallelMethod:
             end=end,
             worker=worker,
             thread=thread,
+            pid=os.getpid(),
+            tid=th.get_ident(),
         )
 
         return result, timing
@@ -90,10 +106,45 @@ class ParallelMethod:
             end=end,
             worker=worker,
             thread=thread,
+            pid=os.getpid(),
+            tid=th.get_ident(),
         )
 
         return result, timing
     
+    def __run_pool__(self, pool, inputs, timing):
+        name = get_function_name(self)
+        with tracer.span(f'{name}.share', cat='transport', id=timing['id'], bytes=nbytes(inputs)):
+            inputs, shared = share(inputs)
+        try:
+            output, timing, spans = pool.apply(self.__run_shared__, (inputs, timing, tracer.enabled))
+        finally:
+            release(shared)
+        tracer.merge(spans)
+        with tracer.span(f'{name}.unshare', cat='transport', id=timing['id']):
+            return unshare(output, unlink=True), timing
+
+    def __run_shared__(self, inputs, timing, tracing=False):
+        # spans recorded in the worker are sent back with the results, forked workers start with a copy of the parent spans
+        tracer.clear()
+        tracer.enabled = tracing
+        output, timing = self.__run__(unshare(inputs), timing)
+        with tracer.span(f'{get_function_name(self)}.share', cat='transport', id=timing['id'], bytes=nbytes(output)):
+            output, _ = share(output)
+        return output, timing, tracer.collect()
+
+    def __trace__(self, args, inputs, output, *timings):
+        if not tracer.enabled: return
+        name = get_function_name(self)
+        sample = getattr(args[0], 'sample', None) if args else None
+        for stage, timing in zip(('start', 'run', 'end'), timings):
+            extra = dict(bytes_in=nbytes(inputs), bytes_out=nbytes(output)) if stage == 'run' else {}
+            tracer.add(
+                f'{name}.{stage}', self.__time__ + timing['start'], self.__time__ + timing['end'], cat='ParallelMethod',
+                pid=timing['pid'], tid=timing['tid'], process=timing['worker'], thread=timing['thread'],
+                id=timing['id'], sample=sample, **extra,
+            )
+
     def __end__(self, args, outputs, timing):
         start = time.time() - self.__time__
 
@@ -112,6 +163,8 @@ class ParallelMethod:
             end=end,
             worker=worker,
             thread=thread,
+            pid=os.getpid(),
+            tid=th.get_ident(),
         )
 
         return result, timing
@@ -207,6 +260,10 @@ def get_slice(obj,slices):
     if len(slices) == 3:
         return obj[slices[0],slices[1],slices[2]]
     
+def _shared_call(obj_function, obj):
+    output, _ = share(obj_function(unshare(obj)))
+    return output
+
 def get_function_name(obj):
     if hasattr(obj,'__name__'): return obj.__name__
     if hasattr(obj,'__class__'): return obj.__class__.__name__
@@ -307,6 +364,9 @@ class ObjIter:
         if pool is None:
             pool = ThreadPool(len(self))
 
+        if is_process_pool(pool):
+            return self._shared_pool_apply(obj_function, report=report, pool=pool)
+
         result = pool.imap(obj_function, self.objs, chunksize=1)
 
         if report:
@@ -316,6 +376,29 @@ class ObjIter:
 
         return ObjIter(result)
 
+    def _shared_pool_apply(self, obj_function, report=False, pool=None):
+        objs, shared = share(self.objs)
+        try:
+            pending = [ pool.apply_async(_shared_call, (obj_function, obj)) for obj in objs ]
+            if report:
+                pending = tqdm(pending, total=len(self), desc=get_function_name(obj_function))
+
+            # wait for every worker before raising, so that the files of the outputs that did finish are unlinked
+            result, error = [], None
+            for output in pending:
+                try:
+                    output = output.get()
+                except Exception as e:
+                    error = error or e
+                    continue
+                if error is None:
+                    result.append(unshare(output, unlink=True))
+                else:
+                    release(descriptors(output))
+            if error is not None: raise error
+        finally:
+            release(shared)
+        return ObjIter(result)
     
     def apply(self, obj_function, report=False, parallel=None, **kwargs):
 
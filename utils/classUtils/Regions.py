@@ -0,0 +1,134 @@
+import awkward as ak
+import numpy as np
+
+from .CutSet import CutSet, CutWord
+
+class Regions:
+    """
+    Analysis regions encoded as the cut word of the defining cuts of every event.
+    A region is a cut name or a function of the cut bits, i.e. lambda c : c['sr'] & ~c['btag'].
+
+    Example:
+        regions = Regions(
+            dict(sr=lambda t : h_dm(t) < 25, cr=lambda t : (h_dm(t) >= 25) & (h_dm(t) < 50), b4=lambda t : n_btag(t) == 4),
+            a=lambda c : c['sr'] & c['b4'], b=lambda c : c['sr'] & ~c['b4'],
+            c=lambda c : c['cr'] & c['b4'], d=lambda c : c['cr'] & ~c['b4'],
+        )
+        code = regions(tree)
+        code.yields()            # yield of every region
+        code.transfer_factor('c', 'd')
+    """
+
+    def __init__(self, cuts, regions=None, cache=True, **kwargs):
+        self.cutset = CutSet(cuts, cache=cache)
+        self.regions = { name: name for name in self.cutset.names }
+        self.regions.update(dict(regions or {}, **kwargs))
+
+    @property
+    def names(self): return list(self.regions)
+
+    def members(self):
+        """Boolean table of the codes that belong to each region"""
+        codes = np.arange(1 << len(self.cutset.names))
+        bits = { name: (codes >> i) & 1 == 1 for i, name in enumerate(self.cutset.names) }
+        return {
+            name: bits[region] if isinstance(region, str) else np.asarray(region(bits), dtype=bool)
+            for name, region in self.regions.items()
+        }
+
+    def evaluate(self, tree, weights='scale'):
+        word = self.cutset.evaluate(tree, weights)
+        return RegionCode(word.word, self.members(), word.weights)
+
+    def __call__(self, tree, weights='scale'):
+        if isinstance(tree, list):
+            return [ self.evaluate(t, weights) for t in tree ]
+        return self.evaluate(tree, weights)
+
+class RegionCode:
+    """Region code of every event, with the regions as tables of member codes. Codes of several trees can be added"""
+
+    def __init__(self, code, members, weights=None):
+        self.code = code
+        self.members = members
+        self.weights = weights
+        self._sums = None
+
+    def __len__(self): return len(self.code)
+
+    @property
+    def ncodes(self): return len(next(iter(self.members.values())))
+
+    def __add__(self, other):
+        if other == 0: return self
+        weights = None
+        if self.weights is not None or other.weights is not None:
+            weights = np.concatenate([ np.ones(len(code)) if code.weights is None else code.weights for code in (self, other) ])
+        return RegionCode(np.concatenate([self.code, other.code]), self.members, weights)
+    __radd__ = __add__
+
+    def scale(self, factor):
+        """Region code with the weights multiplied by factor (i.e. a luminosity)"""
+        weights = np.ones(len(self)) if self.weights is None else self.weights
+        return RegionCode(self.code, self.members, factor * weights)
+
+    def mask(self, region):
+        return self.members[region][self.code]
+
+    def sums(self):
+        """Sums of weights and weights² of each code"""
+        if self._sums is None:
+            code = self.code.astype(np.int64)
+            sumw = np.bincount(code, weights=self.weights, minlength=self.ncodes)
+            sumw2 = sumw if self.weights is None else np.bincount(code, weights=self.weights**2, minlength=self.ncodes)
+            self._sums = (sumw, sumw2)
+        return self._sums
+
+    def yields(self, region=None):
+        """Sum of weights in region, or in every region as a dict by default"""
+        sumw, _ = self.sums()
+        if region is not None: return np.sum(sumw[self.members[region]])
+        return { name: np.sum(sumw[member]) for name, member in self.members.items() }
+
+    def sumw2(self, region=None):
+        _, sumw2 = self.sums()
+        if region is not None: return np.sum(sumw2[self.members[region]])
+        return { name: np.sum(sumw2[member]) for name, member in self.members.items() }
+
+    def transfer_factor(self, num, den):
+        """Ratio of the yields of two regions, and its statistical error
+
+        Returns:
+            tuple: (factor, error)
+        """
+        n, d = self.yields(num), self.yields(den)
+        factor = n / d
+        error = factor * np.sqrt( self.sumw2(num)/n**2 + self.sumw2(den)/d**2 )
+        return factor, error
+
+    def histograms(self, values, bins, regions=None):
+        """Histograms of values in every region, values outside of the bins are not counted
+
+        Returns:
+            dict: region -> Histo
+        """
+        from ..plotUtils import Histo
+
+        values = np.asarray(ak.to_numpy(values) if isinstance(values, ak.Array) else values, dtype=float)
+        bins = np.asarray(bins)
+        nbins = len(bins) - 1
+
+        index = np.digitize(values, bins) - 1
+        inside = (index >= 0) & (index < nbins)
+        key = self.code.astype(np.int64)[inside] * nbins + index[inside]
+        weights = None if self.weights is None else self.weights[inside]
+
+        size = self.ncodes * nbins
+        sumw = np.bincount(key, weights=weights, minlength=size).reshape(self.ncodes, nbins)
+        sumw2 = sumw if weights is None else np.bincount(key, weights=weights**2, minlength=size).reshape(self.ncodes, nbins)
+
+        regions = self.members if regions is None else { region: self.members[region] for region in regions }
+        return {
+            name: Histo(sumw[member].sum(axis=0), bins, np.sqrt(sumw2[member].sum(axis=0)))
+            for name, member in regions.items()
+        }
@@ -0,0 +1,95 @@
+import numbers
+
+import awkward as ak
+import numpy as np
+
+class RunLengthArray(np.lib.mixins.NDArrayOperatorsMixin):
+    """
+    1D array stored as one value per run of equal entries, i.e. per-file columns like sample_id.
+
+    Slices, masks and arithmetic with scalars stay run length encoded, anything else uses the dense array.
+    """
+
+    @classmethod
+    def concatenate(cls, arrays):
+        values = np.concatenate([ array.values for array in arrays ])
+        counts = np.concatenate([ array.counts for array in arrays ])
+        return cls(values, counts)
+
+    def __init__(self, values, counts=None, offsets=None):
+        self.values = np.asarray(values)
+        if offsets is None:
+            offsets = np.concatenate([[0], np.cumsum(counts)])
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    @property
+    def counts(self): return np.diff(self.offsets)
+
+    @property
+    def dtype(self): return self.values.dtype
+
+    @property
+    def ndim(self): return 1
+
+    @property
+    def nbytes(self): return self.values.nbytes + self.offsets.nbytes
+
+    def __len__(self): return int(self.offsets[-1])
+    def __repr__(self): return f'<RunLengthArray {self.values.tolist()} counts={self.counts.tolist()}>'
+
+    def dense(self, dtype=None):
+        dense = np.repeat(self.values, self.counts)
+        return dense if dtype is None else dense.astype(dtype)
+
+    def __array__(self, dtype=None, copy=None):
+        return self.dense(dtype)
+
+    def sum(self, axis=None, dtype=None, out=None, **kwargs):
+        return np.sum(self.values*self.counts, dtype=dtype)
+
+    def _run_index(self, index):
+        return np.searchsorted(self.offsets, index, side='right') - 1
+
+    def __getitem__(self, key):
+        if isinstance(key, numbers.Integral):
+            if key < 0: key += len(self)
+            return self.values[self._run_index(key)]
+
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                offsets = np.clip(self.offsets, start, max(start, stop)) - start
+                return RunLengthArray(self.values, offsets=offsets)
+            key = np.arange(start, stop, step)
+
+        if isinstance(key, ak.Array) and key.ndim == 1:
+            key = ak.to_numpy(key)
+
+        if isinstance(key, np.ndarray) and key.ndim == 1:
+            if key.dtype == bool:
+                selected = np.concatenate([[0], np.cumsum(key)])
+                return RunLengthArray(self.values, offsets=selected[self.offsets])
+
+            if np.issubdtype(key.dtype, np.integer):
+                key = np.where(key < 0, key + len(self), key)
+                runs = self._run_index(key)
+                if len(runs) < 2 or np.all(runs[1:] >= runs[:-1]):
+                    counts = np.bincount(runs, minlength=len(self.values))
+                    return RunLengthArray(self.values, counts)
+                return self.values[runs]
+
+        return self.dense()[key]
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        runs = [ x for x in inputs if isinstance(x, RunLengthArray) ]
+        same_runs = all( np.array_equal(x.offsets, runs[0].offsets) for x in runs )
+        scalar_or_runs = all( isinstance(x, RunLengthArray) or np.isscalar(x) for x in inputs )
+
+        if method == '__call__' and same_runs and scalar_or_runs and 'out' not in kwargs:
+            values = ufunc(*[ x.values if isinstance(x, RunLengthArray) else x for x in inputs ], **kwargs)
+            result = RunLengthArray(values, offsets=runs[0].offsets)
+            if values.dtype == bool: return result.dense()
+            return result
+
+        inputs = [ x.dense() if isinstance(x, RunLengthArray) else x for x in inputs ]
+        return getattr(ufunc, method)(*inputs, **kwargs)
@@ -0,0 +1,61 @@
+import numpy as np
+
+def get_rng(seed=None):
+    """Random generator for seed, seed can be an int, None (fresh entropy) or an existing generator"""
+    if isinstance(seed, np.random.Generator): return seed
+    return np.random.default_rng(seed)
+
+def _fractions(fractions):
+    fractions = np.asarray(fractions, dtype=float)
+    if fractions.ndim == 0 or np.any(fractions < 0) or fractions.sum() <= 0:
+        raise ValueError(f'Expected a list of positive fractions, got {fractions}')
+    return fractions / fractions.sum()
+
+def _boundaries(n, fractions):
+    boundaries = np.round(np.cumsum(np.insert(fractions, 0, 0)) * n).astype(np.int64)
+    boundaries[-1] = n
+    return boundaries
+
+def sample_indices(n, size, seed=None):
+    """Sorted indices of size events drawn without replacement out of n"""
+    if size > n: raise ValueError(f'Cannot sample {size} events out of {n}')
+    index = get_rng(seed).choice(n, size=size, replace=False)
+    index.sort()
+    return index
+
+def split_indices(n, fractions, seed=None):
+    """Split n events at random into len(fractions) disjoint sets with a single permutation, fractions are normalized
+
+    Returns:
+        list: sorted index array of each split
+    """
+    boundaries = _boundaries(n, _fractions(fractions))
+    permutation = get_rng(seed).permutation(n)
+    return [ np.sort(permutation[lo:hi]) for lo, hi in zip(boundaries[:-1], boundaries[1:]) ]
+
+def _strata(offsets, order=None):
+    """Events of each stratum, as ranges of offsets or ranges of order if the events are not sorted by stratum"""
+    for lo, hi in zip(offsets[:-1], offsets[1:]):
+        yield np.arange(lo, hi) if order is None else order[lo:hi]
+
+def stratified_sample(offsets, fraction, order=None, seed=None):
+    """Sample the same fraction of the events of each stratum, with offsets and order from Tree.sample_index"""
+    rng = get_rng(seed)
+    index = []
+    for events in _strata(offsets, order):
+        size = int(round(fraction * len(events)))
+        index.append(events[rng.choice(len(events), size=size, replace=False)])
+    index = np.concatenate(index) if index else np.array([], dtype=np.int64)
+    index.sort()
+    return index
+
+def stratified_split(offsets, fractions, order=None, seed=None):
+    """Split the events of each stratum with the same fractions, see split_indices and stratified_sample"""
+    rng, fractions = get_rng(seed), _fractions(fractions)
+    splits = [ [] for _ in fractions ]
+    for events in _strata(offsets, order):
+        for split, index in zip(splits, split_indices(len(events), fractions, seed=rng)):
+            split.append(events[index])
+    splits = [ np.concatenate(split) if split else np.array([], dtype=np.int64) for split in splits ]
+    for split in splits: split.sort()
+    return splits
@@ -0,0 +1,163 @@
+import copy
+import os
+import tempfile
+import uuid
+
+import awkward as ak
+import numpy as np
+
+from .ColumnStore import ColumnStore, LazyColumn, is_deferred
+
+# memory mapped files in /dev/shm never touch the disk, fall back to the temporary directory elsewhere
+shared_path = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+# arrays smaller than this are cheaper to pickle than to map
+min_shared_nbytes = 1 << 16
+
+_alignment = 64
+
+def _packed(array):
+    to_packed = getattr(ak, 'to_packed', None) or getattr(ak, 'packed')
+    return to_packed(array)
+
+class SharedArray:
+    """Descriptor of a numpy or awkward array stored in a memory mapped file, only the descriptor is pickled"""
+
+    def __init__(self, fname, buffers, form=None, length=None, shape=None):
+        self.fname = fname
+        self.buffers = buffers
+        self.form = form
+        self.length = length
+        self.shape = shape
+
+    @classmethod
+    def write(cls, array, path=None):
+        """Copy the buffers of array into a new memory mapped file"""
+        if isinstance(array, ak.Array):
+            form, length, container = ak.to_buffers(_packed(array))
+            form, shape = str(form), None
+        else:
+            form, length, container = None, None, { None: np.ascontiguousarray(array) }
+            shape = array.shape
+
+        buffers, offset = [], 0
+        for key, buffer in container.items():
+            buffer = np.asarray(buffer)
+            buffers.append( (key, buffer.dtype.str, offset, buffer.nbytes) )
+            offset += -(-buffer.nbytes // _alignment) * _alignment
+
+        fname = os.path.join(path or shared_path, f'eightb-{os.getpid()}-{uuid.uuid4().hex}.shm')
+        shared = cls(fname, buffers, form, length, shape)
+        try:
+            mapped = np.memmap(fname, dtype=np.uint8, mode='w+', shape=(max(offset, 1),))
+            for (_, _, start, nbytes), buffer in zip(buffers, container.values()):
+                mapped[start:start+nbytes] = np.frombuffer(np.ascontiguousarray(buffer), dtype=np.uint8)
+            mapped.flush()
+            del mapped
+        except BaseException:
+            shared.unlink()
+            raise
+
+        return shared
+
+    def read(self, mode='c'):
+        """Array on top of the mapped file (copy on write by default), the mapping stays valid after the file is unlinked"""
+        mapped = np.memmap(self.fname, dtype=np.uint8, mode=mode)
+        container = {
+            key: mapped[start:start+nbytes].view(dtype)
+            for key, dtype, start, nbytes in self.buffers
+        }
+        if self.form is None:
+            return container[None].reshape(self.shape)
+        return ak.from_buffers(self.form, self.length, container)
+
+    def unlink(self):
+        if os.path.exists(self.fname): os.remove(self.fname)
+
+def _is_shareable(obj, min_nbytes):
+    if isinstance(obj, ak.Array):
+        return obj.nbytes >= min_nbytes
+    if isinstance(obj, np.ndarray):
+        return not obj.dtype.hasobject and obj.nbytes >= min_nbytes
+    return False
+
+class SharedColumns:
+    """Columns of a tree, with the in-memory columns replaced by SharedArray descriptors (see share)"""
+
+    def __init__(self, columns, reloads):
+        self.columns = columns
+        self.reloads = reloads
+
+def _tree_columns(obj):
+    """Column store of a Tree (or anything holding its columns in a ColumnStore), None otherwise"""
+    columns = getattr(obj, '__dict__', {}).get('_columns', None)
+    return columns if isinstance(columns, (ColumnStore, SharedColumns)) else None
+
+def share(obj, min_nbytes=None, path=None):
+    """Replace the arrays in obj (an array, a Tree, or nested dicts, lists and tuples of them) by SharedArray descriptors
+
+    Trees are shallow copied with their loaded columns shared. Arrays below min_nbytes are pickled as usual.
+
+    Returns:
+        tuple: (obj with descriptors, list of SharedArray to unlink once the other process has read them)
+    """
+    min_nbytes = min_shared_nbytes if min_nbytes is None else min_nbytes
+    shared = []
+
+    def _share(obj):
+        if _is_shareable(obj, min_nbytes):
+            descriptor = SharedArray.write(obj, path)
+            shared.append(descriptor)
+            return descriptor
+        if type(obj) is dict:
+            return { key: _share(value) for key, value in obj.items() }
+        if type(obj) in (list, tuple):
+            return type(obj)( _share(value) for value in obj )
+        if isinstance(_tree_columns(obj), ColumnStore):
+            store = obj._columns
+            columns = { key: column.materialize() if is_deferred(column) else column for key, column in store.columns.items() }
+            tree = copy.copy(obj)
+            tree.__dict__['_columns'] = SharedColumns({ key: column if isinstance(column, LazyColumn) else _share(column) for key, column in columns.items() }, store.reloads)
+            return tree
+        return obj
+
+    try:
+        return _share(obj), shared
+    except BaseException:
+        release(shared)
+        raise
+
+def unshare(obj, unlink=False, mode='c'):
+    """Rebuild the arrays of the SharedArray descriptors in obj, with unlink the files are removed once mapped"""
+    def _unshare(obj):
+        if isinstance(obj, SharedArray):
+            try:
+                return obj.read(mode)
+            finally:
+                if unlink: obj.unlink()
+        if type(obj) is dict:
+            return { key: _unshare(value) for key, value in obj.items() }
+        if type(obj) in (list, tuple):
+            return type(obj)( _unshare(value) for value in obj )
+        if isinstance(_tree_columns(obj), SharedColumns):
+            columns = obj._columns
+            obj.__dict__['_columns'] = ColumnStore({ key: _unshare(column) for key, column in columns.columns.items() }, reloads=columns.reloads)
+            return obj
+        return obj
+
+    try:
+        return _unshare(obj)
+    except BaseException:
+        if unlink: release(descriptors(obj))
+        raise
+
+def descriptors(obj):
+    """SharedArray descriptors in obj, i.e. to unlink the results of a worker that will not be read"""
+    if isinstance(obj, SharedArray): return [obj]
+    if type(obj) is dict: return [ descriptor for value in obj.values() for descriptor in descriptors(value) ]
+    if type(obj) in (list, tuple): return [ descriptor for value in obj for descriptor in descriptors(value) ]
+    if isinstance(_tree_columns(obj), SharedColumns): return descriptors(list(obj._columns.columns.values()))
+    return []
+
+def release(shared):
+    for descriptor in shared: descriptor.unlink()
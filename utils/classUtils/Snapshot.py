@@ -0,0 +1,121 @@
+import copy
+import json
+import os
+import pickle
+import shutil
+
+import awkward as ak
+import numpy as np
+
+from .ColumnCache import _to_buffers
+from .ColumnStore import ColumnStore, LazyColumn, Concatenate, Gather
+from .RunLengthArray import RunLengthArray
+
+manifest_name = 'columns.json'
+state_name = 'state.pkl'
+
+def _save_buffers(path, buffers):
+    os.makedirs(path)
+    for key, buffer in buffers.items():
+        np.save(os.path.join(path, f'{key}.npy'), np.asarray(buffer))
+
+def _load_buffers(path, keys, mmap=True):
+    return { key: np.load(os.path.join(path, f'{key}.npy'), mmap_mode='r' if mmap else None) for key in keys }
+
+def _holds_data(column):
+    """True for LazyColumns that keep columns in memory (deferred selections and concatenations of loaded columns)"""
+    if isinstance(column.loader, Gather): return True
+    if isinstance(column.loader, Concatenate):
+        return any( not isinstance(part, LazyColumn) or _holds_data(part) for part in column.loader.columns )
+    return False
+
+def _without_arrays(fn):
+    if getattr(fn, 'arrays', None) is None: return fn
+    fn = copy.copy(fn)
+    fn.arrays = None
+    return fn
+
+def _state(tree):
+    """State of the tree without any column data, the columns are written separately"""
+    state = { key: value for key, value in tree.__dict__.items() if key not in ('_columns', '_expr_cache', '_event_identity', '_column_identities') }
+    if 'filelist' in state: state['filelist'] = [ _without_arrays(fn) for fn in state['filelist'] ]
+    return state
+
+def save_snapshot(tree, path):
+    """Write the columns of a tree as one npy file per buffer, and the rest of its state (and unloaded columns) in a pickle sidecar.
+    An existing snapshot at path is only replaced once the new one is written."""
+    path = path.rstrip('/')
+    if os.path.exists(path) and not os.path.exists(os.path.join(path, manifest_name)):
+        raise ValueError(f'{path} exists and is not a tree snapshot')
+
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path): shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+    try:
+        _write_snapshot(tree, tmp_path)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    if os.path.exists(path):
+        old_path = path + '.old'
+        if os.path.exists(old_path): shutil.rmtree(old_path)
+        os.rename(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path)
+    else:
+        os.replace(tmp_path, path)
+    return path
+
+def _write_snapshot(tree, tmp_path):
+    store = tree._columns
+    manifest, lazy = [], dict()
+    for i, (field, column) in enumerate(store.columns.items()):
+        if isinstance(column, LazyColumn) and not column.loaded and _holds_data(column): column = column.materialize()
+        if isinstance(column, LazyColumn) and column.loaded: column = column._value
+
+        column_path = os.path.join(tmp_path, str(i))
+        if isinstance(column, LazyColumn):
+            lazy[field] = column
+            manifest.append(dict(field=field, kind='lazy'))
+        elif isinstance(column, RunLengthArray):
+            _save_buffers(column_path, dict(values=column.values, offsets=column.offsets))
+            manifest.append(dict(field=field, kind='rle'))
+        else:
+            form, length, container = _to_buffers(column)
+            _save_buffers(column_path, container)
+            manifest.append(dict(field=field, kind='awkward', form=form, length=int(length), buffers=list(container.keys())))
+
+    with open(os.path.join(tmp_path, state_name), 'wb') as f:
+        # copies of trees are restored as their base class
+        cls = next( cls for cls in type(tree).__mro__ if cls.__name__ != 'CopyTree' )
+        pickle.dump(dict(state=_state(tree), lazy=lazy, reloads=store.reloads, cls=cls), f)
+
+    with open(os.path.join(tmp_path, manifest_name), 'w') as f:
+        json.dump(manifest, f)
+
+def load_snapshot(path, mmap=True):
+    """Restore a tree written by save_snapshot, with its columns memory mapped from disk unless mmap is False"""
+    with open(os.path.join(path, manifest_name)) as f:
+        manifest = json.load(f)
+    with open(os.path.join(path, state_name), 'rb') as f:
+        sidecar = pickle.load(f)
+
+    columns = dict()
+    for i, column in enumerate(manifest):
+        column_path = os.path.join(path, str(i))
+        field, kind = column['field'], column['kind']
+
+        if kind == 'lazy':
+            columns[field] = sidecar['lazy'][field]
+        elif kind == 'rle':
+            buffers = _load_buffers(column_path, ['values', 'offsets'], mmap=mmap)
+            columns[field] = RunLengthArray(buffers['values'], offsets=buffers['offsets'])
+        else:
+            buffers = _load_buffers(column_path, column['buffers'], mmap=mmap)
+            columns[field] = ak.from_buffers(column['form'], column['length'], buffers)
+
+    tree = sidecar['cls'].__new__(sidecar['cls'])
+    tree.__dict__.update(sidecar['state'])
+    tree._columns = ColumnStore(columns, reloads=sidecar['reloads'])
+    return tree
@@ -0,0 +1,122 @@
+import json
+import os
+import threading as th
+import time
+from contextlib import contextmanager
+
+import awkward as ak
+import numpy as np
+
+def nbytes(obj):
+    """Bytes held by the arrays in obj (an array, or nested dicts, lists and tuples of arrays)"""
+    if isinstance(obj, ak.Array): return obj.nbytes
+    if isinstance(obj, np.ndarray): return obj.nbytes
+    if isinstance(obj, dict): return sum( nbytes(value) for value in obj.values() )
+    if isinstance(obj, (list, tuple)): return sum( nbytes(value) for value in obj )
+    return 0
+
+class Tracer:
+    """
+    Timeline of spans exported as a Chrome trace (chrome://tracing or ui.perfetto.dev), disabled by default.
+
+    Example:
+        tracer.enable()
+        with tracer.span('reco', cat='study', sample=tree.sample) as args:
+            ...
+            args['bytes_out'] = nbytes(result)
+        tracer.export('trace.json')
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.spans = []
+        self.names = {}
+        self._lock = th.Lock()
+
+    def enable(self):
+        self.enabled = True
+        return self
+
+    def disable(self):
+        self.enabled = False
+        return self
+
+    def clear(self):
+        with self._lock:
+            self.spans, self.names = [], {}
+
+    def _name_thread(self, pid, tid, process, thread):
+        self.names.setdefault((pid, None), process)
+        self.names.setdefault((pid, tid), thread)
+
+    def add(self, name, start, end, cat='', pid=None, tid=None, process=None, thread=None, **args):
+        """Record a span from start to end (seconds since the epoch), in the current thread by default"""
+        if not self.enabled: return
+        import multiprocessing as mp
+
+        pid = os.getpid() if pid is None else pid
+        tid = th.get_ident() if tid is None else tid
+        span = dict(name=name, cat=cat, start=start, end=end, pid=pid, tid=tid, args=args)
+        with self._lock:
+            self.spans.append(span)
+            self._name_thread(pid, tid, process or mp.current_process().name, thread or th.current_thread().name)
+
+    @contextmanager
+    def span(self, name, cat='', **args):
+        """Record the time spent in the block, the yielded dict of arguments can be updated inside the block"""
+        if not self.enabled:
+            yield args
+            return
+
+        start = time.time()
+        try:
+            yield args
+        finally:
+            self.add(name, start, time.time(), cat=cat, **args)
+
+    def collect(self):
+        """Remove and return the spans recorded so far, with the names of their processes and threads"""
+        with self._lock:
+            spans, names = self.spans, self.names
+            self.spans, self.names = [], {}
+        return spans, names
+
+    def merge(self, collected):
+        """Add the spans collected in another process, see collect"""
+        spans, names = collected
+        with self._lock:
+            self.spans.extend(spans)
+            for key, name in names.items(): self.names.setdefault(key, name)
+
+    def chrome_trace(self):
+        events = [
+            dict(name='process_name' if tid is None else 'thread_name', ph='M', pid=pid, tid=0 if tid is None else tid, args=dict(name=name))
+            for (pid, tid), name in self.names.items()
+        ]
+        events += [
+            dict(
+                name=span['name'], cat=span['cat'], ph='X', pid=span['pid'], tid=span['tid'],
+                ts=span['start']*1e6, dur=(span['end'] - span['start'])*1e6,
+                args={ key: value if isinstance(value, (int, float, str, bool, type(None))) else str(value) for key, value in span['args'].items() },
+            )
+            for span in self.spans
+        ]
+        return dict(traceEvents=events, displayTimeUnit='ms')
+
+    def export(self, fname):
+        """Write the spans as Chrome trace json"""
+        dirname = os.path.dirname(fname)
+        if dirname: os.makedirs(dirname, exist_ok=True)
+        with open(fname, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+        return fname
+
+    def summary(self):
+        """Number of spans and total time in seconds of each span name"""
+        summary = {}
+        for span in self.spans:
+            count, total = summary.get(span['name'], (0, 0))
+            summary[span['name']] = (count + 1, total + span['end'] - span['start'])
+        return summary
+
+tracer = Tracer()
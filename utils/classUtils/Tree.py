@@ -7,21 +7,36 @@ from ..xsecUtils import *
 from ..utils import *
 
 from .AttrArray import AttrArray
+from .ColumnCache import producer_name
+from .ColumnStore import ColumnStore, LazyColumn, Concatenate, concatenate_columns, is_deferred
+from .Expression import Expression
+from .EventIndex import EventIndex, Friend, attach_friend, find_keys, pack_keys
+from .MemoryManager import memory, format_bytes, column_nbytes, read_branch, BranchLoader, CacheLoader
+from .RunLengthArray import RunLengthArray
+from .Snapshot import save_snapshot, load_snapshot
+from .Columnar import is_columnar, columnar_fname, write_columnar, read_columnar, read_info, iterate_columnar
+from .FileMetadata import FileMetadataCache
+from .Cutflow import CutflowAccumulator
+from .Sampling import sample_indices, split_indices, stratified_sample, stratified_split
+from .Tracer import tracer
 # from ..fileUtils import eos
 
-from ..fileUtils import fs
+from ..fileUtils import fs, Prefetcher, background
 
 eos = fs.eos
 
 import uproot as ut
 import awkward as ak
 import numpy as np
-import re, glob, os
+import re, glob, os, time, threading, weakref
 import functools
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
+from concurrent.futures import Future, wait, FIRST_COMPLETED
 
 from tqdm import tqdm
 import subprocess
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 def _check_file(fname):
     if os.path.isfile(fname): return fname
@@ -35,11 +50,11 @@ def _glob_files(pattern):
     if any(files): return files
     return []
 
+remote_pattern = re.compile(r'^root://(.*?)//(.*)$')
+
 def copy_to_local(fname):
     if os.path.isfile(fname): return fname
 
-    import re
-    remote_pattern = re.compile(r'^root://(.*?)//(.*)$')
     match = remote_pattern.match(fname)
     if not match: return fname
     
@@ -53,9 +68,12 @@ def copy_to_local(fname):
 
 
 class RootFile:
-    def __init__(self, fname, treename='sixBtree', sample=None, xsec=None, normalization=None, fields=None):
+    # persistent index of entries, branches and normalization of each file, set to None to always open the files
+    metadata_cache = FileMetadataCache()
+
+    def __init__(self, fname, treename='sixBtree', sample=None, xsec=None, normalization=None, fields=None, local=None):
         self.true_fname = fname
-        self.fname = copy_to_local(fname)
+        self.fname = copy_to_local(fname) if local is None else local
 
         if self.fname is None: 
             print(f'[WARNING] skipping {self.fname}, was not found.')
@@ -63,37 +81,129 @@ class RootFile:
         
         self.treename = treename
 
+        with tracer.span('open', cat='file', fname=self.fname) as span:
+            if is_columnar(self.fname): 
+                self.open_columnar(fields)
+                if normalization is not None:       
+                    self.set_normalization(normalization)   
+            elif fields is not None or not self.load_metadata(normalization):
+                self.open_root(fields)
+                if normalization is not None:       
+                    self.set_normalization(normalization)   
+                self.save_metadata(normalization)
+            else:
+                span['cached'] = True
+            span['bytes_out'] = self.arrays.nbytes if self.arrays is not None else 0
+            
+        _sample, _xsec = next(((key, value) for key, value in xsecMap.items() if key in self.fname), ("unk", 1))
+        self.sample = _sample if sample is None else sample
+        self.xsec = _xsec if xsec is None else xsec
+
+        self.histograms = {}
+        if getattr(self, 'cutflow', None) is None:
+            from ..plotUtils import Histo
+            self.cutflow = Histo(counts=np.array([self.raw_events]), bins=np.array([0,1]))
+
+    def open_root(self, fields=None):
         with ut.open(f'{self.fname}:{self.treename}', timecut=500) as tree:
+            self.uuid = str(tree.file.uuid)
             self.raw_events = tree.num_entries
             self.total_events = self.raw_events
             self.fields = [ str(branch) for branch in tree.keys() ]
+            self.types = { field: str(tree[field].typename) for field in self.fields }
 
             if fields is not None:
                 fields = [ field for field in fields if field in self.fields ]
+
+                start = time.perf_counter()
                 self.arrays = tree.arrays(fields, library='ak')
+                self.projection = dict(
+                    fields=len(fields),
+                    total_fields=len(self.fields),
+                    bytes=sum(tree[field].uncompressed_bytes for field in fields),
+                    total_bytes=sum(tree[field].uncompressed_bytes for field in self.fields),
+                    time=time.perf_counter() - start,
+                )
             else:
                 self.arrays = None
+                self.projection = None
+
+    def open_columnar(self, fields=None):
+        info = read_info(self.fname)
+        self.metadata = info['metadata']
+        self.uuid = self.metadata.get('uuid', None)
+        self.raw_events = info['num_entries']
+        self.total_events = self.raw_events
+        self.fields = info['fields']
+
+        self.arrays = None
+        self.projection = None
+        if fields is not None:
+            fields = [ field for field in fields if field in self.fields ]
+            self.arrays = read_columnar(self.fname, fields)
+
+    def load_metadata(self, normalization=None):
+        """Restore the entries, branches and normalization of the file from the metadata cache
+
+        Returns:
+            bool: False if the file (or its normalization) is not in the cache, or changed since it was cached
+        """
+        if self.metadata_cache is None: return False
+        meta = self.metadata_cache.load(self.fname, self.treename, normalization)
+        if meta is None: return False
+
+        self.uuid = meta['uuid']
+        self.raw_events = meta['raw_events']
+        self.total_events = self.raw_events
+        self.fields = meta['fields']
+        self.types = meta['types']
+        self.arrays = None
+        self.projection = None
+
+        norm = meta['normalization']
+        if norm is not None:
+            from ..plotUtils import Histo
+            self.total_events = norm['total_events']
+            if 'cutflow_labels' in norm: self.cutflow_labels = norm['cutflow_labels']
+            cutflow = norm.get('cutflow', None)
+            if cutflow is not None:
+                self.cutflow = Histo(counts=np.array(cutflow['counts']), bins=np.array(cutflow['bins']), error=np.array(cutflow['error']))
+        return True
+
+    def save_metadata(self, normalization=None):
+        if self.metadata_cache is None: return
+
+        tree = dict(uuid=self.uuid, raw_events=int(self.raw_events), fields=self.fields, types=self.types)
+        norm = None
+        if normalization is not None and not isinstance(normalization, dict):
+            norm = dict(total_events=self.total_events)
+            if hasattr(self, 'cutflow_labels'): norm['cutflow_labels'] = list(self.cutflow_labels or [])
+            if getattr(self, 'cutflow', None) is not None:
+                from ..plotUtils import Histo
+                cutflow = Histo.convert(self.cutflow)
+                norm['cutflow'] = dict(counts=cutflow.histo, bins=cutflow.bins, error=cutflow.error)
 
-        if normalization is not None:       
-            self.set_normalization(normalization)   
-            
-        _sample, _xsec = next(((key, value) for key, value in xsecMap.items() if key in self.fname), ("unk", 1))
-        self.sample = _sample if sample is None else sample
-        self.xsec = _xsec if xsec is None else xsec
+        try:
+            self.metadata_cache.save(self.fname, self.treename, tree, normalization, norm)
+        except OSError as err:
+            print(f'[WARNING] could not cache metadata of {self.fname}: {err}')
 
-        self.histograms = {}
-        if getattr(self, 'cutflow', None) is None:
+    def load_histograms(self, keys=None):
+        if is_columnar(self.fname):
             from ..plotUtils import Histo
-            self.cutflow = Histo(counts=np.array([self.raw_events]), bins=np.array([0,1]))
+            histograms = self.metadata.get('histograms', {})
+            self.histograms = { key: Histo(counts=np.array(h['counts']), bins=np.array(h['bins'])) for key, h in histograms.items() }
+            return
 
-    def load_histograms(self, keys=None):
         with ut.open(self.fname) as f:
             keys = [ key[:-2] for key in f.keys() ]
             histograms = [ key for key in keys if key not in ('sixBtree','h_cutflow','NormWeightTree') ]
             self.histograms = { key : f[key] for key in histograms }
             
     def set_normalization(self, normalization):
-        if isinstance(normalization, dict):
+        if is_columnar(self.fname):
+            self.set_metadata_normalization(normalization)
+        elif isinstance(normalization, dict):
             self.set_dict_normalization(normalization)
         elif ':' in normalization:
             self.set_tree_normalization(normalization)
@@ -121,6 +231,17 @@ class RootFile:
         with ut.open(f'{self.fname}:{histo}') as histo:
             self.total_events = histo.Integral()
 
+    def set_metadata_normalization(self, cutflow):
+        from ..plotUtils import Histo
+
+        self.cutflow_labels = []
+        cutflow = self.metadata.get('histograms', {}).get(cutflow, None)
+        if cutflow is None: return
+
+        self.cutflow_labels = cutflow.get('labels', None) or []
+        self.cutflow = Histo(counts=np.array(cutflow['counts']), bins=np.array(cutflow['bins']))
+        self.total_events = cutflow['counts'][0]
+
     def set_dict_normalization(self, norms):
         raise NotImplementedError
 
@@ -129,13 +250,14 @@ class RootFile:
         with ut.open(f'{self.fname}:{treename}') as tree:
             self.total_events = ak.sum(tree[branchname].array())
 
-    def write(self, altfile, retry=2, tree=None, types=None, **kwargs):
+    def write(self, altfile, retry=2, tree=None, types=None, chunk=None, format='root', codec='zstd', row_group_size=None, **kwargs):
 
         fname = eos.cleanpath(self.fname)
         if callable(altfile): output = altfile(fname)
         else:
             dirname, basename = os.path.dirname(fname), os.path.basename(fname)
-            output = os.path.join(dirname, altfile.format(base=basename))
+            output = os.path.join(dirname, altfile.format(base=basename, chunk=chunk))
+        if format != 'root': output = columnar_fname(output, format)
 
         if re.match(r'^root://(.*?)//(.*)$', output):
             tmp_output = '_'.join(output.split('/'))
@@ -152,19 +274,112 @@ class RootFile:
         kwargs.update( **getattr(self, 'histograms', {}) )
 
         print(f'Writing {output}')
+        if format == 'root':
+            self.write_root(tmp_output, tree, retry=retry, **kwargs)
+        else:
+            self.write_columnar(tmp_output, tree, format=format, codec=codec, row_group_size=row_group_size, **kwargs)
+
+        if copy_to_remote:
+            eos.move(tmp_output, output)
+
+    def write_root(self, output, tree, retry=2, **kwargs):
         for i in range(retry):
             try:
-                with ut.recreate(tmp_output) as f:
+                with ut.recreate(output) as f:
                     for key, value in kwargs.items():
                         f[key] = value
                     f[self.treename] = tree
                 break
             except ValueError:
                 ...
-        if copy_to_remote:
-            eos.move(tmp_output, output)
 
-def init_files(self, filelist, treename, normalization, altfile="{base}", report=True, xsec=None, fields=None):
+    def write_columnar(self, output, tree, format='parquet', codec='zstd', row_group_size=None, cutflow_labels=None, **kwargs):
+        """Write the tree to a parquet/arrow file, with the histograms (i.e. h_cutflow) stored in the file metadata"""
+        histograms = { key: _histogram_metadata(value) for key, value in kwargs.items() }
+        if 'h_cutflow' in histograms:
+            if cutflow_labels is None: cutflow_labels = getattr(self, 'cutflow_labels', None) or []
+            histograms['h_cutflow']['labels'] = list(cutflow_labels)
+
+        metadata = dict(treename=self.treename, histograms=histograms)
+        write_columnar(output, tree, format=format, codec=codec, row_group_size=row_group_size, metadata=metadata)
+
+def _histogram_metadata(histogram):
+    """Counts and bins of a histogram given as a (counts, bins) tuple, a Histo or a uproot histogram"""
+    if isinstance(histogram, tuple): counts, bins = histogram[:2]
+    elif hasattr(histogram, 'to_numpy'): counts, bins = histogram.to_numpy()[:2]
+    else: counts, bins = histogram.histo, histogram.bins
+    return dict(counts=np.asarray(counts).tolist(), bins=np.asarray(bins).tolist())
+
+def _memo_copy(result):
+    """Copy of a memoized result that can be edited in place without changing the memo"""
+    # awkward arrays are only edited in place by setting fields, a new view over the same buffers is enough
+    if isinstance(result, ak.Array): return ak.Array(result.layout, behavior=result.behavior)
+    if isinstance(result, np.ndarray): return result.copy()
+    return result
+
+def open_files(filelist, treename, normalization, xsec, fields=None, nworkers=8, timeout=None, report=True, prefetch=4, prefetch_bytes=None):
+    """Open a list of files concurrently as RootFiles, in the order of filelist
+
+    Remote files are copied to the local store by a Prefetcher (prefetch transfers, at most prefetch_bytes waiting)
+    and opened from their local copy, at most nworkers at a time. Files that fail to open are skipped, and so are
+    files that take longer than timeout seconds: their open keeps running in its own daemon thread, but no longer
+    counts against nworkers.
+    """
+    def _open_file(i, fn, local):
+        future = Future()
+        def _run():
+            try:
+                future.set_result( RootFile(fn, treename, normalization=normalization, xsec=xsec[i], fields=fields, local=local) )
+            except BaseException as err:
+                future.set_exception(err)
+        threading.Thread(target=_run, daemon=True).start()
+        return future
+
+    nworkers = max(1, min(nworkers or 1, len(filelist)))
+    locals_ = iter([None]*len(filelist))
+    if prefetch and any( remote_pattern.match(fn) for fn in filelist ):
+        locals_ = iter(Prefetcher(filelist, copy_to_local, depth=prefetch, max_bytes=prefetch_bytes, skip_errors=True))
+
+    rootfiles = dict()
+    pbar = tqdm(total=len(filelist)) if report else None
+    try:
+        # the local copies are only taken from the prefetcher when a worker is free to open them,
+        # so that copies waiting to be opened stay within the prefetcher budget
+        pending, scheduled = dict(), 0
+        while scheduled < len(filelist) or pending:
+            while scheduled < len(filelist) and len(pending) < nworkers:
+                i, local = scheduled, next(locals_)
+                scheduled += 1
+                if isinstance(local, Exception):
+                    print(f'[WARNING] skipping {filelist[i]}, unable to copy: {local}')
+                    if pbar: pbar.update(1)
+                    continue
+                pending[_open_file(i, filelist[i], local)] = (i, time.perf_counter())
+            if not pending: break
+
+            wait_for = None if timeout is None else max(0, min( start + timeout for _, start in pending.values() ) - time.perf_counter())
+            done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            now = time.perf_counter()
+            for future, (i, start) in list(pending.items()):
+                fn = filelist[i]
+                if future in done:
+                    err = future.exception()
+                    if err is None:
+                        rootfiles[i] = future.result()
+                    else:
+                        traceback.print_exception(type(err), err, err.__traceback__)
+                        print(f'[WARNING] skipping {fn}, unable to open.')
+                elif timeout is not None and now - start >= timeout:
+                    print(f'[WARNING] skipping {fn}, timed out after {timeout}s.')
+                else: continue
+                del pending[future]
+                if pbar: pbar.update(1)
+    finally:
+        if hasattr(locals_, 'close'): locals_.close()
+    if pbar: pbar.close()
+    return [ rootfiles[i] for i in sorted(rootfiles) ]
+
+def init_files(self, filelist, treename, normalization, altfile="{base}", report=True, xsec=None, fields=None, nworkers=8, timeout=None, prefetch=4, prefetch_bytes=None):
     if type(filelist) == str:
         if filelist.endswith('.txt'):
             with open(filelist, 'r') as f:
@@ -190,15 +405,8 @@ def init_files(self, filelist, treename, normalization, altfile="{base}", report
     if any(glob_filelist):
         filelist = glob_filelist
 
-    it = tqdm(filelist) if report else iter(filelist)
-    self.filelist = []
     xsec = AttrArray.init_attr(xsec, None, len(filelist))
-    for i, fn in enumerate(it):
-        try:
-            self.filelist.append( RootFile(fn, treename, normalization=normalization, xsec=xsec[i], fields=fields) )
-        except Exception as err:
-            traceback.print_exc()
-            print(f'[WARNING] skipping {fn}, unable to open.')
+    self.filelist = open_files(filelist, treename, normalization, xsec, fields=fields, nworkers=nworkers, timeout=timeout, report=report, prefetch=prefetch, prefetch_bytes=prefetch_bytes)
             
     # Fix normalization when using multiple files of the same sample
     samples = defaultdict(lambda:0)
@@ -274,7 +482,7 @@ def init_sample(self):  # Helper Method For Tree Class
     self.pltargs = dict()
 
 def init_empty(self):
-    self.ttree = ak.Array(dict())
+    self._columns = ColumnStore()
 
     self.is_data = False
     self.nmssm_signal = False
@@ -292,26 +500,36 @@ def init_empty(self):
 def init_tree(self, weights=['genWeight'], cache=None, normalization=None, fields=None):
     if weights is None: weights = []
     
-    self.ttree = ut.lazy([ f'{fn.fname}:{fn.treename}' for fn in self.filelist ])
-    self.fields = self.ttree.fields
+    init_columns(self)
 
     if fields is not None:
         fields = [ field for field in fields if field in self.fields ]
         arrays = ak.concatenate([fn.arrays for fn in self.filelist])
-        for field in fields:
-            self.ttree[field] = arrays[field]
+        self.extend(**{ field: arrays[field] for field in fields })
+        # the projected arrays are only held by the tree
+        for fn in self.filelist: fn.arrays = None
+        self.projection = init_projection(self.filelist)
+
+    # raw branches can be evicted and read again from the files
+    self._columns.reloads.update({ field: LazyColumn(BranchLoader(self.filelist, field), len(self)) for field in self.fields })
 
     weights = [ weight for weight in weights if any(field in weight for field in self.fields) ]
+    self.weights = weights
     scale = functools.reduce(lambda x, y : x * y, [self[weight] for weight in weights], 1)
 
     self.extend(
-        sample_id=ak.concatenate([ak.Array([i]*fn.raw_events)
-                                 for i, fn in enumerate(self.filelist)]),
-        scale=scale*ak.concatenate([np.full(shape=fn.raw_events, fill_value=fn.scale, dtype=np.float) for fn in self.filelist])
+        sample_id=RunLengthArray(np.arange(len(self.filelist)), [ fn.raw_events for fn in self.filelist ]),
+    )
+    self.extend(
+        scale=np.asarray(self.file_column([ float(fn.scale) for fn in self.filelist ]) * scale)
     )
 
     self.raw_events = sum(fn.raw_events for fn in self.filelist)
+    init_cutflow(self, normalization)
+
+    self.systematics = None
 
+def init_cutflow(self, normalization=None):
     from ..plotUtils import Histo
 
     if normalization == 'h_cutflow':
@@ -342,16 +560,98 @@ def init_tree(self, weights=['genWeight'], cache=None, normalization=None, field
         self.cutflow = []
         self.cutflow_labels = []
 
+def init_projection(filelist):
+    """Sum the projection accounting of each file in the filelist"""
+    projections = [ fn.projection for fn in filelist if getattr(fn, 'projection', None) ]
+    if not any(projections): return None
+
+    projection = { key: sum(p[key] for p in projections) for key in ('bytes', 'total_bytes', 'time') }
+    projection.update(
+        fields=max(p['fields'] for p in projections),
+        total_fields=max(p['total_fields'] for p in projections),
+    )
+    return projection
+
+def init_columns(self):
+    """Lazy columns over all the branches of the filelist, ROOT files are read with uproot.lazy 
+    and parquet/arrow files are read column by column when each column is first accessed"""
+    if all( is_columnar(fn.fname) for fn in self.filelist ):
+        fields = [ field for field in self.filelist[0].fields if all(field in fn.fields for fn in self.filelist) ]
+        raw_events = sum(fn.raw_events for fn in self.filelist)
+        self._columns = ColumnStore({ field: LazyColumn(BranchLoader(self.filelist, field), raw_events) for field in fields })
+    else:
+        self.ttree = ut.lazy([ f'{fn.fname}:{fn.treename}' for fn in self.filelist ])
+
+def init_stream(self, weights=['genWeight'], normalization=None, step_size='100 MB', fields=None):
+    if weights is None: weights = []
+    self.projected_fields = list(fields) if fields is not None else None
+
+    init_columns(self)
+
+    self.weights = [ weight for weight in weights if any(field in weight for field in self.fields) ]
+    self.step_size = step_size
+
+    self.raw_events = sum(fn.raw_events for fn in self.filelist)
+    init_cutflow(self, normalization)
 
     self.systematics = None
 
+def init_chunk(self, tree, index, arrays, start, chunk):
+    """Initialize a chunk of a streamed tree from a block of arrays read from file index"""
+    from ..plotUtils import Histo
+
+    self.ttree = arrays
+    self.step_size = None
+    self.chunk = chunk
+    self.chunk_entries = (index, start, start + len(arrays))
+
+    fn = tree.filelist[index]
+    scale = functools.reduce(lambda x, y : x * y, [self[weight] for weight in tree.weights], 1)
+    self.extend(
+        sample_id=RunLengthArray([index], [len(arrays)]),
+        scale=np.asarray(RunLengthArray([float(fn.scale)], [len(arrays)]) * scale),
+    )
+    self.raw_events = len(arrays)
+
+    # only the first chunk of each file carries the file level cutflow
+    # so that summing the cutflows over all chunks reproduces the full sample
+    def _chunk_cutflow(i, cutflow):
+        if i == index and start == 0: return cutflow
+        return Histo(np.zeros_like(cutflow.histo), cutflow.bins, np.zeros_like(cutflow.error))
+    self.cutflow = [ _chunk_cutflow(i, cutflow) for i, cutflow in enumerate(tree.cutflow) ]
+
+def _reduce_stream(total, output):
+    """Accumulate the output of a streamed method with the running total"""
+    from ..plotUtils import Histo
+
+    if output is None: return total
+    if total is None:
+        if isinstance(output, Tree):
+            summary = output.copy()
+            summary._columns = output._columns[:0]
+            return summary
+        return output
+
+    if isinstance(output, Tree):
+        cutflow = CutflowAccumulator.from_histos(total.cutflow) + CutflowAccumulator.from_histos(output.cutflow)
+        total.cutflow = cutflow.histos()
+        total.cutflow_labels = max(total.cutflow_labels, output.cutflow_labels, key=len)
+        return total
+    if isinstance(output, Histo):
+        return Histo.add(total, output)
+    if isinstance(output, dict):
+        return { key: _reduce_stream(total.get(key, None), value) for key, value in output.items() }
+    if isinstance(output, (list, tuple)):
+        return type(output)( _reduce_stream(this, that) for this, that in zip(total, output) )
+    return total + output
+
 def _regex_field(self, regex):
-    matched_fields = list(filter(lambda field : re.match(f"^{regex}$", field), self.ttree.fields))
+    matched_fields = list(filter(lambda field : re.match(f"^{regex}$", field), self.fields))
     if regex not in matched_fields: return   
     item = ak.from_regular(
         ak.unflatten(
             ak.flatten(
-                ak.zip(ak.unzip(self.ttree[matched_fields])),
+                ak.zip(ak.unzip(self[matched_fields])),
                 axis=None,
             ),
             len(matched_fields)
@@ -385,6 +685,8 @@ class AccessCache:
 
     def __contains__(self, item):
         return item in self.cache
+    def __iter__(self):
+        return iter(self.cache)
     def __len__(self):
         return len(self.cache)
     
@@ -416,6 +718,11 @@ class AccessCache:
 
 class Tree:
     accessed_fields = AccessCache()
+    column_cache = None
+    memory = memory
+    expr_cache_size = 32
+    # EventFilters select events with Tree.select instead of copying every column
+    deferred_selection = True
 
     @classmethod
     def from_ak(cls, ak_tree, **kwargs):
@@ -425,20 +732,39 @@ class Tree:
 
         return tree
 
+    @staticmethod
+    def restore(path, mmap=True):
+        """Restore a tree saved with Tree.snapshot
+
+        Args:
+            path (str): snapshot directory
+            mmap (bool, optional): memory map the columns instead of reading them in memory. Defaults to True.
+
+        Returns:
+            Tree: restored tree
+        """
+        return load_snapshot(path, mmap=mmap)
 
-    def __init__(self, filelist, altfile="{base}", report=True, treename='sixBtree', weights=['genWeight'], normalization='h_cutflow', xsec=None, fields=None, **kwargs):
+    def __init__(self, filelist, altfile="{base}", report=True, treename='sixBtree', weights=['genWeight'], normalization='h_cutflow', xsec=None, fields=None, step_size=None, nworkers=8, timeout=None, prefetch=4, prefetch_bytes=None, **kwargs):
         self._recursion_safe_guard_stack = []
         self.varmap = dict()
 
-        init_files(self, filelist, treename, normalization, altfile, report, xsec=xsec, fields=fields)
+        if fields is not None: fields = list(fields)
+        init_files(self, filelist, treename, normalization, altfile, report, xsec=xsec, fields=fields if step_size is None else None, nworkers=nworkers, timeout=timeout, prefetch=prefetch, prefetch_bytes=prefetch_bytes)
 
         if not any(self.filelist):
             init_empty(self)
             print('[WARNING] unable to open any files with filelist')
             print('          ', filelist)
+        elif step_size is not None:
+            init_sample(self)
+            init_stream(self, weights, normalization=normalization, step_size=step_size, fields=fields)
         else:
             init_sample(self)
-            init_tree(self, weights, normalization=normalization)
+            init_tree(self, weights, normalization=normalization, fields=fields)
+
+            if report and self.__dict__.get('projection', None):
+                self.projection_report()
 
         self.reductions = dict()
         self.__dict__.update(**kwargs)
@@ -453,35 +779,94 @@ class Tree:
         ]
         return "\n".join(sample_string)
     
+    @property
+    def ttree(self):
+        """Record view over all the columns of the tree"""
+        return self.__dict__['_columns'].record
+
+    @ttree.setter
+    def ttree(self, record):
+        self._columns = ColumnStore.from_record(record)
+
+    @property
+    def fields(self):
+        return self.__dict__['_columns'].fields
+
     def __getitem__(self, key): 
         if isinstance(key, list):
-            return self.ttree[key]
+            for field in key: self._load_missing(field)
+            Tree.accessed_fields.update(key)
+            return self._access(*key)[key]
         
         if hasattr(self, 'varmap') and key in self.varmap and not key in self.fields:
-            self.ttree[key] = self.ttree[self.varmap[key]]
+            self.extend(**{key: self._columns[self.varmap[key]]})
 
-        if key in self.ttree.fields:
+        self._load_missing(key)
+        if key in self._columns:
             Tree.accessed_fields.add(key)
-            return self.ttree[key]
+            column = self._access(key)[key]
+            # run length encoded columns stay compressed in the store, but are read as plain arrays
+            if isinstance(column, RunLengthArray): return column.dense()
+            return column
         return self.get_expr(key)
+
+    def _access(self, *keys):
+        """Mark columns as recently used for the memory budget, and enforce the budget if any column has to be read"""
+        columns = self._columns
+        Tree.memory.register(columns)
+        Tree.memory.touch(columns, *keys)
+        if any( columns.is_lazy(key) for key in keys ):
+            Tree.memory.enforce()
+        reads = self.__dict__.get('_column_reads', None)
+        if reads is not None: reads.update(keys)
+        return columns
+
+    @contextmanager
+    def record_reads(self):
+        """Collect the fields read from the tree inside the block"""
+        outer = self.__dict__.get('_column_reads', None)
+        reads = self.__dict__['_column_reads'] = set()
+        try:
+            yield reads
+        finally:
+            self.__dict__['_column_reads'] = outer
+            if outer is not None: outer.update(reads)
+
+    def _load_missing(self, key):
+        """Read a branch that was not projected into a chunk of a streamed tree"""
+        entries = self.__dict__.get('chunk_entries', None)
+        if entries is None or key in self._columns: return
+
+        index, start, stop = entries
+        fn = self.filelist[index]
+        if key not in fn.fields: return
+
+        self.extend(**{key: read_branch(fn.fname, fn.treename, key, start, stop)})
     
     def get_expr(self, expr):
-        import ast
-        scope = dict(ak=ak, np=np, len=len)
-
-        # get fields referenced in expression
-        fields = set()
-        for node in ast.walk(ast.parse(expr)):
-            if isinstance(node, ast.Name):
-                fields.add(node.id)
-        fields = fields - set(scope.keys())
+        """Evaluate an expression of the tree fields, memoized until one of its fields is replaced"""
+        expression = Expression.compile(expr)
 
         # get fields from tree
-        fields = { field: self.ttree[field] for field in fields }
+        for field in expression.fields: self._load_missing(field)
+        columns = self._access(*[ field for field in expression.fields if field in self._columns ])
+        fields = { field: columns[field] for field in expression.fields if field in columns }
         Tree.accessed_fields.update(fields.keys())
 
+        memo = self.__dict__.setdefault('_expr_cache', OrderedDict())
+        if expr in memo:
+            deps, result = memo[expr]
+            if len(deps) == len(fields) and all( fields.get(field) is column() for field, column in deps.items() ):
+                memo.move_to_end(expr)
+                return _memo_copy(result)
+
         # evaluate expression
-        return eval(expr, scope, fields)
+        result = expression.evaluate(fields)
+
+        # dependencies are held by weak reference so that the memo does not keep evicted columns alive
+        memo[expr] = ({ field: weakref.ref(column) for field, column in fields.items() }, result)
+        while len(memo) > Tree.expr_cache_size: memo.popitem(last=False)
+        return _memo_copy(result)
         
     def __getattr__(self, key): 
         if len(self._recursion_safe_guard_stack) > 3:
@@ -493,9 +878,9 @@ class Tree:
         item = self[key]
         self._recursion_safe_guard_stack.pop(0)
         return item
-    def __len__(self): return len(self.ttree)
+    def __len__(self): return len(self._columns)
     def __getstate__(self):
-        return self.__dict__
+        return { key: value for key, value in self.__dict__.items() if key not in ('_expr_cache', '_column_identities') }
     def __setstate__(self, d):
         self.__dict__ = d
     def get(self, key): return self[key]
@@ -517,8 +902,87 @@ class Tree:
         return ak.sum(self["scale"])*(1 if self.is_data else lumi)
 
     def extend(self, *args, **kwargs):
-        self.ttree = join_fields(self.ttree, *args, **kwargs)
-        self.fields = self.ttree.fields
+        self._columns.update(*args, **kwargs)
+        if Tree.memory.budget is not None:
+            self._access(*kwargs.keys())
+            Tree.memory.enforce()
+
+    def select(self, index):
+        """Select the events of the tree (mask or index) without copying any column, see ColumnStore.select"""
+        self._columns = self._columns.select(index)
+
+    def extend_cached(self, producer, version=0, cache=None, **kwargs):
+        """Extend the tree with the columns of a producer, loading them from the column cache when available
+
+        Args:
+            producer (Callable): producer(tree, **kwargs) returning a dict of columns, or one column named after the producer
+            version (int, optional): version of the producer, bump it when the producer changes. Defaults to 0.
+            cache (ColumnCache, optional): column cache to use. Defaults to Tree.column_cache.
+
+        Returns:
+            dict: columns that were added to the tree
+        """
+        cache = cache or Tree.column_cache
+
+        columns = cache.load(self, producer, version, **kwargs) if cache else None
+        if columns is None:
+            columns = producer(self, **kwargs)
+            if not isinstance(columns, dict):
+                columns = { producer_name(producer).split('.')[-1]: columns }
+            if cache:
+                cache.save(self, producer, columns, version, **kwargs)
+
+        if cache:
+            # cached columns can be evicted and read again from the cache
+            fname = cache.fname(self, producer, version, **kwargs)
+            reloads = { field: LazyColumn(CacheLoader(cache, fname, field), len(self)) for field in columns }
+
+        self.extend(**columns)
+        if cache: self._columns.reloads.update(reloads)
+        return columns
+
+    def event_index(self, keys=None):
+        """Sorted (run, lumi, event) index of the events in the tree, rebuilt when the key columns change
+
+        Args:
+            keys (tuple, optional): names of the run, lumi and event fields. Defaults to the first of event_keys found in the tree.
+
+        Returns:
+            EventIndex: index with lookup(keys) returning the position of each key in the tree (-1 if missing)
+        """
+        keys = tuple(keys) if keys is not None else find_keys(self.fields)
+        columns = [ self._columns[key] for key in keys ]
+
+        cached = self.__dict__.get('_event_index', None)
+        if cached is not None and all( a is b for a, b in zip(cached[0], columns) ):
+            return cached[1]
+
+        index = EventIndex(pack_keys(*columns))
+        self._event_index = (columns, index)
+        return index
+
+    def add_friend(self, source, fields=None, treename='Events', keys=None, friend_keys=None, prefix='', strict=False):
+        """Attach columns from an external source, matched to the events of the tree by (run, lumi, event)
+
+        Columns are read lazily, events without a match are None unless strict is set.
+
+        Args:
+            source (str, list, Friend, dict, ak.Array): ROOT files (or glob patterns), an existing Friend or in memory arrays
+            fields (list, optional): fields to attach. Defaults to every non key field of the friend.
+            treename (str, optional): name of the tree in the friend files. Defaults to 'Events'.
+            keys (tuple, optional): key fields in the tree. Defaults to the first of event_keys found in the tree.
+            friend_keys (tuple, optional): key fields in the friend. Defaults to the first of event_keys found in the friend.
+            prefix (str, optional): prefix added to the attached field names. Defaults to ''.
+            strict (bool, optional): raise a KeyError if any event has no match. Defaults to False.
+
+        Returns:
+            Friend: the attached friend
+        """
+        friend = source if isinstance(source, Friend) else Friend(source, treename=treename, keys=friend_keys)
+        attach_friend(self, friend, fields=fields, keys=keys, prefix=prefix, strict=strict)
+
+        self.friends = self.__dict__.get('friends', []) + [friend]
+        return friend
 
     def reweight(self, rescale):
         if callable(rescale): rescale = rescale(self)
@@ -534,28 +998,167 @@ class Tree:
         if self.systematics is None: self.systematics = []
         self.systematics.append(systematic)
 
+    def snapshot(self, path):
+        """Save the full state of the tree to a directory, to be restored with Tree.restore (columns that are not loaded stay lazy)
+
+        Args:
+            path (str): snapshot directory, an existing snapshot at path is replaced
+
+        Returns:
+            str: snapshot directory
+        """
+        return save_snapshot(self, path)
+
     def copy(self, **kwargs):
         new_tree = CopyTree(self)
         new_tree.__dict__.update(**kwargs)
         return new_tree
 
-    def subset(self, range=None, nentries=None, fraction=None, randomize=True):
+    def subset(self, range=None, nentries=None, fraction=None, randomize=True, seed=None, stratify=False):
+        """Tree with a subset of the events, selected by index so that no column is read or copied until it is used
+
+        Args:
+            range (tuple, optional): (start, stop) number of events to keep. Defaults to None.
+            nentries (int, optional): keep nentries events. Defaults to None.
+            fraction (float, optional): keep a fraction of the events. Defaults to None.
+            randomize (bool, optional): draw the events at random, otherwise take the contiguous range. Defaults to True.
+            seed (int, optional): seed of the random draw, for reproducible subsets. Defaults to None.
+            stratify (bool, optional): keep the same fraction of the events of each file. Defaults to False.
+        """
         tree = self.copy()
 
-        if fraction: range = (0,int(fraction*len(self.ttree)))
+        if fraction: range = (0,int(fraction*len(self)))
         if nentries: range = (0,nentries)
 
         assert range is not None, "Specify a range (start,stop)"
         assert range[1] > range[0], "Start needs to be less then stop in range"
-        assert len(self.ttree) >= range[1], "Specify a range within the tree"
+        assert len(self) >= range[1], "Specify a range within the tree"
 
-        mask = np.full((len(self.ttree)),False)
-        mask[range[0]:range[1]] = True
-        if randomize:
-            np.random.shuffle(mask)
-        tree.ttree = tree.ttree[mask]
+        tree.select(self.subset_index(range, randomize=randomize, seed=seed, stratify=stratify))
         return tree
 
+    def subset_index(self, range, randomize=True, seed=None, stratify=False):
+        """Index of the events selected by subset, a slice when the range is not randomized"""
+        start, stop = range
+        if not randomize: return slice(start, stop)
+        if stratify:
+            order, offsets = self.sample_index()
+            return stratified_sample(offsets, (stop - start)/len(self), order=order, seed=seed)
+        return sample_indices(len(self), stop - start, seed=seed)
+
+    def split_index(self, fractions, seed=None, stratify=False):
+        """Split the events at random into len(fractions) disjoint sets, see Tree.split
+
+        Returns:
+            list: sorted index array of each split
+        """
+        if stratify:
+            order, offsets = self.sample_index()
+            return stratified_split(offsets, fractions, order=order, seed=seed)
+        return split_indices(len(self), fractions, seed=seed)
+
+    def split(self, fractions=None, nsplit=None, seed=None, stratify=False):
+        """Split the tree at random into disjoint trees, with one seeded permutation of the events
+
+        Args:
+            fractions (list, optional): relative size of each split. Defaults to None.
+            nsplit (int, optional): number of equal splits, if fractions is not given. Defaults to None.
+            seed (int, optional): seed of the random assignment. Defaults to None.
+            stratify (bool, optional): split the events of each file with the same fractions. Defaults to False.
+
+        Returns:
+            list: one tree per split
+        """
+        if fractions is None:
+            assert nsplit, "Specify fractions or nsplit"
+            fractions = [1/nsplit]*nsplit
+
+        splits = []
+        for index in self.split_index(fractions, seed=seed, stratify=stratify):
+            tree = self.copy()
+            tree.select(index)
+            splits.append(tree)
+        return splits
+
+    def projection_report(self, verbose=True):
+        """Report the savings from reading only the projected branches of the tree
+
+        Returns:
+            dict: number of projected fields, bytes read, total bytes of all branches, and read time
+        """
+        projection = self.__dict__.get('projection', None)
+        if projection is None: return None
+
+        saved = 1 - projection['bytes']/max(projection['total_bytes'], 1)
+        full_time = projection['time']*projection['total_bytes']/max(projection['bytes'], 1)
+        projection = dict(projection, saved=saved, full_time=full_time)
+
+        if verbose:
+            print(
+                f"[INFO] projected {projection['fields']}/{projection['total_fields']} branches: "
+                f"read {format_bytes(projection['bytes'])} of {format_bytes(projection['total_bytes'])} ({saved:0.1%} saved) "
+                f"in {projection['time']:0.2f}s (est. {full_time:0.2f}s for all branches)"
+            )
+        return projection
+
+    def iterate(self, step_size=None, fields=None, report=True, prefetch=2):
+        """Iterate over the files of the tree in chunks of step_size entries, each chunk is a Tree with its own scale and cutflow
+
+        Args:
+            step_size (int or str, optional): number of entries or memory size per chunk. Defaults to the tree step_size.
+            fields (list, optional): branches to read for each chunk. Defaults to all branches.
+            report (bool, optional): show a tqdm progress bar over the chunks. Defaults to True.
+            prefetch (int, optional): number of chunks read ahead in a background thread while the current chunk is processed. Defaults to 2.
+
+        Yields:
+            Tree: chunk of the tree
+        """
+        if step_size is None: step_size = self.__dict__.get('step_size', None) or '100 MB'
+        if fields is None: fields = self.__dict__.get('projected_fields', None)
+        if fields is not None:
+            weights = [ field for field in self.fields if any(field in weight for weight in self.weights) ]
+            fields = list(dict.fromkeys(list(fields) + weights))
+
+        def _read_chunks():
+            for i, fn in enumerate(self.filelist):
+                if is_columnar(fn.fname):
+                    chunks = iterate_columnar(fn.fname, fields, step_size=step_size)
+                else:
+                    chunks = ( (arrays, entries.tree_entry_start) for arrays, entries in 
+                              ut.iterate(f'{fn.fname}:{fn.treename}', fields, step_size=step_size, library='ak', report=True) )
+                for chunk, (arrays, start) in enumerate(chunks):
+                    yield i, chunk, arrays, start
+
+        pbar = tqdm(total=self.raw_events, desc=str(self.sample)) if report else None
+        for i, chunk, arrays, start in background(_read_chunks(), depth=prefetch):
+            tree = CopyTree(self)
+            init_chunk(tree, self, i, arrays, start, chunk)
+            yield tree
+
+            if pbar: pbar.update(len(arrays))
+        if pbar: pbar.close()
+
+    def stream(self, method, step_size=None, fields=None, report=True, prefetch=2):
+        """Apply a method to each chunk of the tree and accumulate the outputs
+
+        Histograms (with fixed bins), numbers and arrays are summed, dicts, lists and tuples element by element,
+        and trees are reduced to their cutflows.
+
+        Args:
+            method (Callable): method that takes a chunk Tree and returns the output to accumulate
+            step_size (int or str, optional): number of entries or memory size per chunk. Defaults to the tree step_size.
+            fields (list, optional): branches to read for each chunk. Defaults to all branches.
+            report (bool, optional): show a tqdm progress bar over the chunks. Defaults to True.
+            prefetch (int, optional): number of chunks read ahead in a background thread. Defaults to 2.
+
+        Returns:
+            Accumulated output of method over all chunks
+        """
+        total = None
+        for chunk in self.iterate(step_size=step_size, fields=fields, report=report, prefetch=prefetch):
+            total = _reduce_stream(total, method(chunk))
+        return total
+
     def reorder_collection(self,collection,order):
         tree = self.copy()
         collection = get_collection(tree,collection)
@@ -563,23 +1166,119 @@ class Tree:
         return tree
 
     def merge(self, other):
-        tree = self.copy()
-        tree.filelist = tree.filelist + other.filelist
-        
+        return Tree.concatenate(self, other)
+
+    @staticmethod
+    def concatenate(*trees):
+        """Concatenate trees in memory without reopening any of their files
+
+        Columns present in every tree are concatenated, and the filelists, cutflows and histograms are combined.
+
+        Returns:
+            Tree: concatenated tree
+        """
+        from ..plotUtils import Histo
+
+        if len(trees) == 1 and not isinstance(trees[0], Tree): trees = trees[0]
+        trees = list(trees)
+
+        tree = trees[0].copy()
+        tree.filelist = [ fn for t in trees for fn in t.filelist ]
+        tree.cutflow = [ cutflow for t in trees for cutflow in t.cutflow ]
+        tree.raw_events = sum(t.raw_events for t in trees)
+
+        labels = [ t.cutflow_labels for t in trees ]
+        tree.cutflow_labels = max(labels, key=len)
+        if any( label != tree.cutflow_labels[:len(label)] for label in labels ):
+            print(f'[WARNING] merging trees with different cutflow labels {labels}')
+
+        histograms = [ t.histograms for t in trees ]
+        tree.histograms = { 
+            key: functools.reduce(Histo.add, [ h[key] for h in histograms ]) 
+            for key in histograms[0] if all(key in h for h in histograms) 
+        }
+
         init_sample(tree)
-        init_tree(tree)
 
+        if any( t.__dict__.get('step_size', None) for t in trees ):
+            tree.weights = list(dict.fromkeys( weight for t in trees for weight in t.weights ))
+            init_columns(tree)
+            return tree
+
+        fields = [ field for field in trees[0].fields if all(field in t._columns for t in trees[1:]) ]
+        dropped = set( field for t in trees for field in t.fields ) - set(fields)
+        if any(dropped):
+            print(f'[WARNING] dropping fields not present in every tree: {sorted(dropped)}')
+
+        offsets = np.cumsum([0] + [ len(t.filelist) for t in trees ])
+        def _concatenate(field):
+            columns = [ t._columns.columns[field] for t in trees ]
+            if field == 'sample_id':
+                columns = [ t._columns[field] + offset for t, offset in zip(trees, offsets) ]
+            if all( isinstance(column, RunLengthArray) for column in columns ):
+                return RunLengthArray.concatenate(columns)
+            # columns that are not loaded yet are only read when the merged column is read
+            return concatenate_columns(columns)
+
+        reloads = { 
+            field: LazyColumn(Concatenate([ t._columns.reloads[field] for t in trees ]), sum( len(t) for t in trees )) 
+            for field in fields if all( field in t._columns.reloads for t in trees )
+        }
+        tree._columns = ColumnStore({ field: _concatenate(field) for field in fields }, reloads=reloads)
         return tree
 
     def clear(self):
-        total, remaining = 0,0
-        for cache in self.ttrees.cache:
-            total += cache.current
-            cache.clear()
-            remaining += cache.current
-        freed = total - remaining
+        """Evict every column that can be read again (raw branches, cached and friend columns)
+
+        Returns:
+            int: bytes freed
+        """
+        columns = self._columns
+        freed = 0
+        for key in list(columns.reloads):
+            nbytes = column_nbytes(columns.columns[key])
+            if columns.evict(key): freed += nbytes
         return freed 
 
+    def memory_report(self, verbose=True):
+        """Report the memory held by each column of the tree, and whether it is a branch, friend, cached, derived or deferred column
+
+        Returns:
+            dict: field -> dict(bytes, kind, loaded, reloadable)
+        """
+        columns = self._columns
+        raw_fields = set(self.filelist[0].fields) if any(self.filelist) else set()
+
+        def _kind(key):
+            if is_deferred(columns.columns[key]): return 'deferred'
+            reload = columns.reloads.get(key, None)
+            if isinstance(columns.columns[key], LazyColumn): reload = columns.columns[key]
+            if reload is None: return 'branch' if key in raw_fields else 'derived'
+            loader = reload.loader
+            if isinstance(loader, Concatenate): loader = getattr(loader.columns[0], 'loader', None)
+            if isinstance(loader, BranchLoader): return 'branch'
+            if isinstance(loader, CacheLoader): return 'cached'
+            return 'friend'
+
+        report = {
+            key: dict(
+                bytes=column_nbytes(column), 
+                kind=_kind(key),
+                loaded=not isinstance(column, LazyColumn) or column.loaded,
+                reloadable=key in columns.reloads or (isinstance(column, LazyColumn) and not is_deferred(column)),
+            )
+            for key, column in columns.columns.items()
+        }
+
+        if verbose:
+            total = sum( column['bytes'] for column in report.values() )
+            reloadable = sum( column['bytes'] for column in report.values() if column['reloadable'] )
+            print(f'[MEMORY] {self.sample}: {format_bytes(total)} in {len(report)} columns ({format_bytes(reloadable)} reloadable)')
+            for key, column in sorted(report.items(), key=lambda item: -item[1]['bytes']):
+                status = '' if column['loaded'] else ' (not loaded)'
+                print(f'    {key:<30} {format_bytes(column["bytes"]):>10}  {column["kind"]}{status}')
+        return report
+
     def asmodel(self, name='model', color='lavender'):
         tree = self.copy()
         tree.is_model = True 
@@ -587,13 +1286,25 @@ class Tree:
         tree.color = color
         return tree
 
-    def write(self, fname, include=[], exclude=[], treename='Events'):
+    def write(self, fname, include=[], exclude=[], treename='Events', format='root', codec='zstd', row_group_size=None):
+        """Write the fields of the tree to a single file
+
+        Args:
+            fname (str or Callable): output file, or method that returns the output file from the tree
+            include (list, optional): regex of fields to write. Defaults to all fields.
+            exclude (list, optional): regex of fields not to write. Defaults to [].
+            treename (str, optional): name of the output tree (ROOT only). Defaults to 'Events'.
+            format (str, optional): 'root', 'parquet' or 'arrow'. Defaults to 'root'.
+            codec (str, optional): compression codec for parquet/arrow. Defaults to 'zstd'.
+            row_group_size (int, optional): events per row group for parquet/arrow. Defaults to the pyarrow default.
+        """
         if callable(fname): fname = fname(self)
-        if not fname.endswith('.root'): fname += '.root'
+        if format != 'root': fname = columnar_fname(fname, format)
+        elif not fname.endswith('.root'): fname += '.root'
         
         if re.match(r'^root://(.*?)//(.*)$', fname):
             import hashlib 
-            tmp_fname = f'{hashlib.md5(fname.encode()).hexdigest()}.root'
+            tmp_fname = f'{hashlib.md5(fname.encode()).hexdigest()}' + os.path.splitext(fname)[1]
             copy_to_remote = True
         else:
             os.makedirs(os.path.dirname(fname), exist_ok=True)
@@ -612,32 +1323,77 @@ class Tree:
             print('[WARNING] no fields to write')
             return
 
-        arrays = { field : self.ttree[field] for field in fields }
+        arrays = { field : self._columns[field] for field in fields }
 
         print(f'Writing {self.sample} to {fname}')
-        with ut.recreate(tmp_fname) as f:
-            f[treename] = arrays
+        if format != 'root':
+            write_columnar(tmp_fname, arrays, format=format, codec=codec, row_group_size=row_group_size, metadata=dict(treename=treename, sample=str(self.sample)))
+        else:
+            with ut.recreate(tmp_fname) as f:
+                f[treename] = arrays
 
         if copy_to_remote:
             fs.xrd.move(tmp_fname, fname)
     
-    def write_by_sample(self, altfile='new_{base}', retry=2, include=[], exclude=[]):
+    def sample_index(self):
+        """Index of the events of each file in the tree, cached until sample_id is replaced
+
+        The events of file i are order[offsets[i]:offsets[i+1]], order is None when sample_id is sorted.
+
+        Returns:
+            tuple: (order, offsets)
+        """
+        sample_id = self._columns['sample_id']
+        cached = self.__dict__.get('_sample_index', None)
+        if cached is not None and cached[0] is sample_id:
+            return cached[1:]
+
+        if isinstance(sample_id, RunLengthArray) and np.all(np.diff(sample_id.values) >= 0):
+            counts = np.bincount(sample_id.values.astype(np.int64), weights=sample_id.counts, minlength=len(self.filelist))
+            offsets = np.concatenate([[0], np.cumsum(counts).astype(np.int64)])
+            self._sample_index = (sample_id, None, offsets)
+            return None, offsets
+
+        ids = np.asarray(ak.to_numpy(sample_id) if isinstance(sample_id, ak.Array) else sample_id).astype(np.int64)
+        if len(ids) < 2 or np.all(ids[1:] >= ids[:-1]):
+            order = None
+            offsets = np.searchsorted(ids, np.arange(len(self.filelist)+1), side='left')
+        else:
+            order = np.argsort(ids, kind='stable')
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(ids, minlength=len(self.filelist)))])
+
+        self._sample_index = (sample_id, order, offsets)
+        return order, offsets
+
+    def file_column(self, values):
+        """Run length encoded column that takes values[i] for every event of file i"""
+        order, offsets = self.sample_index()
+        column = RunLengthArray(values, offsets=offsets)
+        if order is None: return column
+        return np.asarray(column)[np.argsort(order, kind='stable')]
+
+    def sample_slice(self, i):
+        """Slice (or index array if the tree is not sorted by sample_id) that selects the events of file i"""
+        order, offsets = self.sample_index()
+        if order is None: return slice(offsets[i], offsets[i+1])
+        return order[offsets[i]:offsets[i+1]]
+
+    def write_by_sample(self, altfile='new_{base}', retry=2, include=[], exclude=[], nworkers=4, format='root', codec='zstd', row_group_size=None):
 
         if not callable(altfile):
             if '{base}' not in altfile: altfile += '_{base}'
 
         exclude += ['^_', '^sample_id$']
 
-        def _prep_to_write_(tree):
+        def _select_fields_(fields):
+            if any(include): return [ field for field in fields if any( re.match(pattern, field) for pattern in include ) ]
+            return [ field for field in fields if not any( re.match(pattern, field) for pattern in exclude ) ]
 
-            fields = tree.fields
-            if any(include):
-                regex = lambda field : any( re.match(pattern, field) for pattern in include )
-            else:
-                regex = lambda field : not any( re.match(pattern, field) for pattern in exclude )
+        def _prep_to_write_(tree):
 
-            fields = [ field for field in fields if regex(field) ]
-            tree = tree[fields]
+            fields = _select_fields_(tree.fields)
+            # only the written columns are read
+            tree = tree._columns[fields]
 
             types = dict()
             option_fields = []
@@ -661,22 +1417,42 @@ class Tree:
                 
             return tree, types
 
-        full_tree, types = _prep_to_write_(self.ttree)
-        full_tree = remove_counters(full_tree)
-        # full_tree = make_regular(full_tree)
+        if format == 'root':
+            full_tree, types = _prep_to_write_(self)
+            full_tree = remove_counters(full_tree)
+            # full_tree = make_regular(full_tree)
+        else:
+            # parquet/arrow keep the awkward structure natively, so columns are written as they are
+            full_tree, types = { field: self._columns[field] for field in _select_fields_(self.fields) }, None
+
+        chunk = self.__dict__.get('chunk', None)
+        if chunk is not None and not callable(altfile) and '{chunk}' not in altfile:
+            altfile = altfile.replace('{base}', 'chunk{chunk}_{base}')
 
-        for i, file in tqdm(enumerate(self.filelist), total=len(self.filelist)):
-            file_mask = self.sample_id == i
-            if ak.sum(file_mask) == 0: continue
+        _, offsets = self.sample_index()
 
-            tree = unzip_records(full_tree[ file_mask ])
+        # each worker slices out its own file, so at most nworkers output buffers are alive at once
+        def _write_file(i):
+            file = self.filelist[i]
             extra = dict()
             try:
                 extra['h_cutflow'] = (self.cutflow[i].histo, self.cutflow[i].bins)
             except Exception:
                 ...
-            file.write(altfile, retry=retry, tree=tree, types=types, **extra)
+
+            if format == 'root':
+                tree = unzip_records(full_tree[ self.sample_slice(i) ])
+            else:
+                tree = { field: column[ self.sample_slice(i) ] for field, column in full_tree.items() }
+                extra.update(format=format, codec=codec, row_group_size=row_group_size, cutflow_labels=self.cutflow_labels)
+            file.write(altfile, retry=retry, tree=tree, types=types, chunk=chunk, **extra)
+
+        to_write = [ i for i in range(len(self.filelist)) if offsets[i+1] > offsets[i] ]
+        with ThreadPool(max(1, min(nworkers, len(to_write)))) as pool:
+            for _ in tqdm(pool.imap_unordered(_write_file, to_write), total=len(to_write)): ...
 
 class CopyTree(Tree):
     def __init__(self, tree):
-        copy_fields(tree, self)
\ No newline at end of file
+        copy_fields(tree, self)
+        self._columns = tree._columns.copy()
+        self._expr_cache = OrderedDict(tree.__dict__.get('_expr_cache', {}))
\ No newline at end of file
@@ -1,4 +1,16 @@
 from .Tree import Tree
 from .Filter import Filter,EventFilter,CollectionFilter,FilterSequence
 from .ObjIter import ObjIter, ObjTransform, ParallelMethod
-from .AttrArray import AttrArray
\ No newline at end of file
+from .AttrArray import AttrArray
+from .ColumnCache import ColumnCache
+from .RunLengthArray import RunLengthArray
+from .Expression import Expression, Selection
+from .EventIndex import EventIndex, Friend
+from .MemoryManager import MemoryManager
+from .Sampling import sample_indices, split_indices, stratified_sample, stratified_split
+from .Cutflow import CutflowAccumulator
+from .MaskCache import MaskCache
+from .CutSet import CutSet, CutWord
+from .Regions import Regions, RegionCode
+from .SharedArrays import SharedArray
+from .Tracer import Tracer, tracer
@@ -2,6 +2,7 @@
 
 from .fileUtils import FileCollection, cleanpath
 from . import fs_tools as fs
+from .prefetch import Prefetcher, background
 
 fs.local = fs.mount('')
 fs.default = fs.remote('root://cmseos.fnal.gov/', '/eos/uscms/')
@@ -0,0 +1,101 @@
+import os
+import queue
+import threading
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+def _file_size(path):
+    if isinstance(path, str) and os.path.isfile(path):
+        return os.path.getsize(path)
+    return 0
+
+class Prefetcher:
+    """
+    Iterate over fetch(item) for each item in order, with up to depth items fetched ahead by nworkers threads.
+    No fetch is started while the unconsumed results take more than max_bytes (measured with size).
+    Exceptions are raised when their item is reached, or yielded in its place with skip_errors.
+    """
+
+    def __init__(self, items, fetch, depth=4, nworkers=None, max_bytes=None, size=_file_size, skip_errors=False):
+        self.items = list(items)
+        self.fetch = fetch
+        self.depth = max(1, depth)
+        self.nworkers = max(1, nworkers or self.depth)
+        self.max_bytes = max_bytes
+        self.size = size
+        self.skip_errors = skip_errors
+
+    def __len__(self): return len(self.items)
+
+    def _ahead_bytes(self, pending):
+        return sum( self.size(result.get()) for result in pending if result.ready() and result.successful() )
+
+    def _can_schedule(self, pending):
+        if len(pending) >= self.depth: return False
+        if self.max_bytes is None or not pending: return True
+        return self._ahead_bytes(pending) < self.max_bytes
+
+    def __iter__(self):
+        pool = ThreadPool(min(self.nworkers, max(1, len(self.items))))
+        pending = deque()
+        try:
+            remaining = iter(self.items)
+            exhausted = False
+            while not exhausted or pending:
+                while not exhausted and self._can_schedule(pending):
+                    item = next(remaining, StopIteration)
+                    if item is StopIteration:
+                        exhausted = True
+                        break
+                    pending.append(pool.apply_async(self.fetch, (item,)))
+                if not pending: break
+
+                result = pending.popleft()
+                try:
+                    value = result.get()
+                except Exception as err:
+                    if not self.skip_errors: raise
+                    value = err
+                yield value
+        finally:
+            pool.terminate()
+
+def background(iterable, depth=2):
+    """Iterate over an iterable that is consumed in a background thread, up to depth items ahead of the consumer.
+    Exceptions of the iterable are raised to the consumer, and the iterable is closed when the consumer stops."""
+    if depth is None or depth < 1:
+        yield from iterable
+        return
+
+    done = object()
+    items = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def _put(entry):
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except queue.Full: ...
+        return False
+
+    def _produce():
+        try:
+            for item in iterable:
+                if not _put((item, None)): return
+            _put((done, None))
+        except BaseException as err:
+            _put((done, err))
+        finally:
+            if hasattr(iterable, 'close'): iterable.close()
+
+    thread = threading.Thread(target=_produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, err = items.get()
+            if err is not None: raise err
+            if item is done: return
+            yield item
+    finally:
+        stop.set()
@@ -6,6 +6,7 @@ from .cell import Cell
 
 from argparse import ArgumentParser
 
+import os
 import time
 import datetime
 
@@ -103,6 +104,8 @@ class Notebook:
         parser.add_argument('--dry-run', action='store_true', help='dry run the notebook without executing cells')
         parser.add_argument('--only', nargs='+', help='only run these cells', default=[])
         parser.add_argument('--disable', nargs='+', help='disable these cells', default=[])
+        parser.add_argument('--memory-report', action='store_true', help='print the memory held by trees after each cell')
+        parser.add_argument('--trace', type=str, help='save a Chrome trace of the cells, parallel methods, file reads and onnx batches to this json file', default=None)
         return parser
 
     @staticmethod
@@ -221,19 +224,43 @@ class Notebook:
     def run(self, runlist=None):
         if runlist is not None: self.build_runlist(list(self._cells.keys()), only_list=runlist)
 
+        from ...classUtils.Tracer import tracer
+        if self.trace: tracer.enable()
+
         stopwatch = Stopwatch()
-        for key, cell in self._cells.items():
-            ready = cell.ready()
-            elapsed = Stopwatch()
-            print(f'{stopwatch} [{cell.status}] {cell}')
-            if not ready: continue
-
-            try:
-                result = cell(dry_run=self.dry_run)
-                print(f'{stopwatch} [{cell.status}] {elapsed}')
-            except Exception as e:
-                print(f'{stopwatch} [{cell.status}] {e}\n')
-                self.on_cell_error(cell, e)
+        try:
+            for key, cell in self._cells.items():
+                ready = cell.ready()
+                elapsed = Stopwatch()
+                print(f'{stopwatch} [{cell.status}] {cell}')
+                if not ready: continue
+
+                try:
+                    with tracer.span(key, cat='cell', notebook=self.__name__):
+                        result = cell(dry_run=self.dry_run)
+                    print(f'{stopwatch} [{cell.status}] {elapsed}')
+                except Exception as e:
+                    print(f'{stopwatch} [{cell.status}] {e}\n')
+                    self.on_cell_error(cell, e)
+
+                if self.memory_report: self.print_memory_report()
+        finally:
+            if self.trace: print(f'Saved trace to {tracer.export(self.trace)}')
+
+    def print_memory_report(self):
+        """Print the total memory held by trees in the process, and by each tree in the namespace"""
+        from ...classUtils import Tree, ObjIter
+        from ...classUtils.MemoryManager import memory, format_bytes
+
+        memory.report()
+        for key, value in self.namespace.items():
+            trees = list(value) if isinstance(value, ObjIter) else [value]
+            for tree in trees:
+                if not isinstance(tree, Tree): continue
+                report = tree.memory_report(verbose=False)
+                total = sum( column['bytes'] for column in report.values() )
+                sample = tree.sample if tree.sample is not None else ', '.join( os.path.basename(fn.fname) for fn in tree.filelist )
+                print(f'    {key}: {str(sample):<30} {format_bytes(total):>10} in {len(report)} columns')
 
     def on_cell_error(self, cell, error):
         if not self.ignore_error: raise error
@@ -239,7 +239,7 @@ class Histo:
             # bins=self.bins,
             bins=list(self.bins),
             # error=self.error / self.scale,
-            error=list(self.error / self.scale),
+            error=list(np.asarray(self.error) / self.scale),
             efficiency=self.efficiency,
             density=self.density,
             # array=self.array,
@@ -4,7 +4,7 @@ import re
 
 from .variable_table import VariableTable
 from ..varConfig import varinfo
-from ..classUtils import AttrArray
+from ..classUtils import AttrArray, Expression, Selection
 
 
 def _get_item_from_tree(tree, key):
@@ -18,7 +18,7 @@ def _get_item_from_tree(tree, key):
         key = key.replace(slice, "")
     item = tree[key]
     if slice is not None:
-        item = eval(f'item{slice}', {'item': item})
+        item = Expression.compile(f'item{slice}').evaluate({'item': item})
     return item
 
 
@@ -46,7 +46,7 @@ def _mask_item_from_tree(tree, item, mask):
         #     return mask(tree, item)
         mask = mask(tree)
     elif isinstance(mask, str):
-        mask = tree[mask]
+        mask = Selection.compile(mask)(tree)
 
     if item is 'n_mask':
         return ak.sum(mask, axis=-1)
@@ -103,7 +103,7 @@ class _study_args:
 
         ntrees = len(treelist)
         self.masks = AttrArray.init_attr(
-            masks, masks if callable(masks) else None, ntrees)
+            masks, masks if callable(masks) or isinstance(masks, str) else None, ntrees)
         self.indices = AttrArray.init_attr(
             indices, indices if callable(indices) else None, ntrees)
         self.transforms = AttrArray.init_attr(
@@ -1,3 +1,8 @@
+import os
+
+from ..classUtils.ColumnStore import LazyColumn
+from ..classUtils.MemoryManager import CacheLoader
+
 def tree_variable(f_variable=None, bins=None, xlabel=None):
     def wrap_variable(f_variable):
         f_variable.bins = bins
@@ -6,13 +11,35 @@ def tree_variable(f_variable=None, bins=None, xlabel=None):
     if f_variable: return wrap_variable(f_variable)
     return wrap_variable
 
-def cache_variable(f_variable=None, bins=None, xlabel=None):
+def _persist_variable(f_variable, tree, field, version=0, **kwargs):
+    """Add the variable to the tree through the column cache, or give a variable already in the tree (i.e. from a snapshot) its reload"""
+    column_cache = getattr(tree, 'column_cache', None)
+    if column_cache is None:
+        if field not in tree.fields: tree.extend(**{field: f_variable(tree, **kwargs)})
+        return
+
+    fname = column_cache.fname(tree, f_variable, version, **kwargs)
+    if field in tree.fields:
+        if not os.path.exists(fname):
+            column_cache.save(tree, f_variable, { f_variable.__name__: tree[field] }, version, **kwargs)
+    else:
+        columns = column_cache.load(tree, f_variable, version, **kwargs)
+        if columns is None:
+            columns = { f_variable.__name__: f_variable(tree, **kwargs) }
+            column_cache.save(tree, f_variable, columns, version, **kwargs)
+        tree.extend(**{field: columns[f_variable.__name__]})
+    tree._columns.reloads[field] = LazyColumn(CacheLoader(column_cache, fname, f_variable.__name__), len(tree))
+
+def cache_variable(f_variable=None, bins=None, xlabel=None, persist=False, version=0):
 
     def wrap_variable(f_variable):
         f_hash = f"_{f_variable.__name__}_{hash(f_variable)}_"
         def cache(tree, **kwargs):
-            if cache.hash in tree.fields: return tree[cache.hash]
-            tree.extend(**{cache.hash: f_variable(tree, **kwargs)})
+            if persist:
+                if cache.hash not in tree._columns.reloads:
+                    _persist_variable(f_variable, tree, cache.hash, version, **kwargs)
+            elif cache.hash not in tree.fields:
+                tree.extend(**{cache.hash: f_variable(tree, **kwargs)})
             return tree[cache.hash]
         cache.__name__ = f_variable.__name__
         cache.bins = bins
@@ -60,7 +60,7 @@ def rgx_with_year(fn, rgx):
     if year is None: return rgx
     return year + '/' + rgx
 
-def load_output(tree, model=None, fields=['scores'], try_base=True, try_year=False):
+def get_output_files(tree, model=None, try_base=True, try_year=False):
     predict_path = os.path.join(model,"predict_output")
     if not os.path.exists(predict_path):
         raise ValueError(f'No predict_output found for model {model}.')
@@ -76,10 +76,20 @@ def load_output(tree, model=None, fields=['scores'], try_base=True, try_year=Fal
     toload = [ fn for rgx in rgxs for fn in glob.glob( os.path.join(predict_path,rgx)+'*' ) ]
     if not any(toload): 
         raise ValueError(f'No weaver output found for model {model}. With rgxs {rgxs}')
-        
+    return toload
+
+def load_output(tree, model=None, fields=['scores'], try_base=True, try_year=False):
+    toload = get_output_files(tree, model, try_base=try_base, try_year=try_year)
     load = load_from_root if all( fn.endswith('.root') for fn in toload ) else load_from_ak0
     return load(toload, fields=fields)
 
+def attach_output(tree, model=None, fields=['scores'], try_base=True, try_year=False, prefix='', strict=True):
+    """Attach weaver outputs as friend columns matched by (run, lumi, event), requires ROOT outputs with the event keys"""
+    toload = get_output_files(tree, model, try_base=try_base, try_year=try_year)
+    if not all( fn.endswith('.root') for fn in toload ):
+        raise ValueError(f'Attaching weaver output by event key requires ROOT outputs for model {model}.')
+    return tree.add_friend(toload, fields=fields, treename='Events', prefix=prefix, strict=strict)
+
 def load_predict(tree, model, fields=[]):
     filelist = [ fn.true_fname for fn in tree.filelist ]
     return load_predict_filelist(filelist, model, fields=fields)
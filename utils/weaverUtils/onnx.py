@@ -5,6 +5,8 @@ import numpy as np
 import awkward as ak
 import multiprocessing as mp
 
+from ..classUtils.Tracer import tracer, nbytes
+
 variable_map = dict(
     jet_cosphi = lambda t : np.cos(t.jet_phi),
     jet_cos_phi = lambda t : np.cos(t.jet_phi),
@@ -73,10 +75,15 @@ class WeaverONNX:
     def thread_predict(self, args):
         inputs, start, stop = args
         batch_input = {k:v[start:stop] for k,v in inputs.items()}
-        return self.session.run(None, batch_input)
+        with tracer.span('onnx.batch', cat='onnx', events=stop-start, bytes_in=nbytes(batch_input)) as span:
+            outputs = self.session.run(None, batch_input)
+            span['bytes_out'] = nbytes(outputs)
+        return outputs
     
     def predict(self, inputs):
-        outputs = self.session.run(None, inputs)
+        with tracer.span('onnx.batch', cat='onnx', bytes_in=nbytes(inputs)) as span:
+            outputs = self.session.run(None, inputs)
+            span['bytes_out'] = nbytes(outputs)
         return dict(zip(self.output_names, outputs))
 
     def get_inputs(self, tree):
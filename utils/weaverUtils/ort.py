@@ -2,6 +2,8 @@ import numpy as np
 import json
 import awkward as ak
 
+from ..classUtils.Tracer import tracer, nbytes
+
 def _pad(a, min_length, max_length, value=0, dtype='float32'):
     a = ak.pad_none(a, max_length, axis=-1, clip=True)
     a = ak.fill_none(a, value)
@@ -126,13 +128,16 @@ class ONNXRuntimeHelper:
         return outputs
 
     def predict_batch(self, batch, model_idx=None):
-        data = self.preprocessor.preprocess(batch)
+        with tracer.span('onnx.preprocess', cat='onnx', events=len(batch)):
+            data = self.preprocessor.preprocess(batch)
 
         if len(self.sessions) == 1:
             model_idx = 0
 
         if model_idx is not None:
-            outputs = self.sessions[model_idx].run([], data)
+            with tracer.span('onnx.batch', cat='onnx', events=len(batch), bytes_in=nbytes(data)) as span:
+                outputs = self.sessions[model_idx].run([], data)
+                span['bytes_out'] = nbytes(outputs)
 
         # else:
             